@@ -0,0 +1,332 @@
+import numpy as np
+import pandas as pd
+
+"""
+    Neste arquivo, estão as funções de agregação parcial das provas, usadas na leitura da tabela de provas em blocos.
+
+    Em vez de carregar a tabela inteira na memória, as provas são lidas em blocos de linhas (veja
+    consultas.provas_em_blocos) e cada bloco é resumido em agregados parciais, que são combinados com os dos blocos
+    anteriores. Os agregados guardados são:
+
+        - por usuário e treinamento: soma e quantidade de notas, primeira nota e maior nota
+        - os pares nome/funcional distintos, com o racf, na ordem em que aparecem pela primeira vez
+
+    O usuário é identificado pelo par nome/funcional (veja chave_usuario), de modo que pessoas diferentes com o mesmo
+    nome não são somadas. Nas buscas em lote, a chave pode ser também o funcional ou o racf.
+
+    Como a combinação de dois resumos é igual ao resumo das provas dos dois juntas, na mesma ordem, o resultado não
+    depende do tamanho dos blocos. O pico de memória é proporcional ao número de usuários e treinamentos realizados por
+    eles, e não ao número de provas.
+
+    A partir do resumo, CR, CP, CRP e Score Final são calculados com as mesmas fórmulas do motor de cálculo em lote
+    (veja motor.calcular_resumo).
+
+    Resumo materializado
+
+    A primeira nota de cada treinamento depende da ordem das provas (veja consultas.ordenar). O resumo materializado
+    guarda uma linha por usuário (nome, racf e funcional), categoria e treinamento, com:
+
+        - quantidade de tentativas e de notas, soma e maior nota
+        - primeira nota, escolhida pela ordem das tentativas (consultas.coluna_ordem), e a ordem dessa tentativa
+        - ordem da primeira tentativa do usuário no treinamento, usada na ordem dos usuários nos rankings
+
+    Ele é construído em uma única passagem pelas provas ordenadas (veja materializar) e mantido atualizado com as provas
+    novas (veja atualizar). Enquanto estiver ativo, as médias de media.py, o CR de rendimento.py, o CP de progressao.py
+    e os rankings são calculados a partir dele, sem ler as provas. As buscas por usuário usam o índice de identidades
+    (veja identidades.py) para ler apenas as linhas do usuário.
+
+"""
+
+from coeficiente import consultas, identidades
+
+"""VARIÁVEIS GLOBAIS"""
+# Quantidade de linhas lidas por bloco quando nenhuma é informada
+tamanho_bloco = 100000
+
+# Resumo materializado e maior coluna_ordem já incluída nele. Quando a tabela é None, o resumo não está ativo
+_materializado = {'tabela': None, 'marca': None}
+
+# Colunas que identificam cada linha do resumo materializado
+_identidade = ['nome', 'racf', 'funcional', 'categoria', 'treinamento']
+
+# Colunas que identificam o usuário nos cálculos de todos os usuários (rankings, motor e estatísticas da população)
+chave_usuario = ['nome', 'funcional']
+
+"""FUNÇÕES"""
+
+'''
+  Resume provas já carregadas em agregados parciais. Chave é a coluna ou a lista de colunas que identifica o usuário (por
+padrão, chave_usuario).
+  Retorna um dicionário com treinamentos (DataFrame indexado por chave e treinamento, com soma, contagem, primeira e
+maior nota) e usuarios (pares nome/funcional distintos, com racf, na ordem em que aparecem).
+'''
+def resumir(provas, chave=None):
+
+    # As provas sem treinamento formam um grupo próprio, que entra apenas na média geral
+    treinamentos = agrupar(provas, colunas_usuario(chave) + ['treinamento'])['nota']
+    treinamentos = treinamentos.agg(['sum', 'count', 'first', 'max'])
+    treinamentos.columns = ['soma', 'contagem', 'primeira', 'maior']
+
+    usuarios = provas.drop_duplicates(subset=['nome', 'funcional'])[['nome', 'racf', 'funcional']]
+
+    return {'treinamentos': treinamentos, 'usuarios': usuarios.reset_index(drop=True)}
+
+'''
+  Agrupa os dados pelas colunas, na ordem em que aparecem ou ordenados (sort), mantendo os grupos de valores nulos
+(dropna=False). Colunas categóricas com nulos são convertidas para objeto antes, pois algumas versões do pandas descartam
+esses grupos mesmo com dropna=False.
+'''
+def agrupar(dados, colunas, sort=False):
+
+    nulos = {coluna: object for coluna in colunas
+             if isinstance(dados[coluna].dtype, pd.CategoricalDtype) and dados[coluna].hasnans}
+
+    if nulos:
+        dados = dados.astype(nulos)
+
+    return dados.groupby(colunas, sort=sort, observed=True, dropna=False)
+
+# Retorna a lista de colunas que identifica o usuário a partir de uma chave: uma coluna, uma lista de colunas ou, sem
+# chave, chave_usuario
+def colunas_usuario(chave=None):
+
+    if chave is None:
+        return list(chave_usuario)
+
+    return list(chave) if isinstance(chave, (list, tuple)) else [chave]
+
+# Indica, para cada linha dos agregados por usuário e treinamento (veja resumir), se ela tem treinamento. As provas sem
+# treinamento entram na média geral, mas não na primária nem no CP
+def com_treinamento(treinamentos):
+    return treinamentos.index.get_level_values(-1).notna()
+
+# Numera os usuários de um índice de agregados por usuário e treinamento (veja resumir) pelos códigos inteiros dos
+# níveis do usuário (todos menos o último), na ordem em que aparecem, sem comparar os valores
+def _codigos_usuario(indice):
+
+    # Usuário identificado por uma única coluna: os códigos do nível já numeram os usuários
+    if indice.nlevels == 2:
+        return indice.codes[0]
+
+    codigos = np.zeros(len(indice), dtype=np.int64)
+    for nivel, codigo in zip(indice.levels[:-1], indice.codes[:-1]):
+        codigos = codigos * (len(nivel) + 1) + codigo + 1
+
+    return pd.factorize(codigos)[0]
+
+'''
+  Agrupa por usuário os agregados por usuário e treinamento (veja resumir) pelos códigos inteiros dos níveis do usuário,
+na ordem em que aparecem, sem comparar os nomes. É bem mais rápido que agrupar pelos níveis, principalmente com nomes
+categóricos. Use rotular para trocar os códigos do resultado pelos usuários.
+'''
+def por_usuario(treinamentos):
+    return treinamentos.groupby(_codigos_usuario(treinamentos.index), sort=False)
+
+# Troca os códigos do índice de um resultado de por_usuario pelos usuários correspondentes
+def rotular(treinamentos, resultado):
+
+    indice = treinamentos.index
+
+    if indice.nlevels == 2:
+        return resultado.set_axis(indice.levels[0].take(resultado.index.to_numpy()))
+
+    # Primeira linha de cada usuário, na ordem dos códigos
+    primeiras = np.unique(_codigos_usuario(indice), return_index=True)[1]
+
+    return resultado.set_axis(indice.droplevel(-1)[primeiras].take(resultado.index.to_numpy()))
+
+'''
+  Retorna os valores de uma série indexada por usuário na ordem de uma lista de usuários, com NaN para os ausentes. Faz o
+mesmo que reindex, mas por posição, o que é bem mais rápido com nomes categóricos. Usuários pode ser uma série, para
+séries indexadas por uma coluna, ou um DataFrame com as colunas da chave (veja chave_usuario).
+'''
+def alinhar(serie, usuarios):
+
+    if isinstance(usuarios, pd.DataFrame):
+        usuarios = pd.MultiIndex.from_frame(usuarios)
+
+    posicoes = serie.index.get_indexer(usuarios)
+    valores = serie.to_numpy(dtype=float)[posicoes]
+    valores[posicoes < 0] = np.nan
+
+    return valores
+
+# Combina dois resumos, em que anterior resume as provas que vieram antes. O resultado é igual ao resumo de todas elas
+def combinar(anterior, novo):
+
+    # Primeiro resumo
+    if anterior is None:
+        return novo
+
+    treinamentos = pd.concat([anterior['treinamentos'], novo['treinamentos']])
+    chaves = treinamentos.index.names
+    treinamentos = treinamentos.groupby(level=chaves, sort=False, observed=True, dropna=False).agg({'soma': 'sum',
+                                                                                                    'contagem': 'sum',
+                                                                                                    'primeira': 'first',
+                                                                                                    'maior': 'max'})
+
+    usuarios = pd.concat([anterior['usuarios'], novo['usuarios']], ignore_index=True)
+    usuarios = usuarios.drop_duplicates(subset=['nome', 'funcional']).reset_index(drop=True)
+
+    return {'treinamentos': treinamentos, 'usuarios': usuarios}
+
+'''
+  Lê as provas em blocos de até tamanho linhas (por padrão, tamanho_bloco) e as resume, combinando os blocos um a um.
+  Categoria e treinamento são filtros opcionais. Retorna o resumo de todas as provas (veja resumir).
+'''
+def ler(categoria=None, treinamento=None, tamanho=None, chave=None):
+
+    resumo = None
+
+    for bloco in consultas.provas_em_blocos(tamanho or tamanho_bloco, categoria=categoria, treinamento=treinamento):
+        resumo = combinar(resumo, resumir(bloco, chave=chave))
+
+    return resumo
+
+# Resume um bloco de provas ordenadas em linhas do resumo materializado
+def _materializar_bloco(provas):
+
+    ordem = consultas.coluna_ordem
+    provas = provas.assign(ordem_nota=provas[ordem].where(provas['nota'].notna()))
+
+    grupos = agrupar(provas, _identidade)
+    tabela = grupos.agg(tentativas=('nota', 'size'),
+                        contagem=('nota', 'count'),
+                        soma=('nota', 'sum'),
+                        maior=('nota', 'max'),
+                        primeira=('nota', 'first'),
+                        ordem=('ordem_nota', 'min'),
+                        inicio=(ordem, 'min'))
+
+    return tabela.reset_index()
+
+# Combina duas partes do resumo materializado, em que anterior tem as provas feitas antes
+def _combinar_materializado(anterior, novo):
+
+    # Primeira parte
+    if anterior is None:
+        return novo
+
+    tabela = pd.concat([anterior, novo], ignore_index=True)
+    grupos = agrupar(tabela, _identidade)
+
+    return grupos.agg({'tentativas': 'sum', 'contagem': 'sum', 'soma': 'sum', 'maior': 'max', 'primeira': 'first',
+                       'ordem': 'min', 'inicio': 'min'}).reset_index()
+
+# Lê as provas a partir da marca em uma passagem ordenada e as inclui no resumo materializado. Retorna o número de provas
+def _incluir_provas(tamanho):
+
+    total = 0
+    ordem = consultas.coluna_ordem
+
+    for bloco in consultas.provas_em_ordem(tamanho or tamanho_bloco, desde=_materializado['marca']):
+        if bloco.empty:
+            continue
+
+        _materializado['tabela'] = _combinar_materializado(_materializado['tabela'], _materializar_bloco(bloco))
+        # Os blocos estão ordenados: a marca é a ordem da última prova, como valor nativo do Python
+        _materializado['marca'] = bloco[ordem].tolist()[-1]
+        total += len(bloco)
+
+    return total
+
+'''
+  Constrói o resumo materializado com todas as provas, lidas em uma única passagem na ordem em que foram feitas, e o
+ativa. Tamanho é o número de linhas lido por bloco. Retorna o número de provas resumidas.
+'''
+def materializar(tamanho=None):
+
+    descartar()
+    total = _incluir_provas(tamanho)
+
+    # Nenhuma prova: resumo vazio, mas ativo
+    if _materializado['tabela'] is None:
+        vazio = pd.DataFrame(columns=[consultas.coluna_ordem, 'nota'] + _identidade)
+        _materializado['tabela'] = _materializar_bloco(vazio)
+
+    return total
+
+# Inclui no resumo materializado as provas feitas depois da última incluída. Retorna o número de provas novas
+def atualizar(tamanho=None):
+
+    # Resumo ainda não construído
+    if _materializado['tabela'] is None:
+        return materializar(tamanho)
+
+    return _incluir_provas(tamanho)
+
+# Desativa o resumo materializado. Os cálculos voltam a ser feitos a partir das provas
+def descartar():
+
+    _materializado['tabela'] = None
+    _materializado['marca'] = None
+
+# Indica se o resumo materializado está ativo
+def ativo():
+    return _materializado['tabela'] is not None
+
+# Retorna o resumo materializado, ou None se ele não está ativo
+def materializado():
+    return _materializado['tabela']
+
+'''
+  Seleciona as linhas do resumo materializado com os filtros de consultas.provas (e a coluna em lote de
+consultas.provas_em_lote), ordenadas pela primeira tentativa com nota. Nas buscas por usuário, as linhas dos usuários
+são encontradas pelo índice de identidades (veja identidades.py) e só elas são filtradas.
+'''
+def _selecionar(lote=None, valores=None, **filtros):
+
+    tabela = _materializado['tabela']
+    chaves = identidades.chaves(tabela, lote=lote, valores=valores,
+                                **{coluna: filtros.get(coluna) for coluna in identidades.colunas})
+
+    # Busca por usuário. O nome já foi resolvido pelo índice, que também aceita o nome normalizado
+    if chaves is not None:
+        tabela = tabela.take(identidades.linhas(tabela, chaves))
+        filtros.pop('nome', None)
+        lote, valores = (None, None) if lote == 'nome' else (lote, valores)
+
+    tabela = consultas.filtrar(tabela, lote=lote, valores=valores, **filtros)
+
+    return tabela.sort_values('ordem', kind='stable', na_position='last')
+
+'''
+  Retorna os agregados por usuário e treinamento a partir do resumo materializado, no mesmo formato de resumir. Chave é
+a coluna ou a lista de colunas que identifica o usuário (por padrão, chave_usuario) e os demais filtros seguem
+consultas.provas e consultas.provas_em_lote.
+'''
+def treinamentos(chave=None, lote=None, valores=None, **filtros):
+
+    tabela = _selecionar(lote=lote, valores=valores, **filtros)
+    grupos = agrupar(tabela, colunas_usuario(chave) + ['treinamento'])
+
+    return grupos.agg({'soma': 'sum', 'contagem': 'sum', 'primeira': 'first', 'maior': 'max'})
+
+# Retorna os pares nome/funcional distintos do resumo materializado, com racf, na ordem da primeira tentativa. Os
+# filtros seguem consultas.provas
+def usuarios(**filtros):
+
+    tabela = consultas.filtrar(_materializado['tabela'], **filtros).sort_values('inicio', kind='stable')
+
+    return tabela.drop_duplicates(subset=['nome', 'funcional'])[['nome', 'racf', 'funcional']].reset_index(drop=True)
+
+# Retorna os agregados de cada grupo do resumo materializado no mesmo formato de consultas.medias
+def medias(grupo, **filtros):
+
+    tabela = _selecionar(**filtros)
+    grupos = agrupar(tabela, [grupo])
+
+    return grupos.agg({'contagem': 'sum', 'soma': 'sum', 'maior': 'max', 'primeira': 'first'}).reset_index()
+
+'''
+  Retorna o resumo das provas (veja resumir) de uma categoria e/ou treinamento. Com o resumo materializado ativo, ele é
+montado a partir dele. Caso contrário, as provas são lidas em blocos de até tamanho linhas (veja ler).
+'''
+def resumo(categoria=None, treinamento=None, tamanho=None):
+
+    # Resumo materializado ativo
+    if ativo():
+        return {'treinamentos': treinamentos(categoria=categoria, treinamento=treinamento),
+                'usuarios': usuarios(categoria=categoria, treinamento=treinamento)}
+
+    return ler(categoria=categoria, treinamento=treinamento, tamanho=tamanho)
@@ -0,0 +1,151 @@
+import os
+import glob
+import pandas as pd
+
+"""
+    Neste arquivo, estão as funções da cópia local (snapshot) da tabela de provas e do catálogo de treinamentos.
+
+    A cópia local é uma pasta com arquivos Parquet. As provas ficam em partes, cada uma com as linhas trazidas em uma
+    atualização, e o catálogo fica em um único arquivo. As provas são gravadas com os tipos compactos de consultas.py
+    (colunas de texto categóricas e funcional inteiro), o que reduz bastante o espaço em disco e
+    em memória.
+
+    A atualização é incremental: apenas as provas com coluna_marca (por padrão, o [id] da tabela) maior que a maior já
+    gravada são buscadas no banco e gravadas em uma nova parte. O catálogo, que é pequeno, é relido por completo. A
+    função compactar junta as partes em uma só.
+
+    Com a cópia local ativa (veja ativar), as consultas de provas e do catálogo feitas por todos os arquivos
+    (consultas.py) são respondidas em memória a partir dela, sem acessar o banco.
+
+    É necessário ter o pyarrow instalado para ler e gravar os arquivos Parquet.
+
+"""
+
+from coeficiente import conexao, consultas
+
+"""VARIÁVEIS GLOBAIS"""
+# Coluna crescente da tabela de provas usada como marca d'água da atualização incremental
+coluna_marca = 'id'
+
+_query_novas = """SELECT
+	[{marca}],
+	[nome],
+	[racf],
+	[funcional],
+	[treinamento],
+	[nota],
+	[categoria]
+    FROM
+	[dbo].[coeficiente_mentoria]
+    WHERE
+	[{marca}] > ?
+    ORDER BY
+	[{marca}]"""
+_arquivo_catalogo = 'catalogo.parquet'
+_prefixo_parte = 'provas-'
+
+"""FUNÇÕES"""
+
+# Converte as provas para os tipos compactos, os mesmos das provas trazidas do banco (veja consultas.compactar)
+def compactar_tipos(provas):
+    return consultas.compactar(provas)
+
+# Lista os arquivos das partes de provas gravadas na pasta, em ordem de gravação
+def _partes(pasta):
+    return sorted(glob.glob(os.path.join(pasta, _prefixo_parte + '*.parquet')))
+
+# Lê as provas da cópia local. Retorna None se a pasta ainda não tem provas
+def carregar(pasta):
+
+    partes = _partes(pasta)
+
+    if not partes:
+        return None
+
+    provas = pd.concat([pd.read_parquet(parte) for parte in partes], ignore_index=True)
+
+    return compactar_tipos(provas)
+
+# Lê o catálogo de treinamentos da cópia local. Retorna None se a pasta ainda não tem catálogo
+def carregar_catalogo(pasta):
+
+    arquivo = os.path.join(pasta, _arquivo_catalogo)
+
+    if not os.path.exists(arquivo):
+        return None
+
+    return pd.read_parquet(arquivo)
+
+# Retorna a maior marca d'água gravada na cópia local, ou None se ela ainda não tem provas
+def marca(pasta):
+
+    partes = _partes(pasta)
+
+    if not partes:
+        return None
+
+    # O nome de cada parte termina com a maior marca que ela contém
+    return max(int(os.path.basename(parte)[len(_prefixo_parte):-len('.parquet')].split('-')[-1]) for parte in partes)
+
+'''
+  Atualiza a cópia local em pasta, criando-a se necessário. Apenas as provas com marca d'água maior que a última gravada
+são buscadas no banco e gravadas em uma nova parte. O catálogo de treinamentos é relido por completo.
+  Retorna o número de provas novas.
+'''
+def atualizar(pasta):
+
+    os.makedirs(pasta, exist_ok=True)
+
+    ultima = marca(pasta)
+    novas = conexao.ler_sql(_query_novas.format(marca=coluna_marca), [-1 if ultima is None else ultima])
+
+    if not novas.empty:
+        inicio, fim = novas[coluna_marca].min(), novas[coluna_marca].max()
+        nome = _prefixo_parte + '%012d-%012d.parquet' % (inicio, fim)
+        compactar_tipos(novas).to_parquet(os.path.join(pasta, nome), index=False)
+
+    consultas.treinamentos(local=False).to_parquet(os.path.join(pasta, _arquivo_catalogo), index=False)
+
+    return len(novas)
+
+# Junta todas as partes de provas da cópia local em uma única parte
+def compactar(pasta):
+
+    partes = _partes(pasta)
+
+    if len(partes) < 2:
+        return
+
+    provas = carregar(pasta)
+    inicio, fim = provas[coluna_marca].min(), provas[coluna_marca].max()
+    nome = os.path.join(pasta, _prefixo_parte + '%012d-%012d.parquet' % (inicio, fim))
+
+    provas.to_parquet(nome + '.tmp', index=False)
+
+    for parte in partes:
+        os.remove(parte)
+
+    os.replace(nome + '.tmp', nome)
+
+'''
+  Ativa a cópia local em pasta: as consultas de provas e do catálogo de todos os arquivos passam a ser respondidas a
+partir dela. Com sincronizar, a cópia é atualizada com o banco antes de ser ativada. Para voltar a consultar o banco,
+use desativar.
+'''
+def ativar(pasta, sincronizar=True):
+
+    if sincronizar:
+        atualizar(pasta)
+
+    provas = carregar(pasta)
+    treinamentos = carregar_catalogo(pasta)
+
+    # Cópia local vazia
+    if provas is None or treinamentos is None:
+        raise FileNotFoundError('Cópia local não encontrada em ' + pasta)
+
+    consultas.usar_local(provas, treinamentos)
+
+# Volta a responder as consultas a partir do banco
+def desativar():
+    consultas.usar_local(None, None)
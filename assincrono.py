@@ -0,0 +1,178 @@
+import asyncio
+import functools
+import concurrent.futures
+import threading
+
+"""
+    Neste arquivo, estão as versões assíncronas (asyncio) das consultas por usuário, para uso em servidores web
+    assíncronos.
+
+    As funções síncronas bloqueiam a thread enquanto esperam o banco. Aqui, cada consulta é executada em um executor de
+    threads de tamanho limitado, e o laço de eventos fica livre enquanto isso. Cada consulta pega a sua própria conexão
+    do pool (veja conexao.py), de modo que consultas simultâneas não disputam uma mesma conexão. Por padrão, o número de
+    threads é o tamanho do pool de conexões.
+
+    Nas funções de score, as consultas independentes são feitas ao mesmo tempo: o CR, o CP e as estatísticas da
+    população usadas no CRP (veja padrao.estatisticas). O CRP é calculado a partir do CR já consultado, sem repetir a
+    consulta. O mesmo vale para as funções de CRP.
+
+    Os argumentos e os resultados são os mesmos das funções síncronas de mesmo nome em rendimento.py, progressao.py,
+    padrao.py, media.py e final.py.
+
+"""
+
+from coeficiente import conexao, rendimento, progressao, padrao, media
+
+"""VARIÁVEIS GLOBAIS"""
+_executor = None
+_trava = threading.Lock()
+_trava_estatisticas = threading.Lock()
+
+# Número de threads do executor. None usa o tamanho do pool de conexões
+trabalhadores = None
+
+"""FUNÇÕES"""
+
+# Retorna o executor compartilhado, criando-o na primeira chamada
+def _obter_executor():
+
+    global _executor
+
+    with _trava:
+        if _executor is None:
+            _executor = concurrent.futures.ThreadPoolExecutor(max_workers=trabalhadores or conexao.tamanho(),
+                                                              thread_name_prefix='coeficiente')
+
+    return _executor
+
+# Executa uma função síncrona no executor sem bloquear o laço de eventos
+async def _executar(funcao, *args, **kwargs):
+
+    laco = asyncio.get_running_loop()
+
+    return await laco.run_in_executor(_obter_executor(), functools.partial(funcao, *args, **kwargs))
+
+# Encerra o executor. Um novo é criado na próxima consulta, com o número de trabalhadores atual
+def fechar():
+
+    global _executor
+
+    with _trava:
+        executor, _executor = _executor, None
+
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+"""RENDIMENTO"""
+
+# Versão assíncrona de rendimento.por_funcional
+async def rendimento_por_funcional(funcional, categoria=None, treinamento=None):
+    return await _executar(rendimento.por_funcional, funcional, categoria=categoria, treinamento=treinamento)
+
+# Versão assíncrona de rendimento.por_racf
+async def rendimento_por_racf(racf, categoria=None, treinamento=None):
+    return await _executar(rendimento.por_racf, racf, categoria=categoria, treinamento=treinamento)
+
+# Versão assíncrona de rendimento.por_nome
+async def rendimento_por_nome(nome, categoria=None, treinamento=None):
+    return await _executar(rendimento.por_nome, nome, categoria=categoria, treinamento=treinamento)
+
+"""PROGRESSÃO"""
+
+# Versão assíncrona de progressao.por_funcional
+async def progressao_por_funcional(funcional, categoria=None):
+    return await _executar(progressao.por_funcional, funcional, categoria=categoria)
+
+# Versão assíncrona de progressao.por_racf
+async def progressao_por_racf(racf, categoria=None):
+    return await _executar(progressao.por_racf, racf, categoria=categoria)
+
+# Versão assíncrona de progressao.por_nome
+async def progressao_por_nome(nome, categoria=None):
+    return await _executar(progressao.por_nome, nome, categoria=categoria)
+
+"""PADRÃO DE RENDIMENTO"""
+
+# Calcula o CRP a partir do CR e das estatísticas da população, como em padrao.por_funcional
+def _padronizar(cr, populacao):
+
+    # Caso uma das buscas retorne em erro
+    if cr is None or populacao is None:
+        return None
+
+    return (cr - populacao['media']) / populacao['desvio']
+
+# Consulta as estatísticas da população (veja padrao.estatisticas). Uma consulta por vez, para que muitas requisições
+# simultâneas com o cache vazio calculem as estatísticas uma única vez
+def _estatisticas(categoria=None):
+
+    with _trava_estatisticas:
+        return padrao.estatisticas(categoria=categoria)
+
+# Consulta ao mesmo tempo o CR do usuário e as estatísticas da população e retorna o CR e o CRP
+async def _cr_padrao(chave, valor, categoria=None):
+
+    cr, populacao = await asyncio.gather(_executar(getattr(rendimento, 'por_' + chave), valor, categoria=categoria),
+                                         _executar(_estatisticas, categoria=categoria))
+
+    return cr, _padronizar(cr, populacao)
+
+# Versão assíncrona de padrao.por_funcional
+async def padrao_por_funcional(funcional, categoria=None):
+    return (await _cr_padrao('funcional', funcional, categoria=categoria))[1]
+
+# Versão assíncrona de padrao.por_racf
+async def padrao_por_racf(racf, categoria=None):
+    return (await _cr_padrao('racf', racf, categoria=categoria))[1]
+
+# Versão assíncrona de padrao.por_nome
+async def padrao_por_nome(nome, categoria=None):
+    return (await _cr_padrao('nome', nome, categoria=categoria))[1]
+
+"""MÉDIAS"""
+
+# Versão assíncrona de media.por_funcional
+async def media_por_funcional(funcional, categoria=None, treinamento=None, opcao=None, no_banco=False):
+    return await _executar(media.por_funcional, funcional, categoria=categoria, treinamento=treinamento, opcao=opcao,
+                           no_banco=no_banco)
+
+# Versão assíncrona de media.por_racf
+async def media_por_racf(racf, categoria=None, treinamento=None, opcao=None, no_banco=False):
+    return await _executar(media.por_racf, racf, categoria=categoria, treinamento=treinamento, opcao=opcao,
+                           no_banco=no_banco)
+
+# Versão assíncrona de media.por_nome
+async def media_por_nome(nome, categoria=None, treinamento=None, opcao=None, no_banco=False):
+    return await _executar(media.por_nome, nome, categoria=categoria, treinamento=treinamento, opcao=opcao,
+                           no_banco=no_banco)
+
+"""SCORE FINAL"""
+
+# Consulta ao mesmo tempo o CR, o CP e as estatísticas da população e calcula o Score Final, como em final.por_funcional
+async def _score(chave, valor, categoria=None, base1=False):
+
+    (cr, crp), cp = await asyncio.gather(_cr_padrao(chave, valor, categoria=categoria),
+                                         _executar(getattr(progressao, 'por_' + chave), valor, categoria=categoria))
+
+    # Caso uma das buscas retorne em erro
+    if cr is None or cp is None or crp is None:
+        return None
+
+    score_final = ((100 * cr) + (100 * cp)) / 2 + crp
+
+    if base1:
+        return score_final / 100
+
+    return score_final
+
+# Versão assíncrona de final.por_funcional
+async def final_por_funcional(funcional, categoria=None, base1=False):
+    return await _score('funcional', funcional, categoria=categoria, base1=base1)
+
+# Versão assíncrona de final.por_racf
+async def final_por_racf(racf, categoria=None, base1=False):
+    return await _score('racf', racf, categoria=categoria, base1=base1)
+
+# Versão assíncrona de final.por_nome
+async def final_por_nome(nome, categoria=None, base1=False):
+    return await _score('nome', nome, categoria=categoria, base1=base1)
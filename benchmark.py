@@ -0,0 +1,316 @@
+import os
+import json
+import time
+import sqlite3
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+
+"""
+    Neste arquivo, está a suíte de benchmarks das funções públicas, executada sobre dados sintéticos.
+
+    Os dados são gerados em um banco SQLite local com as mesmas tabelas usadas pelas consultas (consultas.py):
+    coeficiente_mentoria, treinamento, prova e categoria. O banco é anexado com o nome dbo, de modo que as consultas
+    rodam sem alterações. O tamanho é dado pelo número de usuários. Cada usuário faz provas de uma a três categorias,
+    em alguns dos treinamentos de cada uma, com uma ou mais tentativas por treinamento e notas que tendem a melhorar
+    a cada tentativa. As provas de todos os usuários são intercaladas ao longo do tempo, como na tabela real.
+
+    Para cada função, são medidos:
+
+        - tempo: tempo total de execução, em segundos
+        - consultas: quantidade de consultas enviadas ao banco
+        - memoria: pico de memória alocada durante a execução, em MB (medido em uma segunda execução, com tracemalloc)
+
+    Os caches em memória (catálogo, estatísticas, índices de posições e resumo materializado) são descartados antes de
+    cada função. Funções que consultam o banco uma vez por usuário só são medidas até limite usuários.
+
+    Os resultados podem ser gravados como base e comparados com execuções seguintes. Uma função regride quando fica mais
+    lenta ou usa mais memória do que a base além da tolerância, ou quando faz mais consultas.
+
+    Uso:
+
+        python -m coeficiente.benchmark --usuarios 1000 10000 --salvar base.json
+        python -m coeficiente.benchmark --usuarios 1000 10000 --base base.json
+
+"""
+
+from coeficiente import conexao, rendimento, progressao, padrao, media, final, relatorio, posicoes, agregados
+
+"""VARIÁVEIS GLOBAIS"""
+_categorias = ['03 - VBA - Visual Basic', '04 - Python', '10 - Java', '13 - JavaScript', '01 - Excel', '02 - SQL',
+               '05 - Power BI', '06 - Git']
+
+# Quantidade de consultas feitas desde o início da função medida
+_consultas = {'total': 0}
+
+# Tamanhos padrão, em número de usuários
+tamanhos = [1000, 10000, 100000]
+
+# Aumento relativo de tempo e memória aceito antes de uma função ser considerada regressão
+tolerancia = 0.5
+
+# Funções medidas: nome, função (recebe a amostra de usuários) e número máximo de usuários (None para todos)
+casos = [
+    ('final.gerar_tabela', lambda amostra: final.gerar_tabela(funcional=True), None),
+    ('final.gerar_tabela[categoria]', lambda amostra: final.gerar_tabela(categoria='04 - Python'), None),
+    ('final.gerar_tabela[blocos]', lambda amostra: final.gerar_tabela(tamanho_bloco=100000), None),
+    ('final.por_funcional', lambda amostra: final.por_funcional(amostra['funcional']), None),
+    ('final.por_funcionais', lambda amostra: final.por_funcionais(amostra['funcionais']), None),
+    ('rendimento.ranking_coeficentes', lambda amostra: rendimento.ranking_coeficentes(funcional=True), None),
+    ('rendimento.rendimento_medio', lambda amostra: rendimento.rendimento_medio(), None),
+    ('rendimento.por_funcional', lambda amostra: rendimento.por_funcional(amostra['funcional']), None),
+    ('progressao.progressao_media', lambda amostra: progressao.progressao_media(), None),
+    ('progressao.ranking_progressao', lambda amostra: progressao.ranking_progressao(funcional=True), None),
+    ('padrao.estatisticas', lambda amostra: padrao.estatisticas(), None),
+    ('padrao.ranking_padrao', lambda amostra: padrao.ranking_padrao(funcional=True), None),
+    ('media.por_funcional', lambda amostra: media.por_funcional(amostra['funcional'], opcao='todas'), None),
+    ('media.por_categoria', lambda amostra: media.por_categoria('04 - Python', opcao='todas'), None),
+    ('media.por_categoria[no_banco]', lambda amostra: media.por_categoria('04 - Python', opcao='todas',
+                                                                            no_banco=True), None),
+    ('posicoes.posicao', lambda amostra: posicoes.posicao(funcional=amostra['funcional']), None),
+    ('agregados.materializar', lambda amostra: agregados.materializar(), None),
+    ('relatorio.gerar_rankings', lambda amostra: relatorio.gerar_rankings(), None),
+]
+
+"""FUNÇÕES"""
+
+'''
+  Gera um banco SQLite em caminho com dados sintéticos de usuarios usuários. Semente torna a geração reprodutível.
+  Retorna a quantidade de provas geradas.
+'''
+def gerar(caminho, usuarios=1000, semente=0):
+
+    aleatorio = np.random.default_rng(semente)
+
+    if os.path.exists(caminho):
+        os.remove(caminho)
+
+    con = sqlite3.connect(caminho)
+    con.executescript("""
+        CREATE TABLE categoria (id INTEGER PRIMARY KEY, descricao TEXT);
+        CREATE TABLE treinamento (id INTEGER PRIMARY KEY, titulo TEXT, categoria_id INTEGER);
+        CREATE TABLE prova (id INTEGER PRIMARY KEY, treinamento_id INTEGER);
+        CREATE TABLE coeficiente_mentoria (id INTEGER PRIMARY KEY, nome TEXT, racf TEXT, funcional INTEGER,
+                                           treinamento TEXT, nota REAL, categoria TEXT);
+    """)
+
+    # Catálogo: de 8 a 30 treinamentos por categoria, alguns com mais de uma prova
+    treinamentos = []
+    for indice, categoria in enumerate(_categorias, 1):
+        con.execute('INSERT INTO categoria VALUES (?, ?)', (indice, categoria))
+
+        for numero in range(int(aleatorio.integers(8, 31))):
+            titulo = categoria.split(' - ', 1)[1] + ' - Módulo ' + str(numero + 1)
+            treinamentos.append((len(treinamentos) + 1, titulo, indice))
+
+    con.executemany('INSERT INTO treinamento VALUES (?, ?, ?)', treinamentos)
+    con.executemany('INSERT INTO prova (treinamento_id) VALUES (?)',
+                    [(identificador,) for identificador, titulo, categoria in treinamentos
+                     for _ in range(1 + int(aleatorio.random() < 0.2))])
+
+    por_categoria = {}
+    for identificador, titulo, categoria in treinamentos:
+        por_categoria.setdefault(categoria, []).append(titulo)
+
+    # Provas: cada usuário escolhe categorias (as primeiras são mais populares), treinamentos e número de tentativas
+    popularidade = 1 / np.arange(1, len(_categorias) + 1)
+    popularidade = popularidade / popularidade.sum()
+    linhas = []
+
+    for usuario in range(usuarios):
+        nome = 'Usuário ' + str(usuario)
+        racf = 'R%06d' % usuario
+        funcional = 100000 + usuario
+        habilidade = aleatorio.normal(6.5, 1.5)
+        momento = aleatorio.random() * 365
+
+        escolhidas = aleatorio.choice(len(_categorias), size=int(aleatorio.integers(1, 4)), replace=False,
+                                      p=popularidade)
+
+        for categoria in escolhidas:
+            titulos = por_categoria[categoria + 1]
+            feitos = aleatorio.choice(len(titulos), size=int(aleatorio.integers(1, len(titulos) + 1)), replace=False)
+
+            for titulo in feitos:
+                tentativas = int(aleatorio.geometric(0.6))
+                notas = np.clip(habilidade + aleatorio.normal(0, 1.5, tentativas) + np.arange(tentativas), 0, 10)
+
+                for nota in np.round(notas, 1):
+                    momento += aleatorio.exponential(2)
+                    linhas.append((momento, nome, racf, funcional, titulos[titulo], float(nota),
+                                   _categorias[categoria]))
+
+    # As provas de todos os usuários são gravadas na ordem em que foram feitas
+    linhas.sort()
+
+    con.executemany('INSERT INTO coeficiente_mentoria (nome, racf, funcional, treinamento, nota, categoria) '
+                    'VALUES (?, ?, ?, ?, ?, ?)', [linha[1:] for linha in linhas])
+    con.execute('CREATE INDEX ix_categoria ON coeficiente_mentoria (categoria)')
+    con.execute('CREATE INDEX ix_funcional ON coeficiente_mentoria (funcional)')
+    con.execute('CREATE INDEX ix_racf ON coeficiente_mentoria (racf)')
+    con.execute('CREATE INDEX ix_nome ON coeficiente_mentoria (nome)')
+    con.commit()
+    con.close()
+
+    return len(linhas)
+
+# Conta uma consulta executada
+def _contar(sql):
+    _consultas['total'] += 1
+
+# Descarta os caches em memória, para que cada função seja medida a partir do zero
+def _limpar_caches():
+
+    progressao.invalidar_catalogo()
+    padrao.invalidar_estatisticas()
+    posicoes.invalidar()
+    agregados.descartar()
+
+# Executa uma função medindo tempo e consultas e, em uma segunda execução, o pico de memória
+def medir(funcao, *args):
+
+    _limpar_caches()
+    _consultas['total'] = 0
+    inicio = time.perf_counter()
+
+    try:
+        funcao(*args)
+
+    # A medição continua com as demais funções
+    except Exception as erro:
+        return {'erro': type(erro).__name__ + ': ' + str(erro)}
+
+    tempo = time.perf_counter() - inicio
+    consultas = _consultas['total']
+
+    _limpar_caches()
+    tracemalloc.start()
+
+    try:
+        funcao(*args)
+        memoria = tracemalloc.get_traced_memory()[1] / 2 ** 20
+
+    finally:
+        tracemalloc.stop()
+
+    return {'tempo': tempo, 'consultas': consultas, 'memoria': memoria}
+
+'''
+  Executa os benchmarks para cada tamanho em usuarios, gerando os bancos sintéticos em pasta (por padrão, uma pasta
+temporária). Filtro é uma lista opcional de nomes de funções.
+  Retorna um dicionário com as medidas de cada função por tamanho.
+'''
+def executar(usuarios=None, pasta=None, filtro=None, semente=0):
+
+    resultados = {}
+    pasta = pasta or tempfile.mkdtemp(prefix='benchmark-')
+    os.makedirs(pasta, exist_ok=True)
+
+    for tamanho in usuarios or tamanhos:
+        caminho = os.path.join(pasta, 'sintetico-%d.db' % tamanho)
+
+        if not os.path.exists(caminho):
+            gerar(caminho, usuarios=tamanho, semente=semente)
+
+        conexao.configurar(fabrica=conexao.fabrica_sqlite(caminho, rastrear=_contar))
+        amostra = {'funcional': str(100000 + tamanho // 2),
+                   'funcionais': [str(100000 + usuario) for usuario in range(0, tamanho, max(tamanho // 1000, 1))]}
+
+        medidas = {}
+        for nome, funcao, limite in casos:
+            if filtro and nome not in filtro:
+                continue
+
+            if limite is not None and tamanho > limite:
+                continue
+
+            medidas[nome] = medir(funcao, amostra)
+            print('%8d  %-34s %s' % (tamanho, nome, _formatar(medidas[nome])), flush=True)
+
+        resultados[str(tamanho)] = medidas
+
+    _limpar_caches()
+    conexao.configurar()
+
+    return resultados
+
+# Formata as medidas de uma função para exibição
+def _formatar(medidas):
+
+    if 'erro' in medidas:
+        return 'erro: ' + medidas['erro']
+
+    return '%9.3f s  %7d consultas  %9.1f MB' % (medidas['tempo'], medidas['consultas'], medidas['memoria'])
+
+# Grava os resultados como base em um arquivo JSON
+def salvar(resultados, arquivo):
+
+    with open(arquivo, 'w', encoding='utf-8') as saida:
+        json.dump(resultados, saida, indent=2, ensure_ascii=False)
+
+# Lê uma base gravada por salvar
+def carregar(arquivo):
+
+    with open(arquivo, encoding='utf-8') as entrada:
+        return json.load(entrada)
+
+'''
+  Compara os resultados com a base. Retorna a lista de regressões: funções mais lentas ou com mais memória do que a base
+além da tolerância, com mais consultas, ou que passaram a falhar.
+'''
+def comparar(resultados, base, tolerancia=tolerancia):
+
+    regressoes = []
+
+    for tamanho, medidas in resultados.items():
+        for nome, atual in medidas.items():
+            anterior = base.get(tamanho, {}).get(nome)
+
+            # Função sem base ou que já falhava
+            if anterior is None or 'erro' in anterior:
+                continue
+
+            if 'erro' in atual:
+                regressoes.append('%s [%s]: passou a falhar (%s)' % (nome, tamanho, atual['erro']))
+                continue
+
+            for medida in ['tempo', 'memoria']:
+                if atual[medida] > anterior[medida] * (1 + tolerancia):
+                    regressoes.append('%s [%s]: %s de %.3f para %.3f' % (nome, tamanho, medida, anterior[medida],
+                                                                         atual[medida]))
+
+            if atual['consultas'] > anterior['consultas']:
+                regressoes.append('%s [%s]: consultas de %d para %d' % (nome, tamanho, anterior['consultas'],
+                                                                        atual['consultas']))
+
+    return regressoes
+
+'''
+  Executa os benchmarks pela linha de comando. Com --salvar, os resultados são gravados como base. Com --base, são
+comparados com uma base gravada e o programa termina com erro se houver regressões.
+'''
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Mede tempo, consultas e memória das funções públicas.')
+    parser.add_argument('--usuarios', nargs='+', type=int, default=tamanhos, help='Tamanhos, em número de usuários')
+    parser.add_argument('--funcoes', nargs='+', default=None, help='Funções medidas. Por padrão, todas')
+    parser.add_argument('--pasta', default=None, help='Pasta dos bancos sintéticos, reaproveitados entre execuções')
+    parser.add_argument('--salvar', default=None, help='Arquivo JSON em que os resultados são gravados como base')
+    parser.add_argument('--base', default=None, help='Arquivo JSON de uma base para comparação')
+    parser.add_argument('--tolerancia', type=float, default=tolerancia, help='Aumento relativo aceito em tempo e memória')
+    argumentos = parser.parse_args()
+
+    resultados = executar(usuarios=argumentos.usuarios, pasta=argumentos.pasta, filtro=argumentos.funcoes)
+
+    if argumentos.salvar:
+        salvar(resultados, argumentos.salvar)
+
+    if argumentos.base:
+        regressoes = comparar(resultados, carregar(argumentos.base), tolerancia=argumentos.tolerancia)
+
+        for regressao in regressoes:
+            print('Regressão: ' + regressao)
+
+        if regressoes:
+            raise SystemExit(1)
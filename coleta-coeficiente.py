@@ -1,19 +1,44 @@
-from coeficiente import final
-import pandas as pd
-'''
-ranking_vba = final.gerar_tabela(categoria='03 - VBA - Visual Basic', funcional=True)
-ranking_vba.to_excel('ranking_vba.xlsx', sheet_name='Ranking VBA')
+from coeficiente import relatorio, perfil
+import argparse
+import contextlib
 
-ranking_java = final.gerar_tabela(categoria='10 - Java', funcional=True)
-ranking_java.to_excel('ranking_java.xlsx', sheet_name='Ranking Java')
 '''
-ranking_python = final.gerar_tabela(categoria='04 - Python', funcional=True)
-ranking_python.to_excel('ranking_python.xlsx', sheet_name='Ranking Python')
+  Exporta os rankings de Score Final de todas as categorias e o ranking geral. As provas são lidas uma única vez e os
+rankings são gravados como abas de uma única planilha ou, com --separado, como planilhas separadas (ranking_vba.xlsx,
+ranking_java.xlsx, ranking_python.xlsx, ranking_js.xlsx, ranking_geral.xlsx, ...). Os rankings são gravados em fluxo,
+uma categoria por vez e em blocos de linhas na ordem do ranking (veja relatorio.exportar_em_fluxo). Com --formato csv ou
+parquet, cada ranking é gravado em um arquivo próprio dentro de --pasta.
+  Com --perfil, o tempo e a memória de cada etapa do cálculo são medidos e gravados em um relatório JSON (veja
+perfil.py).
 '''
-ranking_js = final.gerar_tabela(categoria='13 - JavaScript', funcional=True)
-ranking_js.to_excel('ranking_js.xlsx', sheet_name='Ranking JavaScript')
+if __name__ == '__main__':
 
-rankig_geral = final.gerar_tabela(funcional=True)
-rankig_geral.to_excel('ranking_geral.xlsx', sheet_name="Ranking Geral")
-'''
+    parser = argparse.ArgumentParser(description='Exporta os rankings de Score Final por categoria.')
+    parser.add_argument('--categorias', nargs='+', default=None,
+                        help='Categorias exportadas. Por padrão, todas as categorias com provas')
+    parser.add_argument('--sem-geral', action='store_true', help='Não exporta o ranking geral')
+    parser.add_argument('--separado', action='store_true', help='Grava cada ranking em uma planilha própria')
+    parser.add_argument('--arquivo', default='rankings.xlsx', help='Planilha gerada quando os rankings não são separados')
+    parser.add_argument('--processos', type=int, default=1, help='Número de processos usados no cálculo das categorias')
+    parser.add_argument('--formato', choices=sorted(relatorio.formatos), default='xlsx',
+                        help='Formato dos rankings. Em csv e parquet, cada ranking é gravado em um arquivo próprio')
+    parser.add_argument('--pasta', default='.', help='Pasta dos rankings gravados em arquivos próprios')
+    parser.add_argument('--tamanho-bloco', type=int, default=None,
+                        help='Lê as provas de cada categoria em blocos deste número de linhas, sem carregá-las de uma vez')
+    parser.add_argument('--perfil', default=None,
+                        help='Relatório JSON com o tempo e a memória de cada etapa do cálculo')
+    argumentos = parser.parse_args()
+
+    with perfil.perfilar() if argumentos.perfil else contextlib.nullcontext() as execucao:
+        relatorio.exportar_em_fluxo(arquivo=argumentos.arquivo,
+                                    formato=argumentos.formato,
+                                    separado=argumentos.separado,
+                                    pasta=argumentos.pasta,
+                                    categorias=argumentos.categorias,
+                                    geral=not argumentos.sem_geral,
+                                    processos=argumentos.processos,
+                                    tamanho_bloco=argumentos.tamanho_bloco,
+                                    funcional=True)
 
+    if argumentos.perfil:
+        perfil.salvar(execucao, argumentos.perfil)
@@ -0,0 +1,182 @@
+import contextlib
+import queue
+import sqlite3
+import threading
+import pandas as pd
+from coeficiente import instrumentacao
+
+"""
+    Neste arquivo, está a camada de conexão com o banco compartilhada por todos os demais arquivos.
+
+    As conexões são abertas de forma preguiçosa, apenas quando a primeira consulta é feita, e reaproveitadas a partir de
+    um pool de tamanho limitado. Cada consulta pega uma conexão livre do pool e a devolve ao final, de modo que uma
+    mesma conexão nunca é usada por duas threads ao mesmo tempo. Quando todas as conexões estão em uso e o limite foi
+    atingido, a consulta aguarda uma conexão ser devolvida.
+
+    Por padrão, a conexão é feita via pyodbc com a string de conexão abaixo. A função configurar permite trocar a
+    string de conexão (DSN) ou informar uma fábrica de conexões, isto é, uma função sem argumentos que retorna uma nova
+    conexão DB-API. Isso permite usar, por exemplo, um banco SQLite local no lugar do SQL Server (veja fabrica_sqlite).
+
+    Todas as consultas podem ser medidas pela instrumentação (veja instrumentacao.py).
+
+"""
+
+"""VARIÁVEIS GLOBAIS"""
+_dsn = r'Driver={ODBC Driver 17 for SQL Server};Server=10.58.56.161;Database=mentoria;Trusted_Connection=yes;Encrypt=no'
+_fabrica = None
+_tamanho = 4
+_livres = queue.LifoQueue()
+_abertas = 0
+_geracao = 0
+_trava = threading.Lock()
+
+"""FUNÇÕES"""
+
+'''
+  Configura a conexão com o banco. DSN é a string de conexão usada pelo pyodbc e fábrica é uma função sem argumentos
+que retorna uma nova conexão, usada no lugar do pyodbc quando informada. Tamanho é o número máximo de conexões abertas
+ao mesmo tempo. As conexões livres são fechadas e as que estão em uso são fechadas ao serem devolvidas.
+'''
+def configurar(dsn=None, fabrica=None, tamanho=None):
+
+    global _dsn, _fabrica, _tamanho, _geracao
+
+    with _trava:
+        if dsn is not None:
+            _dsn = dsn
+        if tamanho is not None:
+            _tamanho = tamanho
+        _fabrica = fabrica
+        _geracao += 1
+
+    fechar()
+
+'''
+  Retorna uma fábrica de conexões (veja configurar) para o banco SQLite em caminho, anexado como dbo, de modo que as
+consultas rodam sem alterações. Rastrear é uma função opcional chamada com o texto de cada consulta executada.
+'''
+def fabrica_sqlite(caminho, rastrear=None):
+
+    def conectar():
+
+        con = sqlite3.connect(':memory:', check_same_thread=False)
+        con.execute('ATTACH DATABASE ? AS dbo', (caminho,))
+
+        if rastrear is not None:
+            con.set_trace_callback(rastrear)
+
+        return con
+
+    return conectar
+
+# Retorna o número máximo de conexões abertas ao mesmo tempo
+def tamanho():
+    return _tamanho
+
+# Retorna a geração da configuração, que muda a cada chamada de configurar. Permite descartar caches de outro banco
+def geracao():
+    return _geracao
+
+# Abre uma nova conexão com a fábrica configurada ou, por padrão, com o pyodbc
+def _conectar():
+
+    if _fabrica is not None:
+        return _fabrica()
+
+    import pyodbc
+    return pyodbc.connect(_dsn)
+
+# Empresta uma conexão do pool, abrindo uma nova se ainda houver espaço, e a devolve ao final do bloco with
+@contextlib.contextmanager
+def obter():
+
+    global _abertas
+
+    while True:
+
+        try:
+            con, geracao = _livres.get_nowait()
+            break
+
+        except queue.Empty:
+            pass
+
+        with _trava:
+            abrir = _abertas < _tamanho
+            if abrir:
+                _abertas += 1
+            geracao = _geracao
+
+        if abrir:
+            try:
+                con = _conectar()
+            except Exception:
+                with _trava:
+                    _abertas -= 1
+                raise
+            break
+
+        # Limite atingido: aguarda uma conexão ser devolvida ou uma vaga ser liberada
+        try:
+            con, geracao = _livres.get(timeout=1)
+            break
+
+        except queue.Empty:
+            pass
+
+    try:
+        yield con
+    finally:
+
+        # Conexões abertas antes de uma nova configuração são fechadas em vez de voltarem ao pool
+        if geracao == _geracao:
+            _livres.put((con, geracao))
+        else:
+            _descartar(con)
+
+# Executa uma consulta com uma conexão do pool e retorna o resultado em um DataFrame. Params são parâmetros opcionais
+def ler_sql(sql, params=None):
+
+    with obter() as con:
+
+        # Instrumentação ativa (veja instrumentacao.py)
+        if instrumentacao.ativa():
+            return instrumentacao.ler_sql(con, sql, params)
+
+        return pd.read_sql_query(sql, con, params=params or None)
+
+# Executa uma consulta e retorna o resultado em blocos de até tamanho linhas, um DataFrame por vez. A conexão fica
+# emprestada até que todos os blocos sejam lidos
+def ler_sql_em_blocos(sql, params=None, tamanho=100000):
+
+    with obter() as con:
+
+        # Instrumentação ativa (veja instrumentacao.py)
+        if instrumentacao.ativa():
+            yield from instrumentacao.ler_sql_em_blocos(con, sql, params, tamanho=tamanho)
+        else:
+            yield from pd.read_sql_query(sql, con, params=params or None, chunksize=tamanho)
+
+# Fecha uma conexão e libera sua vaga no pool
+def _descartar(con):
+
+    global _abertas
+
+    with _trava:
+        _abertas -= 1
+
+    try:
+        con.close()
+    except Exception:
+        pass
+
+# Fecha todas as conexões livres do pool
+def fechar():
+
+    while True:
+        try:
+            con, geracao = _livres.get_nowait()
+        except queue.Empty:
+            break
+
+        _descartar(con)
@@ -0,0 +1,493 @@
+import time
+import pandas as pd
+from coeficiente import conexao, agregados, identidades
+
+"""
+    Neste arquivo, estão as consultas ao banco usadas pelos demais arquivos.
+
+    Todas as consultas são parametrizadas: os valores dos filtros (funcional, racf, nome, categoria e treinamento) são
+    enviados como parâmetros e nunca concatenados ao texto SQL. Assim, cada combinação de filtros gera sempre o mesmo
+    texto, o servidor compila o plano de execução uma única vez e o reaproveita em todas as buscas. Isso também evita
+    erros com valores que contêm apóstrofos, como nomes do tipo D'Ávila.
+
+    Os filtros são sempre montados na mesma ordem, independentemente da ordem em que são informados.
+
+    As consultas em lote buscam vários usuários de uma vez com uma cláusula IN. Listas muito grandes são divididas em
+    lotes de até tamanho_lote identificadores. A quantidade de parâmetros de cada lote é arredondada para a próxima
+    potência de 2, repetindo o último identificador, para que poucos formatos de consulta diferentes cheguem ao
+    servidor.
+
+    A consulta em blocos lê as provas aos poucos, em DataFrames de tamanho limitado, para que a tabela inteira nunca
+    precise estar na memória de uma só vez (veja agregados.py).
+
+    A consulta de médias faz a agregação no próprio banco: as provas são agrupadas e apenas uma linha por grupo, com a
+    quantidade, a soma, a maior nota e a nota da primeira tentativa, é transferida. A primeira tentativa é a prova com
+    nota de menor coluna_ordem dentro do grupo.
+
+    As consultas de provas (individuais, em lote e em blocos) são ordenadas por coluna_ordem, na ordem em que as provas
+    foram feitas (veja ordenar). Assim, a primeira nota de cada treinamento, escolhida com groupby().first(), é sempre a
+    mesma, qualquer que seja o plano de execução do servidor.
+
+    A consulta ordenada traz as provas na ordem em que foram feitas, junto com coluna_ordem, a partir de uma marca. Ela
+    é usada na construção e na atualização do resumo materializado (veja agregados.py).
+
+    As marcas d'água (veja marca_provas e marca_treinamentos) resumem o estado das provas e do catálogo em uma linha:
+    quantidade, maior coluna_ordem (ou id da prova) e, nas provas, a soma das notas. Os caches calculados a partir de
+    todas as provas (estatísticas do CRP, catálogo e índices de posições) as consultam quando a validade expira e só são
+    recalculados se elas mudaram.
+
+    Quando a cópia local está ativa (veja armazenamento.py), as consultas de provas e do catálogo são respondidas em
+    memória a partir dela, com os mesmos filtros, sem acessar o banco.
+
+    Nas buscas por nome, o nome é resolvido antes da consulta pelo índice de nomes distintos da tabela (veja nomes e
+    identidades.py): o nome exato tem preferência e, se ele não existir, são buscados os nomes que diferem apenas em
+    maiúsculas, acentos e espaços. É a mesma regra do resumo materializado, de modo que a busca por nome dá o mesmo
+    resultado no banco, na cópia local e no resumo. O índice fica em cache por validade_nomes segundos.
+
+    As provas trazidas do banco são convertidas para tipos compactos (veja compactar): as colunas de texto, repetidas em
+    todas as linhas, passam a ser categóricas, guardadas como códigos inteiros e um dicionário de valores distintos, e o
+    funcional passa a ser inteiro. Os agrupamentos por nome, treinamento ou categoria são feitos sobre os códigos
+    (sempre com observed=True), o que reduz a memória e o tempo dos agrupamentos na tabela inteira. Todos os resultados
+    são convertidos, qualquer que seja o tamanho, para que os tipos não dependam da quantidade de linhas. As consultas
+    em blocos não são convertidas, já que cada bloco é resumido logo em seguida. Nas tabelas e índices retornados pelas
+    funções públicas, as colunas categóricas voltam ao tipo dos seus valores (veja expandir), de modo que os tipos são os
+    mesmos com ou sem os tipos compactos, na leitura em blocos e com o resumo materializado.
+
+"""
+
+"""VARIÁVEIS GLOBAIS"""
+_query = """SELECT
+	[nome],
+	[racf],
+	[funcional],
+	[treinamento],
+	[nota],
+	[categoria]
+    FROM
+	[dbo].[coeficiente_mentoria]"""
+_query_treinamentos = """SELECT
+	Treinamento.[titulo] AS 'Treinamento',
+	Categoria.[descricao] AS 'Categoria'
+    FROM
+	(([dbo].[treinamento] AS Treinamento
+	INNER JOIN [dbo].[prova] AS Prova ON Treinamento.[id] = Prova.[treinamento_id])
+	INNER JOIN [dbo].[categoria] AS Categoria ON Treinamento.[categoria_id] = Categoria.[id])"""
+_query_grupos = """SELECT
+	[{grupo}],
+	[nota],
+	ROW_NUMBER() OVER (PARTITION BY [{grupo}] ORDER BY CASE WHEN [nota] IS NULL THEN 1 ELSE 0 END, [{ordem}]) AS [tentativa]
+    FROM
+	[dbo].[coeficiente_mentoria]"""
+_query_medias = """SELECT
+	Provas.[{grupo}],
+	COUNT(Provas.[nota]) AS [contagem],
+	SUM(Provas.[nota]) AS [soma],
+	MAX(Provas.[nota]) AS [maior],
+	MAX(CASE WHEN Provas.[tentativa] = 1 THEN Provas.[nota] END) AS [primeira]
+    FROM
+	({provas}) AS Provas
+    GROUP BY
+	Provas.[{grupo}]"""
+
+_query_ordenada = """SELECT
+	[{ordem}],
+	[nome],
+	[racf],
+	[funcional],
+	[treinamento],
+	[nota],
+	[categoria]
+    FROM
+	[dbo].[coeficiente_mentoria]
+    WHERE
+	[{ordem}] > ?
+    ORDER BY
+	[{ordem}]"""
+
+_query_nomes = """SELECT DISTINCT
+	[nome]
+    FROM
+	[dbo].[coeficiente_mentoria]"""
+
+_query_categorias = """SELECT DISTINCT
+	[categoria]
+    FROM
+	[dbo].[coeficiente_mentoria]"""
+
+_query_marca = """SELECT
+	COUNT(*) AS [provas],
+	MAX([{ordem}]) AS [ultima],
+	SUM([nota]) AS [soma]
+    FROM
+	[dbo].[coeficiente_mentoria]"""
+
+_query_marca_treinamentos = """SELECT
+	COUNT(*) AS [provas],
+	MAX(Prova.[id]) AS [ultima]
+    FROM
+	(([dbo].[treinamento] AS Treinamento
+	INNER JOIN [dbo].[prova] AS Prova ON Treinamento.[id] = Prova.[treinamento_id])
+	INNER JOIN [dbo].[categoria] AS Categoria ON Treinamento.[categoria_id] = Categoria.[id])"""
+
+# Coluna crescente da tabela de provas que dá a ordem em que as provas foram feitas
+coluna_ordem = 'id'
+
+# Colunas retornadas pela consulta de provas
+_colunas = ['nome', 'racf', 'funcional', 'treinamento', 'nota', 'categoria']
+
+# Colunas que podem ser usadas como filtro, na ordem em que aparecem na cláusula WHERE
+_filtros = ['funcional', 'racf', 'nome', 'categoria', 'treinamento']
+
+# Provas e catálogo da cópia local. Quando None, as consultas são feitas no banco
+_local = {'provas': None, 'treinamentos': None}
+
+# Índice de nomes em cache (veja nomes), com a origem a partir da qual foi montado (provas da cópia local e geração da
+# conexão) e o instante da montagem
+_nomes = {'indice': None, 'provas': None, 'geracao': None, 'instante': None}
+
+# Tempo, em segundos, em que o índice de nomes do banco é usado antes de ser consultado novamente
+validade_nomes = 300
+
+# Tipos compactos das colunas de provas (veja compactar). O funcional é convertido à parte. A nota é mantida em float de
+# 64 bits: em 32 bits, notas como 8.3 são arredondadas e os scores mudam na sétima casa, o que pode trocar a ordem de
+# usuários empatados nos rankings
+tipos = {'nome': 'category', 'racf': 'category', 'treinamento': 'category', 'categoria': 'category', 'nota': 'float64'}
+
+# Converte as provas trazidas do banco para os tipos compactos. Quando falso, as provas mantêm os tipos do pd.read_sql
+tipos_compactos = True
+
+# Quantidade máxima de identificadores por consulta em lote. O SQL Server aceita até 2100 parâmetros por consulta
+tamanho_lote = 1000
+
+"""FUNÇÕES"""
+
+'''
+  Monta uma consulta com filtros parametrizados. Base é o texto da consulta sem a cláusula WHERE (por padrão, a consulta
+de provas) e filtros são os valores de funcional, racf, nome, categoria e/ou treinamento. Filtros com valor None são
+ignorados. Retorna o texto SQL e a lista de parâmetros.
+'''
+def montar(base=_query, **filtros):
+
+    condicoes = []
+    parametros = []
+
+    for coluna in _filtros:
+        valor = filtros.pop(coluna, None)
+
+        if valor is not None:
+            condicoes.append('[' + coluna + '] = ?')
+            parametros.append(valor)
+
+    # Filtro desconhecido
+    if filtros:
+        raise TypeError('Filtro inválido: ' + ', '.join(filtros))
+
+    if condicoes:
+        return base + '\nWHERE ' + ' AND '.join(condicoes), parametros
+
+    return base, parametros
+
+# Acrescenta a uma consulta montada (veja montar) a ordenação por coluna_ordem, na ordem em que as provas foram feitas
+def ordenar(sql, parametros):
+    return sql + '\nORDER BY [' + coluna_ordem + ']', parametros
+
+'''
+  Converte as provas para os tipos compactos (veja tipos): texto como categoria e funcional como inteiro de 64 bits,
+qualquer que seja o maior funcional. O funcional só é convertido quando todos os valores são inteiros escritos sem zeros
+à esquerda, para que a conversão não altere nenhum funcional. Colunas ausentes são ignoradas.
+'''
+def compactar(provas):
+
+    provas = provas.astype({coluna: tipo for coluna, tipo in tipos.items() if coluna in provas.columns})
+
+    # A verificação é feita sobre os funcionais distintos
+    if 'funcional' in provas.columns and not pd.api.types.is_numeric_dtype(provas['funcional'].dtype):
+        distintos = pd.Series(provas['funcional'].unique())
+        numeros = pd.to_numeric(distintos, errors='coerce')
+
+        if numeros.notna().all() and (numeros.astype('int64').astype(str) == distintos.astype(str)).all():
+            provas['funcional'] = provas['funcional'].astype('int64')
+
+    elif 'funcional' in provas.columns and pd.api.types.is_integer_dtype(provas['funcional'].dtype):
+        provas['funcional'] = provas['funcional'].astype('int64')
+
+    return provas
+
+# Converte provas trazidas do banco para os tipos compactos, se estiver habilitado
+def _compactar(provas):
+
+    if tipos_compactos:
+        return compactar(provas)
+
+    return provas
+
+# Converte valores categóricos (série ou índice) de volta ao tipo dos seus valores. Demais tipos são mantidos
+def expandir(valores):
+
+    if isinstance(valores.dtype, pd.CategoricalDtype):
+        return valores.astype(valores.dtype.categories.dtype)
+
+    return valores
+
+'''
+  Retorna os nomes da tabela de provas buscados para um nome: o próprio nome, se ele existe, ou os nomes que diferem
+dele apenas em maiúsculas, acentos e espaços (veja identidades.resolver). O índice de nomes é montado a partir da cópia
+local, se estiver ativa, ou de uma consulta dos nomes distintos no banco, guardada em cache por validade_nomes segundos.
+'''
+def nomes(nome):
+
+    provas_locais = _local['provas']
+    agora = time.monotonic()
+
+    # Índice ausente, de outra origem ou, no banco, com a validade expirada
+    if _nomes['indice'] is None or _nomes['provas'] is not provas_locais or _nomes['geracao'] != conexao.geracao() or \
+            (provas_locais is None and agora - _nomes['instante'] >= validade_nomes):
+
+        if provas_locais is not None:
+            distintos = provas_locais['nome'].unique()
+        else:
+            distintos = conexao.ler_sql(_query_nomes)['nome']
+
+        _nomes.update(indice=identidades.indice_nomes(pd.Series(distintos).tolist()), provas=provas_locais,
+                      geracao=conexao.geracao(), instante=agora)
+
+    return identidades.resolver(_nomes['indice'], nome)
+
+# Descarta o índice de nomes em cache, para que a próxima busca por nome consulte os nomes novamente
+def invalidar_nomes():
+    _nomes.update(indice=None, provas=None, geracao=None, instante=None)
+
+'''
+  Monta uma consulta com os filtros de montar em que o nome já foi resolvido para uma lista de nomes (veja nomes). Com
+um só nome, a consulta é a mesma de montar; com vários, eles são buscados com uma cláusula IN, como em montar_lote.
+'''
+def _montar_nomes(base, nomes_busca, **filtros):
+
+    if nomes_busca is None or len(nomes_busca) == 1:
+        return montar(base, nome=None if nomes_busca is None else nomes_busca[0], **filtros)
+
+    return montar_lote('nome', nomes_busca, base=base, **filtros)
+
+# Consulta as provas realizadas. Funcional, racf, nome, categoria e treinamento são filtros opcionais
+def provas(funcional=None, racf=None, nome=None, categoria=None, treinamento=None):
+
+    nomes_busca = None if nome is None else nomes(nome)
+
+    # Cópia local ativa
+    if _local['provas'] is not None:
+        return filtrar(_local['provas'], lote=None if nome is None else 'nome', valores=nomes_busca,
+                       funcional=funcional, racf=racf, categoria=categoria, treinamento=treinamento)
+
+    sql, parametros = _montar_nomes(_query, nomes_busca, funcional=funcional, racf=racf, categoria=categoria,
+                                    treinamento=treinamento)
+
+    return _compactar(conexao.ler_sql(*ordenar(sql, parametros)))
+
+# Consulta as categorias distintas das provas realizadas, em ordem e sem a categoria nula
+def categorias():
+
+    # Cópia local ativa
+    if _local['provas'] is not None:
+        valores = _local['provas']['categoria']
+    else:
+        valores = conexao.ler_sql(_query_categorias)['categoria']
+
+    return sorted(valores.dropna().unique().tolist())
+
+# Consulta o catálogo de treinamentos com prova e suas categorias. Local permite ignorar a cópia local ativa
+def treinamentos(local=True):
+
+    # Cópia local ativa
+    if local and _local['treinamentos'] is not None:
+        return _local['treinamentos']
+
+    return conexao.ler_sql(_query_treinamentos)
+
+# Passa a responder as consultas de provas e do catálogo a partir dos DataFrames informados. None volta a usar o banco
+def usar_local(provas, treinamentos):
+
+    _local['provas'] = provas
+    _local['treinamentos'] = treinamentos
+
+# Retorna as provas da cópia local ativa, ou None quando as consultas são feitas no banco
+def local():
+    return _local['provas']
+
+# Converte uma linha de marca d'água em tupla, com None no lugar de valores nulos, para que marcas iguais sejam iguais
+def _marca(valores):
+    return tuple(None if pd.isna(valor) else valor for valor in valores)
+
+# Consulta a marca d'água das provas: quantidade, maior coluna_ordem e soma das notas. Categoria é um filtro opcional
+def marca_provas(categoria=None):
+
+    provas = _local['provas']
+
+    # Cópia local ativa
+    if provas is not None:
+        if categoria is not None:
+            provas = provas[provas['categoria'] == categoria]
+        return _marca([len(provas), provas[coluna_ordem].max(), provas['nota'].sum()])
+
+    marca = conexao.ler_sql(*montar(_query_marca.format(ordem=coluna_ordem), categoria=categoria))
+
+    return _marca(marca.iloc[0])
+
+# Consulta a marca d'água do catálogo de treinamentos com prova: quantidade de provas e maior id de prova. Na cópia
+# local, que não guarda o id, a marca é a quantidade e um hash do catálogo
+def marca_treinamentos():
+
+    treinamentos = _local['treinamentos']
+
+    # Cópia local ativa
+    if treinamentos is not None:
+        return _marca([len(treinamentos), pd.util.hash_pandas_object(treinamentos, index=False).sum()])
+
+    return _marca(conexao.ler_sql(_query_marca_treinamentos).iloc[0])
+
+# Converte um valor de filtro para o tipo da coluna, já que o funcional pode ser informado como texto
+def _valor(coluna, valor):
+
+    if pd.api.types.is_numeric_dtype(coluna.dtype):
+        return pd.to_numeric(valor, errors='coerce')
+
+    return valor
+
+# Aplica em memória os mesmos filtros de montar sobre as provas da cópia local ou outra tabela com as mesmas colunas.
+# Lote é uma coluna filtrada por vários valores, como na consulta em lote
+def filtrar(dados, lote=None, valores=None, **filtros):
+
+    selecao = pd.Series(True, index=dados.index)
+
+    for coluna in _filtros:
+        valor = filtros.pop(coluna, None)
+
+        if valor is not None:
+            selecao &= dados[coluna] == _valor(dados[coluna], valor)
+
+    # Filtro desconhecido
+    if filtros:
+        raise TypeError('Filtro inválido: ' + ', '.join(filtros))
+
+    if lote is not None:
+        selecao &= dados[lote].isin([_valor(dados[lote], valor) for valor in valores])
+
+    return dados[selecao].reset_index(drop=True)
+
+'''
+  Monta uma consulta em lote, que busca vários valores de uma coluna com uma cláusula IN. Coluna é funcional, racf ou
+nome e os demais filtros seguem montar. Retorna o texto SQL e a lista de parâmetros.
+'''
+def montar_lote(coluna, valores, base=_query, **filtros):
+
+    # Coluna desconhecida
+    if coluna not in _filtros:
+        raise TypeError('Filtro inválido: ' + coluna)
+
+    sql, parametros = montar(base, **filtros)
+    condicao = '[' + coluna + '] IN (' + ', '.join(['?'] * len(valores)) + ')'
+
+    if parametros:
+        return sql + ' AND ' + condicao, parametros + list(valores)
+
+    return sql + '\nWHERE ' + condicao, list(valores)
+
+# Divide uma lista de identificadores em lotes de até tamanho_lote, completando cada lote até uma potência de 2
+def _lotes(valores):
+
+    valores = list(dict.fromkeys(valores))
+
+    for inicio in range(0, len(valores), tamanho_lote):
+        lote = valores[inicio:inicio + tamanho_lote]
+
+        tamanho = 1
+        while tamanho < len(lote):
+            tamanho *= 2
+
+        yield lote + [lote[-1]] * (min(tamanho, tamanho_lote) - len(lote))
+
+# Consulta as provas de vários usuários de uma vez. Coluna é funcional, racf ou nome. Categoria e treinamento são
+# filtros opcionais
+def provas_em_lote(coluna, valores, categoria=None, treinamento=None):
+
+    # Nomes resolvidos como em provas
+    if coluna == 'nome':
+        valores = [resolvido for valor in valores for resolvido in nomes(valor)]
+
+    # Cópia local ativa
+    if _local['provas'] is not None:
+        return filtrar(_local['provas'], lote=coluna, valores=list(valores), categoria=categoria,
+                        treinamento=treinamento)
+
+    resultados = [conexao.ler_sql(*ordenar(*montar_lote(coluna, lote, categoria=categoria, treinamento=treinamento)))
+                  for lote in _lotes(valores)]
+
+    # Lista vazia
+    if not resultados:
+        return pd.DataFrame(columns=_colunas)
+
+    return _compactar(pd.concat(resultados, ignore_index=True))
+
+# Consulta as provas realizadas em blocos de até tamanho linhas, na ordem em que foram feitas. Categoria e treinamento são filtros
+# opcionais. Retorna um gerador de DataFrames, com ao menos um DataFrame, vazio quando não há provas
+def provas_em_blocos(tamanho, categoria=None, treinamento=None):
+
+    # Cópia local ativa
+    if _local['provas'] is not None:
+        dados = filtrar(_local['provas'], categoria=categoria, treinamento=treinamento)
+        blocos = (dados.iloc[inicio:inicio + tamanho] for inicio in range(0, len(dados), tamanho))
+
+    else:
+        blocos = conexao.ler_sql_em_blocos(*ordenar(*montar(categoria=categoria, treinamento=treinamento)),
+                                           tamanho=tamanho)
+
+    vazio = True
+
+    for bloco in blocos:
+        vazio = False
+        yield bloco
+
+    # Nenhuma prova
+    if vazio:
+        yield pd.DataFrame(columns=_colunas)
+
+'''
+  Consulta as provas agregadas no banco por grupo (treinamento, nome, funcional ou racf). Funcional, racf, nome, categoria
+e treinamento são filtros opcionais. Retorna uma linha por grupo, com a quantidade de notas (contagem), a soma das notas
+(soma), a maior nota (maior) e a nota da primeira tentativa (primeira).
+'''
+def medias(grupo, funcional=None, racf=None, nome=None, categoria=None, treinamento=None):
+
+    # Grupo desconhecido
+    if grupo not in _filtros:
+        raise TypeError('Grupo inválido: ' + grupo)
+
+    nomes_busca = None if nome is None else nomes(nome)
+
+    # Cópia local ativa. As provas já estão na ordem em que foram feitas
+    if _local['provas'] is not None:
+        dados = filtrar(_local['provas'], lote=None if nome is None else 'nome', valores=nomes_busca,
+                        funcional=funcional, racf=racf, categoria=categoria, treinamento=treinamento)
+        grupos = agregados.agrupar(dados, [grupo])['nota']
+
+        return grupos.agg(['count', 'sum', 'max', 'first']).set_axis(['contagem', 'soma', 'maior', 'primeira'],
+                                                                     axis=1).reset_index()
+
+    sql, parametros = _montar_nomes(_query_grupos.format(grupo=grupo, ordem=coluna_ordem), nomes_busca,
+                                    funcional=funcional, racf=racf, categoria=categoria, treinamento=treinamento)
+
+    return conexao.ler_sql(_query_medias.format(grupo=grupo, provas=sql), parametros)
+
+# Consulta as provas com coluna_ordem maior que desde (por padrão, todas), na ordem em que foram feitas, em blocos de até
+# tamanho linhas. Retorna um gerador de DataFrames que incluem a coluna_ordem
+def provas_em_ordem(tamanho, desde=None):
+
+    desde = -1 if desde is None else desde
+
+    # Cópia local ativa
+    if _local['provas'] is not None:
+        dados = _local['provas']
+        dados = dados[dados[coluna_ordem] > desde].sort_values(coluna_ordem, kind='stable')
+
+        return (dados.iloc[inicio:inicio + tamanho] for inicio in range(0, len(dados), tamanho))
+
+    return conexao.ler_sql_em_blocos(_query_ordenada.format(ordem=coluna_ordem), [desde], tamanho=tamanho)
@@ -1,6 +1,5 @@
+import numpy as np
 import pandas as pd
-import pandas.io.sql
-import pyodbc
 
 """
     Neste arquivo, estão as funções para cálculo do Score Final (SF). Este score se resulta de consultas dos três
@@ -25,24 +24,13 @@ import pyodbc
     o índice um pouco acima do padrão.
     
     Como o cálculo é realizado a partir dos outros coeficientes, as funções abaixo dependem de rendimento.py,
-    progressao.py e padrao.py para funcionarem. As variáveis globais abaixo são utilizadas para consolidar a tabela de
-    scores. As funções permitem que se incluam filtros opcionais para se refinar os resultados e buscas.
+    progressao.py e padrao.py para funcionarem. A tabela de scores é consolidada pelo motor de cálculo em lote
+    (motor.py), que lê as provas uma única vez. As funções permitem que se incluam filtros opcionais para se refinar os
+    resultados e buscas.
     
 """
 
-from coeficiente import rendimento, progressao, padrao
-
-"""VARIÁVEIS GLOBAIS"""
-_conexao = pyodbc.connect(r'Driver={ODBC Driver 17 for SQL Server};Server=10.58.56.161;Database=mentoria;Trusted_Connection=yes;Encrypt=no')
-_query = """SELECT
-	[nome],
-	[racf],
-	[funcional],
-	[treinamento],
-	[nota],
-	[categoria]
-    FROM
-	[dbo].[coeficiente_mentoria]"""
+from coeficiente import consultas, agregados, rendimento, progressao, padrao, motor, posicoes, perfil
 
 def por_funcional(funcional, categoria=None, base1=False):
 
@@ -61,7 +49,7 @@ def por_funcional(funcional, categoria=None, base1=False):
             score_final = ((100 * cr) + (100 * cp)) / 2 + crp
 
     # Caso uma das buscas retorne em erro
-    except NameError:
+    except (NameError, TypeError):
         return None
 
     if base1:
@@ -86,7 +74,7 @@ def por_racf(racf, categoria=None, base1=False):
             score_final = ((100 * cr) + (100 * cp)) / 2 + crp
 
     # Caso uma das buscas retorne em erro
-    except NameError:
+    except (NameError, TypeError):
         return None
 
     if base1:
@@ -111,7 +99,7 @@ def por_nome(nome, categoria=None, base1=False):
             score_final = ((100 * cr) + (100 * cp)) / 2 + crp
 
     # Caso uma das buscas retorne em erro
-    except NameError:
+    except (NameError, TypeError):
         return None
 
     if base1:
@@ -119,100 +107,173 @@ def por_nome(nome, categoria=None, base1=False):
 
     return score_final
 
+# Calcula o Score Final de vários usuários de uma vez via FUNCIONAL. As provas de todos são buscadas em uma única consulta
+# (dividida em lotes para listas muito grandes) e CR, CP e CRP são calculados em lote. Categoria é um filtro opcional.
+# Retorna um DataFrame indexado pelo funcional com as mesmas colunas de gerar_tabela. Usuários sem provas não aparecem
+def por_funcionais(funcionais, categoria=None, base1=False):
+    return _em_lote('funcional', funcionais, categoria=categoria, base1=base1)
+
+# Calcula o Score Final de vários usuários de uma vez via RACF. Veja por_funcionais
+def por_racfs(racfs, categoria=None, base1=False):
+    return _em_lote('racf', racfs, categoria=categoria, base1=base1)
+
+# Busca as provas de vários usuários identificados pela chave e calcula seus scores
+def _em_lote(chave, valores, categoria=None, base1=False):
+
+    try:
+        # Resumo materializado ativo (veja agregados.py): apenas as linhas dos usuários buscados são lidas
+        if agregados.ativo():
+            resumo = agregados.treinamentos(chave, lote=chave, valores=list(valores), categoria=categoria)
+            cr = rendimento.coeficientes_resumo(resumo)
+            cp = progressao.coeficientes_resumo(resumo, progressao.catalogo(), categoria=categoria)
+
+        else:
+            provas = consultas.provas_em_lote(chave, valores, categoria=categoria)
+            cr = rendimento.coeficientes(provas, chave=chave)
+            cp = progressao.coeficientes(provas, progressao.catalogo(), categoria=categoria, chave=chave)
+
+        populacao = padrao.estatisticas(categoria=categoria)
+
+    # Erro nas queries de seleção
+    except pd.io.sql.DatabaseError:
+        return None
+
+    # Caso uma das buscas retorne em erro
+    if populacao is None:
+        return None
+
+    crp = (cr - populacao['media']) / populacao['desvio']
+
+    tabela = pd.DataFrame({'Rendimento': cr * 100,
+                           'Progressão': cp * 100,
+                           'Padrão de Rendimento': crp,
+                           'Score Final': ((100 * cr) + (100 * cp)) / 2 + crp})
+
+    if base1:
+        tabela['Score Final'] = tabela['Score Final'] / 100
+
+    return tabela.set_axis(consultas.expandir(tabela.index))
+
 '''
   Calcula todos os Scores de todos os usuários que realizaram ao menos uma prova e retorna uma lista ranqueada.
   Categoria é um filtro opcional e top20 retorna apenas os 20 primeiros colocados. Em caso de empate, o primeiro a fazer
 as provas fica na frente.
   Por padrão, retorna nome e funcional. Mas a função também permite se escolher o que a tabela retornará. É possível,
 ainda, retornar apenas o score, sem os outros valores.
+  Com tamanho_bloco, a tabela de provas é lida em blocos desse número de linhas e resumida aos poucos, de modo que a
+memória usada depende do número de usuários e não do número de provas.
 '''
-def gerar_tabela(categoria=None, nome=True, funcional=False, top20=False, apenas_final=False):
+def gerar_tabela(categoria=None, nome=True, funcional=False, top20=False, apenas_final=False, tamanho_bloco=None):
 
+    # Provas e catálogo são lidos uma única vez e os coeficientes são calculados em lote (veja motor.py). Com a leitura
+    # em blocos ou o resumo materializado, apenas os agregados por usuário ficam na memória (veja agregados.py)
     try:
+        scores = motor.scores(categoria=categoria, tamanho=tamanho_bloco)
 
-        temp = []
-        tabela = pd.DataFrame()
+    # Erro nas queries de seleção
+    except pd.io.sql.DatabaseError:
+        return None
 
-        # Filtro por categoria
-        if categoria is not None:
+    return montar_tabela(scores, nome=nome, funcional=funcional, top20=top20, apenas_final=apenas_final)
 
-            lista_nomes = pd.read_sql_query(_query + "\nWHERE [categoria] = '" + categoria + "'", _conexao)
-            lista_nomes = lista_nomes.drop_duplicates(subset=['nome', 'funcional'])
-
-            for index, row in lista_nomes.iterrows():
-                cr  = rendimento.por_nome(row['nome'], categoria=categoria)
-                cp  = progressao.por_nome(row['nome'], categoria=categoria)
-                crp = padrao.por_nome(row['nome'], categoria=categoria)
-
-                if funcional and nome:
-                    temp.append([row['nome'], row['funcional'], cr * 100, cp * 100, crp, ((100 * cr) + (100 * cp)) / 2 + crp])
-                elif funcional and not nome:
-                    temp.append([row['funcional'], cr * 100, cp * 100, crp, ((100 * cr) + (100 * cp)) / 2 + crp])
-                elif not funcional and nome:
-                    temp.append([row['nome'], cr * 100, cp * 100, crp, ((100 * cr) + (100 * cp)) / 2 + crp])
-                else:
-                    temp.append([cr * 100, cp * 100, crp, ((100 * cr) + (100 * cp)) / 2 + crp])
-
-            if funcional and nome:
-                tabela = tabela.append(pd.DataFrame(temp, columns=['Nome', 'Funcional', 'Rendimento', 'Progressão', 'Padrão de Rendimento', 'Score Final']))
-            elif funcional and not nome:
-                tabela = tabela.append(pd.DataFrame(temp, columns=['Funcional', 'Rendimento', 'Progressão', 'Padrão de Rendimento', 'Score Final']))
-            elif not funcional and nome:
-                tabela = tabela.append(pd.DataFrame(temp, columns=['Nome', 'Rendimento', 'Progressão', 'Padrão de Rendimento', 'Score Final']))
-            else:
-                tabela = tabela.append(pd.DataFrame(temp, columns=['Rendimento', 'Progressão', 'Padrão de Rendimento', 'Score Final']))
-
-        # Sem filtro
-        else:
+# Monta a tabela ranqueada de gerar_tabela a partir de scores já calculados pelo motor (veja motor.calcular)
+def montar_tabela(scores, nome=True, funcional=False, top20=False, apenas_final=False):
 
-            lista_nomes = pd.read_sql_query(_query, _conexao)
-            lista_nomes = lista_nomes.drop_duplicates(subset=['nome', 'funcional'])
-
-            for index, row in lista_nomes.iterrows():
-                cr = rendimento.por_nome(row['nome'])
-                cp = progressao.por_nome(row['nome'])
-                crp = padrao.por_nome(row['nome'])
-
-                if funcional and nome:
-                    temp.append([row['nome'], row['funcional'], cr * 100, cp * 100, crp, ((100 * cr) + (100 * cp)) / 2 + crp])
-                elif funcional and not nome:
-                    temp.append([row['funcional'], cr * 100, cp * 100, crp, ((100 * cr) + (100 * cp)) / 2 + crp])
-                elif not funcional and nome:
-                    temp.append([row['nome'], cr * 100, cp * 100, crp, ((100 * cr) + (100 * cp)) / 2 + crp])
-                else:
-                    temp.append([cr * 100, cp * 100, crp, ((100 * cr) + (100 * cp)) / 2 + crp])
-
-            if funcional and nome:
-                tabela = tabela.append(pd.DataFrame(temp, columns=['Nome', 'Funcional', 'Rendimento', 'Progressão', 'Padrão de Rendimento', 'Score Final']))
-            elif funcional and not nome:
-                tabela = tabela.append(pd.DataFrame(temp, columns=['Funcional', 'Rendimento', 'Progressão', 'Padrão de Rendimento', 'Score Final']))
-            elif not funcional and nome:
-                tabela = tabela.append(pd.DataFrame(temp, columns=['Nome', 'Rendimento', 'Progressão', 'Padrão de Rendimento', 'Score Final']))
-            else:
-                tabela = tabela.append(pd.DataFrame(temp, columns=['Rendimento', 'Progressão', 'Padrão de Rendimento', 'Score Final']))
-
-        tabela = tabela.rename_axis('ID').sort_values(by=['Score Final', 'ID'], ascending=[False, True])
-
-        # Apenas os 20 primeiros
-        if top20:
-            tabela = tabela.head(20)
-
-        if apenas_final:
-            if funcional and nome:
-                tabela = tabela['ID', 'Nome', 'Funcional', 'Final']
-            elif funcional and not nome:
-                tabela = tabela['ID', 'Funcional', 'Final']
-            elif not funcional and nome:
-                tabela = tabela['ID', 'Nome', 'Final']
-            else:
-                tabela = tabela['ID', 'Final']
+    with perfil.etapa('tabela'):
+        tabela = _tabela(scores)
 
-    # Erro nas queries de seleção
-    except pd.io.sql.DatabaseError:
-        return None
+    # Ordenação pelo Score Final. Com top20, apenas os 20 primeiros são separados e ordenados (veja posicoes.ordenar)
+    with perfil.etapa('ordenacao'):
+        tabela = posicoes.ordenar(tabela, 'Score Final', k=20 if top20 else None)
+
+    tabela = tabela[_colunas(nome=nome, funcional=funcional, apenas_final=apenas_final)]
 
     # Ranking vazio
     if tabela.empty:
         return None
 
     return tabela
+
+'''
+  Gera os scores de todos os usuários em todas as categorias de uma vez, a partir de uma única leitura das provas (veja
+motor.scores_categorias). Nome, funcional e apenas_final escolhem as colunas, como em gerar_tabela.
+  No formato longo, retorna uma linha por categoria e usuário, indexada por Categoria e ID, com as categorias em ordem e,
+dentro de cada uma, o ranking de gerar_tabela com a categoria (veja posicoes.ordenar). No formato largo, retorna uma
+linha por par nome/funcional e uma coluna por coeficiente e categoria, com NaN nas categorias em que o usuário não fez
+provas.
+'''
+def gerar_matriz(nome=True, funcional=False, apenas_final=False, formato='longo'):
+
+    # Formatos disponíveis
+    if formato not in ['longo', 'largo']:
+        raise ValueError('Formato inválido: ' + str(formato))
+
+    try:
+        scores = motor.scores_categorias()
+
+    # Erro nas queries de seleção
+    except pd.io.sql.DatabaseError:
+        return None
+
+    # Nenhuma prova
+    if scores.empty:
+        return None
+
+    with perfil.etapa('tabela'):
+        tabela = _tabela(scores).rename_axis(['Categoria', 'ID'])
+
+    # Uma coluna por coeficiente e categoria
+    if formato == 'largo':
+        colunas = _colunas(nome=False, funcional=False, apenas_final=apenas_final)
+        return tabela.set_index(['Nome', 'Funcional'], append=True)[colunas].droplevel('ID').unstack('Categoria')
+
+    # Ranking de cada categoria
+    with perfil.etapa('ordenacao'):
+        categorias = pd.factorize(tabela.index.get_level_values('Categoria'), sort=True)[0]
+        ordem = np.lexsort((tabela.index.get_level_values('ID'), posicoes.chaves(tabela['Score Final']), categorias))
+        tabela = tabela.iloc[ordem]
+
+    return tabela[_colunas(nome=nome, funcional=funcional, apenas_final=apenas_final)]
+
+# Monta as colunas da tabela ranqueada a partir dos scores do motor, sem ordenar
+def _tabela(scores):
+
+    return pd.DataFrame({'Nome': consultas.expandir(scores['nome']),
+                         'Funcional': consultas.expandir(scores['funcional']),
+                         'Rendimento': scores['cr'] * 100,
+                         'Progressão': scores['cp'] * 100,
+                         'Padrão de Rendimento': scores['crp'],
+                         'Score Final': scores['score']})
+
+# Colunas retornadas pela tabela ranqueada, conforme as opções de gerar_tabela
+def _colunas(nome=True, funcional=False, apenas_final=False):
+
+    if apenas_final:
+        colunas = ['Score Final']
+    else:
+        colunas = ['Rendimento', 'Progressão', 'Padrão de Rendimento', 'Score Final']
+
+    if funcional:
+        colunas = ['Funcional'] + colunas
+    if nome:
+        colunas = ['Nome'] + colunas
+
+    return colunas
+
+'''
+  Monta a tabela ranqueada de gerar_tabela a partir de scores já calculados pelo motor, em blocos de até tamanho linhas,
+na ordem do ranking. Apenas a ordem dos IDs é calculada para a tabela inteira; as linhas de cada bloco são montadas
+quando ele é pedido, de modo que a tabela completa nunca fica na memória. Usada na exportação em fluxo (veja
+relatorio.exportar_em_fluxo).
+  Ranking vazio não gera nenhum bloco.
+'''
+def tabela_em_blocos(scores, nome=True, funcional=False, top20=False, apenas_final=False, tamanho=10000):
+
+    # Ordenação pelo Score Final, apenas com a coluna de score e os IDs
+    with perfil.etapa('ordenacao'):
+        ids = posicoes.ordenar(scores[['score']], 'score', k=20 if top20 else None).index
+
+    colunas = _colunas(nome=nome, funcional=funcional, apenas_final=apenas_final)
+
+    for inicio in range(0, len(ids), tamanho):
+        yield _tabela(scores.loc[ids[inicio:inicio + tamanho]])[colunas]
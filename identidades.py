@@ -0,0 +1,188 @@
+import threading
+import unicodedata
+import numpy as np
+import pandas as pd
+
+"""
+    Neste arquivo, está o índice de identidades dos usuários, usado nas buscas por usuário com o resumo materializado
+    ativo (veja agregados.py).
+
+    Sem o índice, cada busca por funcional, racf ou nome filtra o resumo materializado inteiro, comparando a coluna
+    buscada em todas as linhas. O índice é construído uma única vez a partir do resumo e guarda:
+
+        - a chave de cada usuário: um inteiro por par nome/funcional, na ordem da primeira tentativa (a mesma ordem dos
+          IDs dos rankings)
+        - os mapas de funcional, racf e nome normalizado (veja normalizar) para as chaves dos usuários
+        - as posições das linhas do resumo de cada usuário
+
+    Assim, uma busca por usuário resolve o identificador para as chaves em um dicionário e lê apenas as linhas desses
+    usuários, sem percorrer o resumo. Os demais filtros (categoria, treinamento) são aplicados só sobre essas linhas.
+
+    Na busca por nome, o nome exato tem preferência. Se ele não for encontrado, são buscados os nomes que diferem
+    apenas em maiúsculas, acentos e espaços. Funcional e racf são buscados pelo valor exato, como nas consultas. As
+    consultas ao banco e à cópia local resolvem os nomes da mesma forma, com o índice de nomes (veja indice_nomes e
+    consultas.nomes), para que a busca por nome dê o mesmo resultado com ou sem o resumo materializado.
+
+    O índice é reconstruído quando o resumo materializado muda (veja agregados.atualizar), na primeira busca seguinte.
+
+"""
+
+"""VARIÁVEIS GLOBAIS"""
+# Índice atual e resumo materializado a partir do qual ele foi construído
+_indice = {'tabela': None, 'dados': None}
+_trava = threading.Lock()
+
+# Colunas que identificam o usuário
+colunas = ['funcional', 'racf', 'nome']
+
+"""FUNÇÕES"""
+
+# Normaliza um nome para a busca: sem acentos, sem diferença entre maiúsculas e minúsculas e com espaços simples
+def normalizar(nome):
+
+    if not isinstance(nome, str):
+        return nome
+
+    nome = unicodedata.normalize('NFKD', nome)
+    nome = ''.join([letra for letra in nome if not unicodedata.combining(letra)])
+
+    return ' '.join(nome.casefold().split())
+
+'''
+  Monta o mapa de uma coluna para as chaves dos usuários: um dicionário de cada valor distinto para a sua posição e,
+nessa ordem, as chaves de cada valor, em um vetor só, separadas pelos inícios.
+'''
+def _mapa(valores, chaves, usuarios):
+
+    codigos, unicos = pd.factorize(valores)
+    pares = np.unique(codigos.astype(np.int64) * usuarios + chaves)
+    # Valores nulos não são buscados
+    pares = pares[pares >= 0]
+
+    inicios = np.searchsorted(pares // usuarios, np.arange(len(unicos) + 1))
+
+    return {'posicoes': dict(zip(np.asarray(unicos).tolist(), range(len(unicos)))),
+            'chaves': pares % usuarios,
+            'inicios': inicios}
+
+# Constrói o índice de identidades a partir do resumo materializado
+def construir(tabela):
+
+    # Chave de cada linha: pares nome/funcional numerados na ordem da primeira tentativa
+    grupos = tabela.groupby(['nome', 'funcional'], sort=False, observed=True, dropna=False)
+    codigos = grupos.ngroup().to_numpy()
+    usuarios = int(codigos.max()) + 1 if len(codigos) else 0
+
+    primeiras = grupos['inicio'].min().to_numpy()
+    numeracao = np.empty(usuarios, dtype=np.int64)
+    numeracao[np.argsort(primeiras, kind='stable')] = np.arange(usuarios)
+    chaves = numeracao[codigos]
+
+    # Linhas de cada usuário, na ordem do resumo
+    linhas = np.argsort(chaves, kind='stable')
+    inicios = np.searchsorted(chaves[linhas], np.arange(usuarios + 1))
+
+    # Nomes normalizados: cada nome distinto é normalizado uma única vez
+    codigos_nome, nomes = pd.factorize(tabela['nome'])
+    normalizados = np.array([normalizar(nome) for nome in np.asarray(nomes).tolist()] + [None], dtype=object)
+
+    usuarios = max(usuarios, 1)
+
+    return {'usuarios': len(inicios) - 1,
+            'linhas': linhas,
+            'inicios': inicios,
+            'funcional': _mapa(tabela['funcional'], chaves, usuarios),
+            'racf': _mapa(tabela['racf'], chaves, usuarios),
+            'nome': _mapa(tabela['nome'], chaves, usuarios),
+            'normalizado': _mapa(normalizados[codigos_nome], chaves, usuarios),
+            'numerico': pd.api.types.is_numeric_dtype(tabela['funcional'].dtype)}
+
+# Retorna o índice de identidades do resumo materializado, construindo-o se o resumo mudou desde a última construção
+def indice(tabela):
+
+    with _trava:
+        if _indice['tabela'] is not tabela:
+            _indice['dados'] = construir(tabela)
+            _indice['tabela'] = tabela
+
+        return _indice['dados']
+
+# Retorna as chaves dos usuários de um valor no mapa de uma coluna
+def _buscar(mapa, valor):
+
+    posicao = mapa['posicoes'].get(valor)
+
+    # Valor não encontrado
+    if posicao is None:
+        return np.empty(0, dtype=np.int64)
+
+    return mapa['chaves'][mapa['inicios'][posicao]:mapa['inicios'][posicao + 1]]
+
+# Retorna as chaves dos usuários com um valor de funcional, racf ou nome
+def _chaves_de(dados, coluna, valor):
+
+    if coluna == 'funcional' and dados['numerico']:
+        valor = pd.to_numeric(valor, errors='coerce')
+
+    encontradas = _buscar(dados[coluna], valor)
+
+    # Nome exato não encontrado: busca pelo nome normalizado
+    if coluna == 'nome' and not len(encontradas):
+        encontradas = _buscar(dados['normalizado'], normalizar(valor))
+
+    return encontradas
+
+'''
+  Retorna as chaves dos usuários do resumo materializado que têm todos os identificadores informados (funcional, racf
+e/ou nome). Lote é uma das colunas de identificação, buscada por vários valores, como em consultas.provas_em_lote.
+Retorna None se nenhum identificador for informado.
+'''
+def chaves(tabela, lote=None, valores=None, funcional=None, racf=None, nome=None):
+
+    dados = indice(tabela)
+    resultado = None
+
+    for coluna, valor in [('funcional', funcional), ('racf', racf), ('nome', nome)]:
+        if valor is None:
+            continue
+
+        encontradas = _chaves_de(dados, coluna, valor)
+        resultado = encontradas if resultado is None else np.intersect1d(resultado, encontradas)
+
+    if lote in colunas:
+        encontradas = [_chaves_de(dados, lote, valor) for valor in valores]
+        encontradas = np.unique(np.concatenate(encontradas)) if encontradas else np.empty(0, dtype=np.int64)
+        resultado = encontradas if resultado is None else np.intersect1d(resultado, encontradas)
+
+    return resultado
+
+# Monta o índice de nomes a partir dos nomes distintos da tabela de provas: os nomes exatos e, para cada nome
+# normalizado (veja normalizar), os nomes que o têm
+def indice_nomes(nomes):
+
+    exatos = set(nome for nome in nomes if isinstance(nome, str))
+    normalizados = {}
+
+    for nome in exatos:
+        normalizados.setdefault(normalizar(nome), []).append(nome)
+
+    return {'nomes': exatos, 'normalizados': {chave: sorted(valores) for chave, valores in normalizados.items()}}
+
+# Retorna os nomes buscados para um nome no índice de nomes, como em chaves: o próprio nome, se ele existe, ou os nomes
+# com o mesmo nome normalizado. Sem nenhum deles, retorna o próprio nome, que não encontra provas
+def resolver(indice, nome):
+
+    if nome in indice['nomes']:
+        return [nome]
+
+    return indice['normalizados'].get(normalizar(nome), [nome])
+
+# Retorna as posições das linhas do resumo materializado dos usuários de uma lista de chaves, na ordem do resumo
+def linhas(tabela, chaves):
+
+    dados = indice(tabela)
+    inicios = dados['inicios']
+
+    partes = [dados['linhas'][inicios[chave]:inicios[chave + 1]] for chave in chaves]
+
+    return np.sort(np.concatenate(partes)) if partes else np.empty(0, dtype=np.int64)
@@ -0,0 +1,206 @@
+import math
+import numpy as np
+import pandas as pd
+
+"""
+    Neste arquivo, estão as funções para manutenção incremental dos scores.
+
+    Em vez de recalcular todos os scores a partir das provas sempre que um usuário faz uma nova prova, o estado
+    incremental guarda, para cada usuário, os agregados usados pelas fórmulas de rendimento.py, progressao.py e
+    media.py:
+
+        - soma e quantidade de notas (Média Geral)
+        - primeira nota de cada treinamento (Média Primária)
+        - maior nota de cada treinamento (Média Final)
+        - conjunto de treinamentos distintos com prova (TPUr)
+
+    Além disso, as estatísticas da população de CRs usadas por padrao.py (MCR e DpCRT) são mantidas de forma online:
+    a média por soma e contagem e a variância pelo algoritmo de Welford, que permite incluir e retirar valores sem
+    percorrer todos os usuários.
+
+    Ao aplicar um lote de provas novas (veja aplicar), apenas os usuários afetados têm CR e CP recalculados e as
+    estatísticas da população são ajustadas retirando o CR antigo e incluindo o novo. O tempo de atualização é
+    proporcional ao tamanho do lote. O CRP e o Score Final dependem das estatísticas globais e são calculados no
+    momento da leitura (veja score e scores).
+
+    Assim como no motor de cálculo em lote (motor.py), os usuários são identificados pelo par nome/funcional e a
+    média e o desvio padrão de CRs consideram um CR por usuário.
+
+"""
+
+"""FUNÇÕES"""
+
+'''
+  Cria um estado incremental vazio para uma categoria (None para todas). Catálogo é o catálogo de treinamentos com
+prova (veja progressao.catalogo), usado no total de provas disponíveis. Provas é um lote inicial opcional.
+'''
+def iniciar(catalogo, categoria=None, provas=None):
+
+    if categoria is not None:
+        catalogo = catalogo[catalogo['Categoria'] == categoria]
+
+    estado = {'categoria': categoria,
+              'provas_disponiveis': int(catalogo['Treinamento'].count()),
+              'usuarios': {},
+              'nomes': {},
+              'soma_cr': 0.0,
+              'welford': {'n': 0, 'media': 0.0, 'm2': 0.0}}
+
+    if provas is not None:
+        aplicar(estado, provas)
+
+    return estado
+
+# Inclui um valor nas estatísticas de Welford
+def _incluir(welford, valor):
+
+    welford['n'] += 1
+    delta = valor - welford['media']
+    welford['media'] += delta / welford['n']
+    welford['m2'] += delta * (valor - welford['media'])
+
+# Retira um valor incluído anteriormente das estatísticas de Welford
+def _retirar(welford, valor):
+
+    if welford['n'] <= 1:
+        welford.update(n=0, media=0.0, m2=0.0)
+        return
+
+    media_anterior = welford['media']
+    welford['n'] -= 1
+    welford['media'] = (media_anterior * (welford['n'] + 1) - valor) / welford['n']
+    welford['m2'] = max(welford['m2'] - (valor - media_anterior) * (valor - welford['media']), 0.0)
+
+# Inclui (sinal 1) ou retira (sinal -1) o CR de um usuário das estatísticas da população
+def _contabilizar(estado, usuario, sinal):
+
+    cr = usuario['cr']
+
+    if cr is None or math.isnan(cr):
+        return
+
+    estado['soma_cr'] += sinal * cr
+
+    if sinal > 0:
+        _incluir(estado['welford'], cr)
+    else:
+        _retirar(estado['welford'], cr)
+
+# Recalcula CR e CP de um usuário a partir dos seus agregados
+def _recalcular(estado, usuario):
+
+    primeiras = [nota for nota in usuario['primeiras'].values() if not math.isnan(nota)]
+
+    if usuario['contagem'] and primeiras:
+        usuario['cr'] = (usuario['soma'] / usuario['contagem'] + sum(primeiras) / len(primeiras)) / 20
+    else:
+        usuario['cr'] = float('nan')
+
+    # Sem provas disponíveis, o CP segue a divisão de motor.calcular: infinito, ou indefinido sem treinamentos feitos
+    realizados = len(usuario['primeiras'])
+
+    if estado['provas_disponiveis']:
+        usuario['cp'] = realizados / estado['provas_disponiveis']
+    else:
+        usuario['cp'] = float('inf') if realizados else float('nan')
+
+'''
+  Aplica um lote de provas novas ao estado. As provas devem estar na ordem em que foram feitas. Apenas os usuários do
+lote têm seus agregados, CR e CP atualizados, e as estatísticas da população são ajustadas para eles.
+  Retorna o conjunto de usuários (pares nome/funcional) afetados.
+'''
+def aplicar(estado, provas):
+
+    if estado['categoria'] is not None:
+        provas = provas[provas['categoria'] == estado['categoria']]
+
+    afetados = {}
+
+    linhas = provas[['nome', 'racf', 'funcional', 'treinamento', 'nota']].itertuples(index=False)
+
+    for nome, racf, funcional, treinamento, nota in linhas:
+
+        # Funcional nulo vira None, para que o par sirva de chave do dicionário
+        chave = (nome, None if pd.isna(funcional) else funcional)
+        usuario = estado['usuarios'].get(chave)
+
+        # Novo par nome/funcional, na ordem em que aparece
+        if usuario is None:
+            usuario = {'racf': racf, 'soma': 0.0, 'contagem': 0, 'primeiras': {}, 'maiores': {}, 'cr': None, 'cp': None}
+            estado['usuarios'][chave] = usuario
+            estado['nomes'].setdefault(nome, chave)
+
+        # Retira o CR antigo das estatísticas antes da primeira alteração do usuário no lote
+        if chave not in afetados:
+            afetados[chave] = usuario
+            _contabilizar(estado, usuario, -1)
+
+        nota = float('nan') if pd.isna(nota) else float(nota)
+
+        if not math.isnan(nota):
+            usuario['soma'] += nota
+            usuario['contagem'] += 1
+
+        # Provas sem treinamento entram apenas na média geral
+        if pd.isna(treinamento):
+            continue
+
+        # Primeira nota não nula do treinamento, como em groupby('treinamento').first()
+        if math.isnan(usuario['primeiras'].get(treinamento, float('nan'))):
+            usuario['primeiras'][treinamento] = nota
+
+        if not math.isnan(nota) and nota > usuario['maiores'].get(treinamento, -math.inf):
+            usuario['maiores'][treinamento] = nota
+
+    for usuario in afetados.values():
+        _recalcular(estado, usuario)
+        _contabilizar(estado, usuario, 1)
+
+    return set(afetados)
+
+# Retorna as estatísticas da população de CRs: média (MCR), desvio padrão (DpCRT) e número de usuários
+def estatisticas(estado):
+
+    welford = estado['welford']
+
+    return {'media': estado['soma_cr'] / welford['n'] if welford['n'] else float('nan'),
+            'desvio': math.sqrt(welford['m2'] / welford['n']) if welford['n'] else float('nan'),
+            'usuarios': welford['n']}
+
+# Retorna CR, CP, CRP, Score Final e Média Final de um usuário. Sem funcional, é usado o primeiro usuário com o nome,
+# como em posicoes.identificar. CR e CP estão na base 0 a 1
+def score(estado, nome, funcional=None):
+
+    chave = estado['nomes'].get(nome) if funcional is None else (nome, funcional)
+    usuario = estado['usuarios'].get(chave)
+
+    # Usuário sem provas
+    if usuario is None:
+        return None
+
+    populacao = estatisticas(estado)
+    crp = (usuario['cr'] - populacao['media']) / populacao['desvio']
+    maiores = list(usuario['maiores'].values())
+
+    return {'cr': usuario['cr'],
+            'cp': usuario['cp'],
+            'crp': crp,
+            'score': ((100 * usuario['cr']) + (100 * usuario['cp'])) / 2 + crp,
+            'media_final': sum(maiores) / len(maiores) if maiores else float('nan')}
+
+# Retorna os scores de todos os usuários no mesmo formato de motor.calcular
+def scores(estado):
+
+    usuarios = estado['usuarios']
+    populacao = estatisticas(estado)
+
+    tabela = pd.DataFrame({'nome': [nome for nome, funcional in usuarios],
+                           'racf': [usuario['racf'] for usuario in usuarios.values()],
+                           'funcional': [funcional for nome, funcional in usuarios],
+                           'cr': np.array([usuario['cr'] for usuario in usuarios.values()], dtype=float),
+                           'cp': np.array([usuario['cp'] for usuario in usuarios.values()], dtype=float)})
+
+    tabela['crp'] = (tabela['cr'] - populacao['media']) / populacao['desvio']
+    tabela['score'] = ((100 * tabela['cr']) + (100 * tabela['cp'])) / 2 + tabela['crp']
+
+    return tabela.rename_axis('ID')
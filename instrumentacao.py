@@ -0,0 +1,213 @@
+import sys
+import time
+import threading
+import contextlib
+import pandas as pd
+
+"""
+    Neste arquivo, está a instrumentação das consultas ao banco.
+
+    Todas as consultas do pacote passam por conexao.ler_sql ou conexao.ler_sql_em_blocos. Enquanto houver um coletor
+    ativo (veja coletar), cada consulta é medida e registrada com:
+
+        - consultas:    quantidade de consultas
+        - linhas:       linhas trazidas do banco
+        - bytes:        tamanho estimado dos dados trazidos, medido pela memória do DataFrame resultante
+        - tempo:        tempo gasto no pd.read_sql_query: execução da consulta, leitura das linhas e montagem do
+                        DataFrame
+
+    A conexão é passada ao pandas sem intermediários e o tempo é medido em volta da leitura. Um objeto intermediário
+    entre o pandas e a conexão faria o pandas tratá-la como uma conexão não suportada, com um aviso a cada consulta.
+
+    Cada registro é atribuído à função do pacote que fez a consulta (por exemplo, rendimento.por_funcional) e à chamada
+    de nível mais alto do pacote que a originou (por exemplo, final.por_funcional). As funções de conexao.py,
+    consultas.py e deste arquivo não são consideradas, já que todas as consultas passam por elas.
+
+    Sem coletores ativos, as consultas são feitas diretamente, e o custo da instrumentação é apenas uma verificação.
+
+    Os registros de um coletor podem ser resumidos em um DataFrame (veja resumo), em texto (veja texto) ou exportados no
+    formato de texto do Prometheus (veja prometheus).
+
+"""
+
+"""VARIÁVEIS GLOBAIS"""
+_coletores = []
+_trava = threading.Lock()
+
+# Prefixo dos módulos do pacote e módulos ignorados na atribuição das consultas
+_pacote = __name__.rpartition('.')[0] + '.'
+_internos = {_pacote + 'conexao', _pacote + 'consultas', __name__}
+
+# Medidas registradas para cada consulta
+_medidas = ['consultas', 'linhas', 'bytes', 'tempo']
+
+"""FUNÇÕES"""
+
+# Indica se há algum coletor ativo
+def ativa():
+    return bool(_coletores)
+
+# Cria um coletor vazio e o ativa. Os registros de cada consulta são somados por função e chamada de origem
+def iniciar():
+
+    coletor = {'registros': {}, 'inicio': time.time(), 'fim': None}
+
+    with _trava:
+        _coletores.append(coletor)
+
+    return coletor
+
+# Desativa um coletor. Seus registros continuam disponíveis
+def parar(coletor):
+
+    with _trava:
+        if coletor in _coletores:
+            _coletores.remove(coletor)
+
+    coletor['fim'] = time.time()
+
+    return coletor
+
+# Ativa um coletor durante o bloco with e o desativa ao final
+@contextlib.contextmanager
+def coletar():
+
+    coletor = iniciar()
+
+    try:
+        yield coletor
+    finally:
+        parar(coletor)
+
+# Identifica a função do pacote que fez a consulta e a chamada de nível mais alto do pacote que a originou
+def _origem():
+
+    funcao = chamada = None
+    quadro = sys._getframe(1)
+
+    while quadro is not None:
+        modulo = quadro.f_globals.get('__name__', '')
+        nome = quadro.f_code.co_name
+
+        # Funções do pacote, exceto as da camada de consultas e as internas do Python (<lambda>, <listcomp>, ...)
+        if modulo.startswith(_pacote) and modulo not in _internos and not nome.startswith('<'):
+            chamada = modulo[len(_pacote):] + '.' + nome
+            if funcao is None:
+                funcao = chamada
+
+        quadro = quadro.f_back
+
+    return funcao or 'externo', chamada or 'externo'
+
+# Soma as medidas de uma consulta nos coletores ativos
+def _registrar(origem, **medidas):
+
+    with _trava:
+        for coletor in _coletores:
+            registro = coletor['registros'].setdefault(origem, dict.fromkeys(_medidas, 0))
+
+            for medida, valor in medidas.items():
+                registro[medida] += valor
+
+# Tamanho estimado de um DataFrame trazido do banco, em bytes
+def _bytes(resultado):
+    return int(resultado.memory_usage(index=False, deep=True).sum())
+
+# Executa uma consulta com pd.read_sql_query na conexão informada, medindo-a. Usada por conexao.ler_sql
+def ler_sql(con, sql, params=None):
+
+    origem = _origem()
+    inicio = time.perf_counter()
+
+    resultado = pd.read_sql_query(sql, con, params=params or None)
+
+    _registrar(origem, consultas=1, linhas=len(resultado), bytes=_bytes(resultado),
+               tempo=time.perf_counter() - inicio)
+
+    return resultado
+
+# Executa uma consulta em blocos na conexão informada, medindo-a. O tempo gasto por quem consome os blocos não é
+# contado. Usada por conexao.ler_sql_em_blocos
+def ler_sql_em_blocos(con, sql, params=None, tamanho=100000):
+
+    origem = _origem()
+    medidas = {'consultas': 1, 'linhas': 0, 'bytes': 0, 'tempo': 0.0}
+
+    inicio = time.perf_counter()
+    blocos = iter(pd.read_sql_query(sql, con, params=params or None, chunksize=tamanho))
+    medidas['tempo'] += time.perf_counter() - inicio
+
+    try:
+        while True:
+            inicio = time.perf_counter()
+            bloco = next(blocos, None)
+            medidas['tempo'] += time.perf_counter() - inicio
+
+            if bloco is None:
+                break
+
+            medidas['linhas'] += len(bloco)
+            medidas['bytes'] += _bytes(bloco)
+
+            yield bloco
+
+    finally:
+        _registrar(origem, **medidas)
+
+'''
+  Resume os registros de um coletor em um DataFrame com uma linha por função (por='funcao') ou por chamada de nível
+mais alto (por='chamada'), ordenado pelo tempo. As colunas são as medidas registradas.
+'''
+def resumo(coletor, por='funcao'):
+
+    posicao = {'funcao': 0, 'chamada': 1}[por]
+    registros = dict(coletor['registros'])
+
+    tabela = pd.DataFrame([dict(medidas, origem=origem[posicao]) for origem, medidas in registros.items()],
+                          columns=['origem'] + _medidas)
+    tabela = tabela.groupby('origem').sum().rename_axis(por)
+
+    return tabela.sort_values('tempo', ascending=False)
+
+# Retorna o resumo de um coletor em texto, por função e por chamada de nível mais alto
+def texto(coletor):
+
+    partes = []
+
+    for por, titulo in [('chamada', 'Por chamada'), ('funcao', 'Por função')]:
+        tabela = resumo(coletor, por=por)
+        partes.append(titulo + ':\n' + (tabela.to_string() if not tabela.empty else '(nenhuma consulta)'))
+
+    return '\n\n'.join(partes)
+
+# Escapa um valor de rótulo do formato do Prometheus
+def _rotulo(valor):
+    return valor.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+'''
+  Exporta os registros de um coletor no formato de texto do Prometheus, com uma série por função e chamada de origem.
+Prefixo é o início do nome das métricas.
+'''
+def prometheus(coletor, prefixo='coeficiente'):
+
+    descricoes = {'consultas': ('consultas_total', 'counter', 'Consultas SQL executadas'),
+                  'linhas': ('linhas_total', 'counter', 'Linhas trazidas do banco'),
+                  'bytes': ('bytes_total', 'counter', 'Tamanho estimado dos dados trazidos do banco, em bytes'),
+                  'tempo': ('tempo_segundos_total', 'counter',
+                            'Tempo gasto nas consultas, com a montagem dos DataFrames, em segundos')}
+
+    registros = sorted(dict(coletor['registros']).items())
+    linhas = []
+
+    for medida in _medidas:
+        nome, tipo, descricao = descricoes[medida]
+        nome = prefixo + '_' + nome
+
+        linhas.append('# HELP ' + nome + ' ' + descricao)
+        linhas.append('# TYPE ' + nome + ' ' + tipo)
+
+        for (funcao, chamada), medidas in registros:
+            linhas.append('%s{funcao="%s",chamada="%s"} %s' % (nome, _rotulo(funcao), _rotulo(chamada),
+                                                               repr(medidas[medida])))
+
+    return '\n'.join(linhas) + '\n'
@@ -1,6 +1,6 @@
+import numpy as np
 import pandas as pd
-import pandas.io.sql
-import pyodbc
+from coeficiente import consultas, agregados
 
 """
     Neste arquivo, estão as funções para cálculo de Médias
@@ -51,28 +51,24 @@ import pyodbc
     Já MF é a média com os melhores resultados do usuário. Mostra todo o resultado dos estudos do desenvolvimento do 
     usuário.
 
-    As consultas são feitas usando as variáveis globais abaixo, que servem para se conectar ao banco e fazer as buscas.
+    As consultas são feitas com as consultas parametrizadas de consultas.py. Com a opção no_banco, as provas são
+    agregadas no próprio banco (veja consultas.medias) e apenas uma linha por grupo é transferida, em vez de todas as
+    provas. Com o resumo materializado ativo (veja agregados.py), as médias são sempre calculadas a partir dele.
+
+    Para as médias de todos os usuários em todas as categorias, a função matriz calcula, a partir de uma única leitura
+    das provas, uma matriz usuário × categoria com as três médias e a quantidade de tentativas. As médias por
+    categoria e por treinamento podem ser calculadas a partir dessa matriz, sem consultar o banco de novo.
+
     As funções permitem que se utilize filtros opcionais para se refinar a busca. As médias também são escolhidas em uma
     variável de opção.
 
 """
 
-"""VARIÁVEIS GLOBAIS"""
-_conexao = pyodbc.connect(r'Driver={ODBC Driver 17 for SQL Server};Server=10.58.56.161;Database=mentoria;Trusted_Connection=yes;Encrypt=no')
-_query = """SELECT
-	[nome],
-	[racf],
-	[funcional],
-	[treinamento],
-	[nota],
-	[categoria]
-    FROM
-	[dbo].[coeficiente_mentoria]"""
-
 """FUNÇÕES"""
 
-# Calcula média via FUNCIONAL. Categoria e Treinamento são filtros opcionais. Opção permite escolher o tipo de média
-def por_funcional(funcional, categoria=None, treinamento=None, opcao=None):
+# Calcula média via FUNCIONAL. Categoria e Treinamento são filtros opcionais. Opção permite escolher o tipo de média.
+# No_banco faz a agregação no banco (veja _agregadas)
+def por_funcional(funcional, categoria=None, treinamento=None, opcao=None, no_banco=False):
 
     # Opções disponíveis
     opcoes = ['geral', 'primaria', 'final', 'todas', None]
@@ -81,38 +77,12 @@ def por_funcional(funcional, categoria=None, treinamento=None, opcao=None):
     if opcao not in opcoes:
         return 'Opção de média inválida'
 
-    try:
-        if categoria is not None:
-
-            # Filtro por treinamento e categoria
-            if treinamento is not None:
-
-                resultado = pd.read_sql_query(_query + "\nWHERE [funcional] = "
-                                              + funcional
-                                              + " AND [categoria] = '"
-                                              + categoria + "'"
-                                              + " AND [treinamento] = '"
-                                              + treinamento + "'", _conexao)
+    # Agregação no banco ou resumo materializado: apenas uma linha por treinamento é transferida
+    if no_banco or agregados.ativo():
+        return _agregadas(opcao, 'treinamento', funcional=funcional, categoria=categoria, treinamento=treinamento)
 
-            # Filtro por categoria
-            else:
-
-                resultado = pd.read_sql_query(_query + "\nWHERE [funcional] = "
-                                              + funcional
-                                              + " AND [categoria] = '"
-                                              + categoria + "'", _conexao)
-
-        # Filtro por treinamento
-        elif treinamento is not None:
-
-            resultado = pd.read_sql_query(_query + "\nWHERE [funcional] = "
-                                          + funcional
-                                          + " AND [treinamento] = '"
-                                          + treinamento + "'", _conexao)
-
-        # Sem filtro
-        else:
-            resultado = pd.read_sql_query(_query + "\nWHERE [funcional] = " + funcional, _conexao)
+    try:
+        resultado = consultas.provas(funcional=funcional, categoria=categoria, treinamento=treinamento)
 
     # Erro na query de seleção
     except pd.io.sql.DatabaseError:
@@ -126,17 +96,17 @@ def por_funcional(funcional, categoria=None, treinamento=None, opcao=None):
 
     # Primaria
     elif opcao == 'primaria':
-        media = resultado.groupby('treinamento').first()['nota'].mean()
+        media = resultado.groupby('treinamento', observed=True).first()['nota'].mean()
 
     # Final
     elif opcao == 'final':
-        media = resultado.groupby('treinamento')['nota'].max().mean()
+        media = resultado.groupby('treinamento', observed=True)['nota'].max().mean()
 
     # Todas. Retorna uma tupla com os três tipos de média
     elif opcao == 'todas':
         media = {'geral': resultado['nota'].mean(),
-                 'primaria': resultado.groupby('treinamento').first()['nota'].mean(),
-                 'final': resultado.groupby('treinamento')['nota'].max().mean()}
+                 'primaria': resultado.groupby('treinamento', observed=True).first()['nota'].mean(),
+                 'final': resultado.groupby('treinamento', observed=True)['nota'].max().mean()}
 
     # Sem opções selecionadas. Por padrão a média é a geral
     else:
@@ -144,8 +114,9 @@ def por_funcional(funcional, categoria=None, treinamento=None, opcao=None):
 
     return media
 
-# Calcula média via RACF. Categoria e Treinamento são filtros opcionais. Opção permite escolher o tipo de média
-def por_racf(racf, categoria=None, treinamento=None, opcao=None):
+# Calcula média via RACF. Categoria e Treinamento são filtros opcionais. Opção permite escolher o tipo de média.
+# No_banco faz a agregação no banco (veja _agregadas)
+def por_racf(racf, categoria=None, treinamento=None, opcao=None, no_banco=False):
 
     # Opções disponíveis
     opcoes = ['geral', 'primaria', 'final', 'todas', None]
@@ -154,38 +125,12 @@ def por_racf(racf, categoria=None, treinamento=None, opcao=None):
     if opcao not in opcoes:
         return 'Opção de média inválida'
 
-    try:
-        if categoria is not None:
-
-            # Filtro por treinamento e categoria
-            if treinamento is not None:
-
-                resultado = pd.read_sql_query(_query + "\nWHERE [racf] = '"
-                                              + racf + "'"
-                                              + " AND [categoria] = '"
-                                              + categoria + "'"
-                                              + " AND [treinamento] = '"
-                                              + treinamento + "'", _conexao)
-
-            # Filtro por categoria
-            else:
-
-                resultado = pd.read_sql_query(_query + "\nWHERE [racf] = '"
-                                              + racf + "'"
-                                              + " AND [categoria] = '"
-                                              + categoria + "'", _conexao)
+    # Agregação no banco ou resumo materializado: apenas uma linha por treinamento é transferida
+    if no_banco or agregados.ativo():
+        return _agregadas(opcao, 'treinamento', racf=racf, categoria=categoria, treinamento=treinamento)
 
-        # Filtro por treinamento
-        elif treinamento is not None:
-
-            resultado = pd.read_sql_query(_query + "\nWHERE [racf] = '"
-                                          + racf + "'"
-                                          + " AND [treinamento] = '"
-                                          + treinamento + "'", _conexao)
-
-        # Sem filtro
-        else:
-            resultado = pd.read_sql_query(_query + "\nWHERE [racf] = '" + racf + "'", _conexao)
+    try:
+        resultado = consultas.provas(racf=racf, categoria=categoria, treinamento=treinamento)
 
     # Erro na query de seleção
     except pd.io.sql.DatabaseError:
@@ -199,17 +144,17 @@ def por_racf(racf, categoria=None, treinamento=None, opcao=None):
 
     # Primaria
     elif opcao == 'primaria':
-        media = resultado.groupby('treinamento').first()['nota'].mean()
+        media = resultado.groupby('treinamento', observed=True).first()['nota'].mean()
 
     # Final
     elif opcao == 'final':
-        media = resultado.groupby('treinamento')['nota'].max().mean()
+        media = resultado.groupby('treinamento', observed=True)['nota'].max().mean()
 
     # Todas. Retorna uma tupla com os três tipos de média
     elif opcao == 'todas':
         media = {'geral': resultado['nota'].mean(),
-                 'primaria': resultado.groupby('treinamento').first()['nota'].mean(),
-                 'final': resultado.groupby('treinamento')['nota'].max().mean()}
+                 'primaria': resultado.groupby('treinamento', observed=True).first()['nota'].mean(),
+                 'final': resultado.groupby('treinamento', observed=True)['nota'].max().mean()}
 
     # Sem opções selecionadas. Por padrão a média é a geral
     else:
@@ -217,8 +162,9 @@ def por_racf(racf, categoria=None, treinamento=None, opcao=None):
 
     return media
 
-# Calcula média via NOME. Categoria e Treinamento são filtros opcionais. Opção permite escolher o tipo de média
-def por_nome(nome, categoria=None, treinamento=None, opcao=None):
+# Calcula média via NOME. Categoria e Treinamento são filtros opcionais. Opção permite escolher o tipo de média.
+# No_banco faz a agregação no banco (veja _agregadas)
+def por_nome(nome, categoria=None, treinamento=None, opcao=None, no_banco=False):
 
     # Opções disponíveis
     opcoes = ['geral', 'primaria', 'final', 'todas', None]
@@ -227,38 +173,12 @@ def por_nome(nome, categoria=None, treinamento=None, opcao=None):
     if opcao not in opcoes:
         return 'Opção de média inválida'
 
-    try:
-        if categoria is not None:
+    # Agregação no banco ou resumo materializado: apenas uma linha por treinamento é transferida
+    if no_banco or agregados.ativo():
+        return _agregadas(opcao, 'treinamento', nome=nome, categoria=categoria, treinamento=treinamento)
 
-            # Filtro por treinamento e categoria
-            if treinamento is not None:
-
-                resultado = pd.read_sql_query(_query + "\nWHERE [nome] = '"
-                                              + nome + "'"
-                                              + " AND [categoria] = '"
-                                              + categoria + "'"
-                                              + " AND [treinamento] = '"
-                                              + treinamento + "'", _conexao)
-
-            # Filtro por categoria
-            else:
-
-                resultado = pd.read_sql_query(_query + "\nWHERE [nome] = '"
-                                              + nome + "'"
-                                              + " AND [categoria] = '"
-                                              + categoria + "'", _conexao)
-
-        # Filtro por treinamento
-        elif treinamento is not None:
-
-            resultado = pd.read_sql_query(_query + "\nWHERE [nome] = '"
-                                          + nome + "'"
-                                          + " AND [treinamento] = '"
-                                          + treinamento + "'", _conexao)
-
-        # Sem filtro
-        else:
-            resultado = pd.read_sql_query(_query + "\nWHERE [nome] = '" + nome + "'", _conexao)
+    try:
+        resultado = consultas.provas(nome=nome, categoria=categoria, treinamento=treinamento)
 
     # Erro na query de seleção
     except pd.io.sql.DatabaseError:
@@ -272,17 +192,17 @@ def por_nome(nome, categoria=None, treinamento=None, opcao=None):
 
     # Primaria
     elif opcao == 'primaria':
-        media = resultado.groupby('treinamento').first()['nota'].mean()
+        media = resultado.groupby('treinamento', observed=True).first()['nota'].mean()
 
     # Final
     elif opcao == 'final':
-        media = resultado.groupby('treinamento')['nota'].max().mean()
+        media = resultado.groupby('treinamento', observed=True)['nota'].max().mean()
 
     # Todas. Retorna uma tupla com os três tipos de média
     elif opcao == 'todas':
         media = {'geral': resultado['nota'].mean(),
-                 'primaria': resultado.groupby('treinamento').first()['nota'].mean(),
-                 'final': resultado.groupby('treinamento')['nota'].max().mean()}
+                 'primaria': resultado.groupby('treinamento', observed=True).first()['nota'].mean(),
+                 'final': resultado.groupby('treinamento', observed=True)['nota'].max().mean()}
 
     # Sem opções selecionadas. Por padrão a média é a geral
     else:
@@ -290,8 +210,9 @@ def por_nome(nome, categoria=None, treinamento=None, opcao=None):
 
     return media
 
-# Calcula média de notas por CATEGORIA. Opção permite escolher o tipo de média
-def por_categoria(categoria, opcao=None):
+# Calcula média de notas por CATEGORIA. Opção permite escolher o tipo de média.
+# No_banco faz a agregação no banco (veja _agregadas). Matriz reaproveita uma matriz de médias (veja matriz)
+def por_categoria(categoria, opcao=None, no_banco=False, matriz=None):
 
     # Opções disponíveis
     opcoes = ['geral', 'primaria', 'final', 'todas', None]
@@ -300,8 +221,18 @@ def por_categoria(categoria, opcao=None):
     if opcao not in opcoes:
         return 'Opção de média inválida'
 
+    # Matriz de médias já calculada (veja matriz): as médias são calculadas a partir dela, sem consultar o banco
+    if matriz is not None:
+        return _da_matriz(matriz, opcao, categoria=categoria)
+
+    # Agregação no banco ou resumo materializado: apenas uma linha por grupo é transferida. As médias primária e final
+    # são por usuário e a opção todas é por treinamento
+    if no_banco or agregados.ativo():
+        agrupamento = 'treinamento' if opcao == 'todas' else 'nome'
+        return _agregadas(opcao, agrupamento, categoria=categoria)
+
     try:
-        resultado = pd.read_sql_query(_query + "\nWHERE [categoria] = '" + categoria + "'", _conexao)
+        resultado = consultas.provas(categoria=categoria)
 
     # Erro na query de seleção
     except pd.io.sql.DatabaseError:
@@ -315,17 +246,17 @@ def por_categoria(categoria, opcao=None):
 
     # Primaria
     elif opcao == 'primaria':
-        media = resultado.groupby('nome').first()['nota'].mean()
+        media = resultado.groupby('nome', observed=True).first()['nota'].mean()
 
     # Final
     elif opcao == 'final':
-        media = resultado.groupby('nome')['nota'].max().mean()
+        media = resultado.groupby('nome', observed=True)['nota'].max().mean()
 
     # Todas. Retorna uma tupla com os três tipos de média
     elif opcao == 'todas':
         media = {'geral': resultado['nota'].mean(),
-                 'primaria': resultado.groupby('treinamento').first()['nota'].mean(),
-                 'final': resultado.groupby('treinamento')['nota'].max().mean()}
+                 'primaria': resultado.groupby('treinamento', observed=True).first()['nota'].mean(),
+                 'final': resultado.groupby('treinamento', observed=True)['nota'].max().mean()}
 
     # Sem opções selecionadas. Por padrão a média é a geral
     else:
@@ -333,8 +264,9 @@ def por_categoria(categoria, opcao=None):
 
     return media
 
-# Calcula média de notas por TREINAMENTO. Opção permite escolher o tipo de média
-def por_treinamento(treinamento, opcao=None):
+# Calcula média de notas por TREINAMENTO. Opção permite escolher o tipo de média.
+# No_banco faz a agregação no banco (veja _agregadas). Matriz reaproveita uma matriz de médias com nível treinamento
+def por_treinamento(treinamento, opcao=None, no_banco=False, matriz=None):
 
     # Opções disponíveis
     opcoes = ['geral', 'primaria', 'final', 'todas', None]
@@ -343,8 +275,18 @@ def por_treinamento(treinamento, opcao=None):
     if opcao not in opcoes:
         return 'Opção de média inválida'
 
+    # Matriz de médias já calculada (veja matriz): as médias são calculadas a partir dela, sem consultar o banco
+    if matriz is not None:
+        return _da_matriz(matriz, opcao, treinamento=treinamento)
+
+    # Agregação no banco ou resumo materializado: apenas uma linha por grupo é transferida. As médias primária e final
+    # são por usuário e a opção todas é por treinamento
+    if no_banco or agregados.ativo():
+        agrupamento = 'treinamento' if opcao == 'todas' else 'nome'
+        return _agregadas(opcao, agrupamento, treinamento=treinamento)
+
     try:
-        resultado = pd.read_sql_query(_query + "\nWHERE [treinamento] = '" + treinamento + "'", _conexao)
+        resultado = consultas.provas(treinamento=treinamento)
 
     # Erro na query de seleção
     except pd.io.sql.DatabaseError:
@@ -358,20 +300,196 @@ def por_treinamento(treinamento, opcao=None):
 
     # Primaria
     elif opcao == 'primaria':
-        media = resultado.groupby('nome').first()['nota'].mean()
+        media = resultado.groupby('nome', observed=True).first()['nota'].mean()
 
     # Final
     elif opcao == 'final':
-        media = resultado.groupby('nome')['nota'].max().mean()
+        media = resultado.groupby('nome', observed=True)['nota'].max().mean()
 
     # Todas. Retorna uma tupla com os três tipos de média
     elif opcao == 'todas':
         media = {'geral': resultado['nota'].mean(),
-                 'primaria': resultado.groupby('treinamento').first()['nota'].mean(),
-                 'final': resultado.groupby('treinamento')['nota'].max().mean()}
+                 'primaria': resultado.groupby('treinamento', observed=True).first()['nota'].mean(),
+                 'final': resultado.groupby('treinamento', observed=True)['nota'].max().mean()}
 
     # Sem opções selecionadas. Por padrão a média é a geral
     else:
         media = resultado['nota'].mean()
 
     return media
+
+# Calcula médias de vários usuários de uma vez via FUNCIONAL, buscando as provas de todos em uma única consulta (dividida
+# em lotes para listas muito grandes). Categoria e Treinamento são filtros opcionais. Opção permite escolher o tipo de
+# média. Retorna um DataFrame indexado pelo funcional, com uma coluna por média. Usuários sem provas não aparecem
+def por_funcionais(funcionais, categoria=None, treinamento=None, opcao=None):
+    return _em_lote('funcional', funcionais, categoria=categoria, treinamento=treinamento, opcao=opcao)
+
+# Calcula médias de vários usuários de uma vez via RACF. Veja por_funcionais
+def por_racfs(racfs, categoria=None, treinamento=None, opcao=None):
+    return _em_lote('racf', racfs, categoria=categoria, treinamento=treinamento, opcao=opcao)
+
+# Busca as provas de vários usuários identificados pela chave e calcula suas médias
+def _em_lote(chave, valores, categoria=None, treinamento=None, opcao=None):
+
+    # Opções disponíveis
+    opcoes = ['geral', 'primaria', 'final', 'todas', None]
+
+    # Caso a opção seja diferente das possíveis
+    if opcao not in opcoes:
+        return 'Opção de média inválida'
+
+    try:
+        resultado = consultas.provas_em_lote(chave, valores, categoria=categoria, treinamento=treinamento)
+
+    # Erro na query de seleção
+    except pd.io.sql.DatabaseError:
+        return None
+
+    por_treinamento = resultado.groupby([chave, 'treinamento'], sort=False, observed=True)['nota']
+    primeiras, maiores = por_treinamento.first(), por_treinamento.max()
+
+    medias = pd.DataFrame({'geral': resultado.groupby(chave, sort=False, observed=True)['nota'].mean(),
+                           'primaria': agregados.rotular(primeiras, agregados.por_usuario(primeiras).mean()),
+                           'final': agregados.rotular(maiores, agregados.por_usuario(maiores).mean())})
+
+    medias = medias.set_axis(consultas.expandir(medias.index))
+
+    # Todas. Retorna as três colunas
+    if opcao == 'todas':
+        return medias
+
+    # Sem opções selecionadas. Por padrão a média é a geral
+    return medias[[opcao or 'geral']]
+
+# Calcula as médias a partir das provas agregadas por agrupamento: no banco (veja consultas.medias) ou, se estiver ativo,
+# no resumo materializado (veja agregados.medias). A média geral considera todas as notas e as médias primária e final
+# consideram uma nota por grupo. Filtros seguem consultas.provas
+def _agregadas(opcao, agrupamento, **filtros):
+
+    try:
+        if agregados.ativo():
+            grupos = agregados.medias(agrupamento, **filtros)
+        else:
+            grupos = consultas.medias(agrupamento, **filtros)
+
+    # Erro na query de seleção
+    except pd.io.sql.DatabaseError:
+        return None
+
+    contagem = grupos['contagem'].sum()
+    validos = grupos[grupos[agrupamento].notna()]
+
+    medias = {'geral': grupos['soma'].sum() / contagem if contagem else float('nan'),
+              'primaria': validos['primeira'].astype(float).mean(),
+              'final': validos['maior'].astype(float).mean()}
+
+    # Todas. Retorna as três médias
+    if opcao == 'todas':
+        return medias
+
+    # Sem opções selecionadas. Por padrão a média é a geral
+    return medias[opcao or 'geral']
+
+'''
+  Calcula as médias de todos os usuários em todas as categorias a partir de uma única leitura das provas (ou do resumo
+materializado, se estiver ativo). Chave é a coluna ou a lista de colunas que identifica o usuário (por padrão, o par
+nome/funcional, como nos rankings). Nível é treinamento, que inclui o treinamento no índice, ou categoria, para a matriz
+usuário × categoria. A matriz com nível treinamento serve para todas as médias de por_categoria e por_treinamento; a com
+nível categoria é menor, mas não serve para por_treinamento nem para a opção todas de por_categoria.
+  Retorna um DataFrame indexado por chave, categoria (e treinamento), com as colunas:
+
+    - geral, primaria e final: as três médias, como em por_funcional com a opção todas
+    - tentativas:              quantidade de provas feitas
+    - notas:                   quantidade de provas com nota
+    - primeira e maior:        primeira nota e maior nota do usuário no grupo
+    - ordem:                   posição da primeira nota do usuário no grupo, entre todas as provas
+
+  As quatro últimas permitem calcular as médias por categoria e por treinamento a partir da matriz (veja _da_matriz).
+'''
+def matriz(chave=None, nivel='treinamento'):
+
+    # Níveis disponíveis
+    if nivel not in ['categoria', 'treinamento']:
+        raise ValueError('Nível da matriz inválido: ' + str(nivel))
+
+    usuario = agregados.colunas_usuario(chave)
+    grupo = usuario + ['categoria', 'treinamento']
+
+    try:
+        # Resumo materializado ativo: as linhas já são agregadas por usuário e treinamento
+        if agregados.ativo():
+            tabela = agregados.materializado().sort_values('ordem', kind='stable', na_position='last')
+            treinamentos = agregados.agrupar(tabela, grupo, sort=True).agg(
+                tentativas=('tentativas', 'sum'), notas=('contagem', 'sum'), soma=('soma', 'sum'),
+                primeira=('primeira', 'first'), maior=('maior', 'max'), ordem=('ordem', 'min'))
+
+        else:
+            provas = consultas.provas()
+            # Posição de cada prova com nota, na ordem da consulta, como em groupby().first()
+            provas = provas.assign(ordem=np.where(provas['nota'].notna(), np.arange(len(provas)), np.nan))
+            treinamentos = agregados.agrupar(provas, grupo, sort=True).agg(
+                tentativas=('nota', 'size'), notas=('nota', 'count'), soma=('nota', 'sum'),
+                primeira=('nota', 'first'), maior=('nota', 'max'), ordem=('ordem', 'min'))
+
+    # Erro na query de seleção
+    except pd.io.sql.DatabaseError:
+        return None
+
+    treinamentos['primeira'] = treinamentos['primeira'].astype(float)
+    treinamentos['maior'] = treinamentos['maior'].astype(float)
+    colunas = ['geral', 'primaria', 'final', 'tentativas', 'notas', 'primeira', 'maior', 'ordem']
+
+    # Matriz por treinamento: a média primária é a primeira nota e a final é a maior
+    if nivel == 'treinamento':
+        treinamentos['geral'] = treinamentos['soma'] / treinamentos['notas'].where(treinamentos['notas'] > 0)
+        treinamentos['primaria'] = treinamentos['primeira']
+        treinamentos['final'] = treinamentos['maior']
+        return treinamentos[colunas]
+
+    # Provas sem treinamento entram apenas na média geral, como em por_funcional
+    validos = treinamentos.index.get_level_values('treinamento').notna()
+    por_categoria = treinamentos.groupby(level=usuario + ['categoria'], sort=True, observed=True, dropna=False)
+    ordenados = treinamentos.sort_values('ordem', kind='stable', na_position='last')
+    primeiras = ordenados.groupby(level=usuario + ['categoria'], sort=True, observed=True, dropna=False)['primeira']
+
+    medias = por_categoria[['tentativas', 'notas', 'soma', 'maior', 'ordem']].agg(
+        {'tentativas': 'sum', 'notas': 'sum', 'soma': 'sum', 'maior': 'max', 'ordem': 'min'})
+    medias['geral'] = medias['soma'] / medias['notas'].where(medias['notas'] > 0)
+    medias['primaria'] = treinamentos[validos].groupby(level=usuario + ['categoria'], observed=True)['primeira'].mean()
+    medias['final'] = treinamentos[validos].groupby(level=usuario + ['categoria'], observed=True)['maior'].mean()
+    medias['primeira'] = primeiras.first()
+
+    return medias[colunas]
+
+'''
+  Calcula as médias de uma categoria ou de um treinamento (filtro) a partir de uma matriz de médias (veja matriz), como
+em por_categoria e por_treinamento: as médias primária e final consideram uma nota por usuário e a opção todas considera
+uma nota por treinamento, que precisa da matriz com nível treinamento. Os usuários são os da chave da matriz.
+'''
+def _da_matriz(matriz, opcao, **filtro):
+
+    (coluna, valor), = filtro.items()
+    usuario = [nivel for nivel in matriz.index.names if nivel not in ['categoria', 'treinamento']]
+    agrupamento = ['treinamento'] if opcao == 'todas' else usuario
+
+    # Nível que não está na matriz
+    if coluna not in matriz.index.names or not set(agrupamento) <= set(matriz.index.names):
+        raise ValueError('Use a matriz com nível treinamento (veja matriz)')
+
+    linhas = matriz[matriz.index.get_level_values(coluna) == valor]
+    notas = linhas['notas'].sum()
+
+    # A primeira nota de cada grupo é a de menor ordem
+    ordenadas = linhas.sort_values('ordem', kind='stable', na_position='last')
+    grupos = ordenadas.groupby(level=agrupamento, sort=False, observed=True)
+
+    medias = {'geral': (linhas['geral'] * linhas['notas']).sum() / notas if notas else float('nan'),
+              'primaria': grupos['primeira'].first().mean(),
+              'final': grupos['maior'].max().mean()}
+
+    # Todas. Retorna as três médias
+    if opcao == 'todas':
+        return medias
+
+    # Sem opções selecionadas. Por padrão a média é a geral
+    return medias[opcao or 'geral']
@@ -0,0 +1,209 @@
+import numpy as np
+import pandas as pd
+
+"""
+    Neste arquivo, está o motor de cálculo em lote dos coeficientes. Em vez de consultar o banco uma vez por usuário,
+    o motor lê a tabela de provas uma única vez, usa o catálogo de treinamentos em memória e calcula CR, CP, CRP e
+    Score Final de todos os usuários com operações agrupadas.
+
+    As fórmulas são as mesmas descritas em rendimento.py, progressao.py, padrao.py e final.py. Os resultados
+    correspondem aos obtidos chamando as funções por_nome de cada arquivo para cada usuário, inclusive na ordem dos
+    usuários, que segue a ordem em que aparecem pela primeira vez na tabela de provas.
+
+    Os usuários são identificados pelo par nome/funcional (veja agregados.chave_usuario), assim como nas funções de
+    ranking. Pessoas diferentes com o mesmo nome têm coeficientes próprios e contam separadamente na média e no desvio
+    padrão do CRP.
+
+    Para tabelas muito grandes, as provas podem ser lidas em blocos e resumidas em agregados por usuário (veja
+    agregados.py e carregar_resumo). O cálculo a partir do resumo dá os mesmos resultados.
+
+    Os scores de todas as categorias podem ser calculados de uma vez (veja scores_categorias): as provas são lidas uma
+    única vez e agrupadas por categoria, usuário e treinamento, e a média e o desvio padrão do CRP de cada categoria
+    são aplicados a todos os usuários dela. O resultado de cada categoria é igual ao de scores com a categoria.
+
+"""
+
+from coeficiente import consultas, agregados, rendimento, progressao, padrao, perfil
+
+"""FUNÇÕES"""
+
+# Lê as provas realizadas com uma única consulta e obtém o catálogo de treinamentos em memória (veja progressao.py).
+# Categoria é um filtro opcional
+def carregar(categoria=None):
+
+    with perfil.etapa('leitura'):
+        provas = consultas.provas(categoria=categoria)
+
+    with perfil.etapa('catalogo'):
+        catalogo = progressao.catalogo()
+
+    return provas, catalogo
+
+'''
+  Calcula CR, CP, CRP e Score Final de todos os usuários a partir de provas e catálogo já carregados (veja carregar).
+  Categoria é um filtro opcional. Retorna uma linha por par nome/funcional, com índice ID na ordem em que o usuário
+aparece pela primeira vez nas provas. CR e CP estão na base 0 a 1.
+'''
+def calcular(provas, catalogo, categoria=None):
+
+    # Filtro por categoria
+    if categoria is not None:
+        with perfil.etapa('filtro'):
+            provas = provas[provas['categoria'] == categoria]
+
+    # Agrupamento por usuário e treinamento: soma, contagem, primeira e maior nota
+    with perfil.etapa('agrupamento'):
+        resumo = agregados.resumir(provas)
+
+    # Com as provas carregadas, a média geral do CR é calculada sobre as notas, como em rendimento.por_nome
+    with perfil.etapa('cr'):
+        cr = rendimento.coeficientes(provas)
+
+    return calcular_resumo(resumo, catalogo, categoria=categoria, cr=cr)
+
+# Lê as provas em blocos de até tamanho linhas, resumindo-as em agregados por usuário, ou usa o resumo materializado
+# ativo (veja agregados.resumo), e obtém o catálogo de treinamentos. Categoria é um filtro opcional
+def carregar_resumo(categoria=None, tamanho=None):
+
+    with perfil.etapa('leitura em blocos'):
+        resumo = agregados.resumo(categoria=categoria, tamanho=tamanho)
+
+    with perfil.etapa('catalogo'):
+        catalogo = progressao.catalogo()
+
+    return resumo, catalogo
+
+# Calcula CR, CP, CRP e Score Final de todos os usuários a partir de um resumo das provas já filtrado pela categoria
+# (veja agregados.resumir). CR é opcional, para usar CRs já calculados. Retorna o mesmo que calcular
+def calcular_resumo(resumo, catalogo, categoria=None, cr=None):
+
+    usuarios = resumo['usuarios'][['nome', 'racf', 'funcional']].reset_index(drop=True).rename_axis('ID')
+
+    if cr is None:
+        with perfil.etapa('cr'):
+            cr = rendimento.coeficientes_resumo(resumo['treinamentos'])
+
+    with perfil.etapa('cp'):
+        cp = progressao.coeficientes_resumo(resumo['treinamentos'], catalogo, categoria=categoria)
+
+    with perfil.etapa('crp'):
+        crp = padrao.coeficientes(cr)
+
+    with perfil.etapa('scores'):
+        identidades = usuarios[agregados.chave_usuario]
+        scores = usuarios.assign(cr=agregados.alinhar(cr, identidades),
+                                 cp=agregados.alinhar(cp, identidades),
+                                 crp=agregados.alinhar(crp, identidades))
+        scores['score'] = ((100 * scores['cr']) + (100 * scores['cp'])) / 2 + scores['crp']
+
+    return scores
+
+# Calcula os scores de todos os usuários (veja calcular), usando o resumo materializado se estiver ativo ou lendo as
+# provas em blocos de tamanho linhas se informado. Caso contrário, as provas são lidas de uma vez. Categoria é um filtro
+# opcional
+def scores(categoria=None, tamanho=None):
+
+    if tamanho or agregados.ativo():
+        resumo, catalogo = carregar_resumo(categoria=categoria, tamanho=tamanho)
+        return calcular_resumo(resumo, catalogo, categoria=categoria)
+
+    provas, catalogo = carregar(categoria=categoria)
+
+    return calcular(provas, catalogo, categoria=categoria)
+
+# Lê as provas de todas as categorias com uma única consulta, ou usa o resumo materializado se estiver ativo, e as agrupa
+# por categoria, usuário e treinamento. Retorna o resumo das categorias (agregados, usuários de cada categoria e, com a
+# leitura das provas, a média geral de cada usuário sobre as notas) e o catálogo de treinamentos
+def carregar_categorias():
+
+    usuario = ['categoria'] + agregados.chave_usuario
+    grupo = usuario + ['treinamento']
+
+    with perfil.etapa('leitura'):
+        # Resumo materializado ativo (veja agregados.py)
+        if agregados.ativo():
+            tabela = agregados.materializado()
+            primeiras = tabela.sort_values('ordem', kind='stable', na_position='last')
+            treinamentos = agregados.agrupar(primeiras, grupo).agg({'soma': 'sum', 'contagem': 'sum',
+                                                                    'primeira': 'first'})
+            usuarios, geral = tabela.sort_values('inicio', kind='stable'), None
+
+        else:
+            provas = consultas.provas()
+            treinamentos = agregados.agrupar(provas, grupo)['nota'].agg(['sum', 'count', 'first'])
+            treinamentos.columns = ['soma', 'contagem', 'primeira']
+            usuarios = provas
+            geral = agregados.agrupar(provas, usuario)['nota'].mean()
+
+    # Pares nome/funcional de cada categoria, na ordem em que aparecem pela primeira vez
+    usuarios = usuarios.drop_duplicates(subset=['categoria', 'nome', 'funcional'])
+    usuarios = usuarios.loc[usuarios['categoria'].notna(), ['categoria', 'nome', 'racf', 'funcional']]
+
+    with perfil.etapa('catalogo'):
+        catalogo = progressao.catalogo()
+
+    treinamentos = treinamentos.reset_index()
+    treinamentos = treinamentos[treinamentos['categoria'].notna()]
+
+    return {'treinamentos': treinamentos, 'usuarios': usuarios, 'geral': geral}, catalogo
+
+'''
+  Calcula CR, CP, CRP e Score Final de todos os usuários em todas as categorias a partir do resumo de
+carregar_categorias, com operações agrupadas por categoria. Retorna uma linha por categoria e par nome/funcional,
+indexada por categoria e ID, em que o ID de cada categoria é o mesmo de scores com a categoria.
+'''
+def calcular_categorias(resumo, catalogo):
+
+    usuarios = resumo['usuarios'].sort_values('categoria', kind='stable').reset_index(drop=True)
+    usuarios.index = pd.MultiIndex.from_arrays([usuarios['categoria'],
+                                                usuarios.groupby('categoria', sort=False, observed=True).cumcount()],
+                                               names=['categoria', 'ID'])
+    usuarios = usuarios[['nome', 'racf', 'funcional']]
+
+    usuario = ['categoria'] + agregados.chave_usuario
+    treinamentos = resumo['treinamentos']
+    grupos = agregados.agrupar(treinamentos, usuario)
+
+    # Provas sem treinamento entram apenas na média geral
+    validos = agregados.agrupar(treinamentos[treinamentos['treinamento'].notna()], usuario)
+
+    with perfil.etapa('cr'):
+        geral = resumo['geral']
+        if geral is None:
+            geral = grupos['soma'].sum() / grupos['contagem'].sum()
+
+        cr = (geral + agregados.alinhar(validos['primeira'].mean(), geral.index)) / 20
+
+    with perfil.etapa('cp'):
+        realizados = pd.Series(np.nan_to_num(agregados.alinhar(validos.size(), cr.index)), index=cr.index)
+        disponiveis = catalogo.groupby('Categoria')['Treinamento'].count()
+        disponiveis = disponiveis.reindex(cr.index.get_level_values('categoria'), fill_value=0)
+        cp = realizados / disponiveis.to_numpy()
+
+    # Posição de cada usuário nos coeficientes por categoria e par nome/funcional
+    colunas = [usuarios.index.get_level_values('categoria')] + [usuarios[coluna] for coluna in agregados.chave_usuario]
+    posicoes = cr.index.get_indexer(pd.MultiIndex.from_arrays(colunas))
+
+    with perfil.etapa('crp'):
+        # Média e desvio padrão dos CRs dos usuários de cada categoria, aplicados a todos eles. São calculados como em
+        # padrao.coeficientes, uma vez por categoria, para que os resultados sejam idênticos
+        media_total = cr.groupby(level='categoria', observed=True).agg(lambda valores: valores.mean())
+        categorias = usuarios.index.get_level_values('categoria')
+        cr_usuarios = pd.Series(cr.to_numpy()[posicoes], index=usuarios.index)
+        desvio = cr_usuarios.groupby(level='categoria', observed=True).agg(
+            lambda valores: np.nanstd(valores.to_numpy()) if valores.notna().any() else np.nan)
+        crp = (cr_usuarios - media_total.reindex(categorias).to_numpy()) / desvio.reindex(categorias).to_numpy()
+
+    with perfil.etapa('scores'):
+        scores = usuarios.assign(cr=cr_usuarios, cp=cp.to_numpy()[posicoes], crp=crp)
+        scores['score'] = ((100 * scores['cr']) + (100 * scores['cp'])) / 2 + scores['crp']
+
+    return scores
+
+# Calcula os scores de todos os usuários em todas as categorias a partir de uma única leitura das provas (veja
+# calcular_categorias)
+def scores_categorias():
+
+    resumo, catalogo = carregar_categorias()
+
+    return calcular_categorias(resumo, catalogo)
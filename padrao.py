@@ -1,7 +1,7 @@
+import time
 import numpy as np
 import pandas as pd
-import pandas.io.sql
-from coeficiente import rendimento
+from coeficiente import conexao, consultas, agregados, rendimento, posicoes
 
 """
     Neste arquivo, estão as funções para cálculo do Coeficiente de Rendimento Padrão (CRP)
@@ -27,68 +27,107 @@ from coeficiente import rendimento
     As funções permitem que se utilize filtros opcionais para se refinar a busca. Este arquivo também se utiliza do
     arquivo de coeficientes para realizar seus cálculos
 
+    MCR e DpCRT dependem de todos os usuários e mudam pouco entre consultas. Por isso, são guardados em cache por
+    categoria nas variáveis globais abaixo. Enquanto a validade não expira, o cache é usado diretamente. Depois disso,
+    uma marca d'água dos dados (quantidade, maior coluna_ordem e soma das notas; veja consultas.marca_provas) é
+    consultada e as estatísticas só são recalculadas se os dados mudaram. O cache é descartado quando a conexão é
+    configurada para outro banco (veja conexao.geracao). Assim, o CRP de um usuário custa a consulta do seu CR e um
+    acesso ao cache.
+
 """
 
+"""VARIÁVEIS GLOBAIS"""
+_estatisticas = {}
+
+# Tempo, em segundos, em que as estatísticas em cache são usadas sem consultar a marca d'água
+validade_estatisticas = 300
+
 """FUNÇÕES"""
 
-# Calcula o CRP de um usuário fazendo a busca via FUNCIONAL. Categoria é um filtro opcional
-def por_funcional(funcional, categoria=None):
+'''
+  Retorna as estatísticas da população de CRs usadas no CRP: média (MCR), desvio padrão (DpCRT) e número de usuários.
+  Categoria é um filtro opcional. As estatísticas ficam em cache e só são recalculadas quando a validade expira e a marca
+d'água das provas mudou (veja consultas.marca_provas), quando a conexão é configurada para outro banco ou quando forcar
+é verdadeiro.
+'''
+def estatisticas(categoria=None, forcar=False):
 
-    try:
+    entrada = _estatisticas.get(categoria)
+    agora = time.monotonic()
 
-        # Filtro por categoria
-        if categoria is not None:
-            cr = rendimento.por_funcional(funcional, categoria=categoria)
-            media_total = rendimento.rendimento_medio(categoria=categoria)
+    # Estatísticas de outro banco (veja conexao.geracao)
+    if entrada is not None and entrada['geracao'] != conexao.geracao():
+        entrada = None
 
-            media_turma = rendimento.ranking_coeficentes(categoria=categoria)
-            media_turma = media_turma['Coeficiente']
+    # Cache dentro da validade
+    if entrada is not None and not forcar and agora - entrada['instante'] < validade_estatisticas:
+        return entrada
 
-            coeficiente = (cr - media_total) / np.std(media_turma)
+    try:
+        marca = consultas.marca_provas(categoria=categoria)
 
-        # Sem filtro
-        else:
-            cr = rendimento.por_funcional(funcional=funcional)
-            media_total = rendimento.rendimento_medio()
+    # Erro na query de seleção
+    except pd.io.sql.DatabaseError:
+        return None
 
-            media_turma = rendimento.ranking_coeficentes()
-            media_turma = media_turma['Coeficiente']
+    # Validade expirada, mas os dados não mudaram
+    if entrada is not None and not forcar and entrada['marca'] == marca:
+        entrada['instante'] = agora
+        return entrada
 
-            coeficiente = (cr - media_total) / np.std(media_turma)
+    # Os CRs de todos os usuários, sem montar e ordenar o ranking
+    cr = rendimento.coeficientes_usuarios(categoria=categoria)
 
-    # Caso uma das buscas retorne em erro
-    except NameError:
+    # Erro na query de seleção ou nenhum usuário com provas
+    if cr is None or cr.empty:
         return None
 
-    return coeficiente
+    # Média e desvio padrão consideram um CR por usuário (par nome/funcional), com as mesmas operações de coeficientes
+    entrada = {'media': cr.mean(),
+               'desvio': np.nanstd(cr.to_numpy(dtype=float)) if cr.notna().any() else np.nan,
+               'usuarios': len(cr),
+               'marca': marca,
+               'geracao': conexao.geracao(),
+               'instante': agora}
 
-# Calcula o CRP de um usuário fazendo a busca via RACF. Categoria é um filtro opcional
-def por_racf(racf, categoria=None):
+    _estatisticas[categoria] = entrada
+
+    return entrada
+
+# Descarta as estatísticas em cache. Categoria é um filtro opcional; sem ela, todo o cache é descartado
+def invalidar_estatisticas(categoria=None):
+
+    if categoria is not None:
+        _estatisticas.pop(categoria, None)
+    else:
+        _estatisticas.clear()
+
+# Calcula o CRP de um usuário fazendo a busca via FUNCIONAL. Categoria é um filtro opcional
+def por_funcional(funcional, categoria=None):
 
     try:
+        cr = rendimento.por_funcional(funcional, categoria=categoria)
+        populacao = estatisticas(categoria=categoria)
 
-        # Filtro por categoria
-        if categoria is not None:
-            cr = rendimento.por_racf(racf, categoria=categoria)
-            media_total = rendimento.rendimento_medio(categoria=categoria)
+        coeficiente = (cr - populacao['media']) / populacao['desvio']
 
-            media_turma = rendimento.ranking_coeficentes(categoria=categoria)
-            media_turma = media_turma['Coeficiente']
+    # Caso uma das buscas retorne em erro
+    except (NameError, TypeError):
+        return None
 
-            coeficiente = (cr - media_total) / np.std(media_turma)
+    return coeficiente
 
-        # Sme filtro
-        else:
-            cr = rendimento.por_racf(racf=racf)
-            media_total = rendimento.rendimento_medio()
+# Calcula o CRP de um usuário fazendo a busca via RACF. Categoria é um filtro opcional
+def por_racf(racf, categoria=None):
 
-            media_turma = rendimento.ranking_coeficentes()
-            media_turma = media_turma['Coeficiente']
+    try:
+        cr = rendimento.por_racf(racf, categoria=categoria)
+        populacao = estatisticas(categoria=categoria)
 
-            coeficiente = (cr - media_total) / np.std(media_turma)
+        coeficiente = (cr - populacao['media']) / populacao['desvio']
 
     # Caso uma das buscas retorne em erro
-    except NameError:
+    except (NameError, TypeError):
         return None
 
     return coeficiente
@@ -97,117 +136,99 @@ def por_racf(racf, categoria=None):
 def por_nome(nome, categoria=None):
 
     try:
+        cr = rendimento.por_nome(nome, categoria=categoria)
+        populacao = estatisticas(categoria=categoria)
 
-        # Filtro por categoria
-        if categoria is not None:
-            cr = rendimento.por_nome(nome, categoria=categoria)
-            media_total = rendimento.rendimento_medio(categoria=categoria)
+        coeficiente = (cr - populacao['media']) / populacao['desvio']
 
-            media_turma = rendimento.ranking_coeficentes(categoria=categoria)
-            media_turma = media_turma['Coeficiente']
+    # Caso uma das buscas retorne em erro
+    except (NameError, TypeError):
+        return None
 
-            coeficiente = (cr - media_total) / np.std(media_turma)
+    return coeficiente
 
-        # Sem filtro
-        else:
-            cr = rendimento.por_nome(nome=nome)
-            media_total = rendimento.rendimento_medio()
+# Calcula o CRP de vários usuários de uma vez via FUNCIONAL. Os CRs são buscados em uma única consulta (veja
+# rendimento.por_funcionais) e as estatísticas vêm do cache. Categoria é um filtro opcional. Retorna um DataFrame
+# indexado pelo funcional
+def por_funcionais(funcionais, categoria=None):
+    return _padronizar(rendimento.por_funcionais(funcionais, categoria=categoria), categoria=categoria)
 
-            media_turma = rendimento.ranking_coeficentes()
-            media_turma = media_turma['Coeficiente']
+# Calcula o CRP de vários usuários de uma vez via RACF. Veja por_funcionais
+def por_racfs(racfs, categoria=None):
+    return _padronizar(rendimento.por_racfs(racfs, categoria=categoria), categoria=categoria)
 
-            coeficiente = (cr - media_total) / np.std(media_turma)
+# Converte uma tabela de CRs em CRPs com as estatísticas da população em cache
+def _padronizar(cr, categoria=None):
+
+    populacao = estatisticas(categoria=categoria)
 
     # Caso uma das buscas retorne em erro
-    except NameError:
+    if cr is None or populacao is None:
         return None
 
-    return coeficiente
+    return (cr - populacao['media']) / populacao['desvio']
 
 '''
-  Calcula todos os CRs de todos os usuários que realizaram ao menos uma prova e retorna uma lista ranqueada.
+  Calcula todos os CRPs de todos os usuários que realizaram ao menos uma prova e retorna uma lista ranqueada.
   Categoria é um filtro opcional e top20 retorna apenas os 20 primeiros colocados. Em caso de empate, o primeiro a fazer
 as provas fica na frente.
   Por padrão, retorna nome e funcional. Mas a função também permite se escolher o que a tabela retornará. É possível,
 ainda, retornar apenas o score, sem os outros valores.
 '''
-def ranking_padrao(categoria=None, nome=True, funcional=False, top20=False):
+def ranking_padrao(categoria=None, nome=True, funcional=False, top20=False, tamanho_bloco=None):
 
     try:
+        # Leitura em blocos ou resumo materializado: apenas os agregados por usuário ficam na memória (veja agregados.py)
+        if tamanho_bloco or agregados.ativo():
+            resumo = agregados.resumo(categoria=categoria, tamanho=tamanho_bloco)
+            usuarios, cr = resumo['usuarios'], rendimento.coeficientes_resumo(resumo['treinamentos'])
 
-        temp = []
-        ranking = pd.DataFrame()
-
-        # Filtro categoria
-        if categoria is not None:
-
-            lista_cr = rendimento.ranking_coeficentes(categoria=categoria, nome=True, funcional=True)
-            desvio = np.std(lista_cr['Coeficiente'])
-            media_total = rendimento.rendimento_medio(categoria=categoria)
-
-            for index, row in lista_cr.iterrows():
-
-                coeficiente = (row['Coeficiente'] - media_total) / desvio
-
-                if funcional and nome:
-                    temp.append([row['Nome'], row['Funcional'], coeficiente])
-                elif funcional and not nome:
-                    temp.append([row['Funcional'], coeficiente])
-                elif not funcional and nome:
-                    temp.append([row['Nome'], coeficiente])
-                else:
-                    temp.append(por_nome(row['nome']))
-
-            if funcional and nome:
-                ranking = ranking.append(pd.DataFrame(temp, columns=['Nome', 'Funcional', 'Coeficiente']))
-            elif funcional and not nome:
-                ranking = ranking.append(pd.DataFrame(temp, columns=['Funcional', 'Coeficiente']))
-            elif not funcional and nome:
-                ranking = ranking.append(pd.DataFrame(temp, columns=['Nome', 'Coeficiente']))
-            else:
-                ranking = ranking.append(pd.DataFrame(temp, columns=['Coeficiente']))
-
-        # Sem filtos
         else:
+            # Os CRs de todos os usuários são calculados de uma vez sobre as provas já lidas, sem novas consultas
+            provas = consultas.provas(categoria=categoria)
+            usuarios, cr = provas.drop_duplicates(subset=['nome', 'funcional']), rendimento.coeficientes(provas)
 
-            lista_cr = rendimento.ranking_coeficentes(nome=True, funcional=True)
-            desvio = np.std(lista_cr['Coeficiente'])
-            media_total = rendimento.rendimento_medio()
+    # Erro nas queries de seleção
+    except pd.io.sql.DatabaseError:
+        return None
 
-            for index, row in lista_cr.iterrows():
+    usuarios = usuarios.reset_index(drop=True)
+    crp = coeficientes(cr)
 
-                coeficiente = (row['Coeficiente'] - media_total) / desvio
+    ranking = pd.DataFrame({'Nome': consultas.expandir(usuarios['nome']),
+                            'Funcional': consultas.expandir(usuarios['funcional']),
+                            'Coeficiente': agregados.alinhar(crp, usuarios[agregados.chave_usuario])})
 
-                if funcional and nome:
-                    temp.append([row['Nome'], row['Funcional'], coeficiente])
-                elif funcional and not nome:
-                    temp.append([row['Funcional'], coeficiente])
-                elif not funcional and nome:
-                    temp.append([row['Nome'], coeficiente])
-                else:
-                    temp.append(por_nome(row['nome']))
+    # Ordenação pelo coeficiente. Com top20, apenas os 20 primeiros (veja posicoes.ordenar)
+    ranking = posicoes.ordenar(ranking.rename_axis('ID'), 'Coeficiente', k=20 if top20 else None)
 
-            if funcional and nome:
-                ranking = ranking.append(pd.DataFrame(temp, columns=['Nome', 'Funcional', 'Coeficiente']))
-            elif funcional and not nome:
-                ranking = ranking.append(pd.DataFrame(temp, columns=['Funcional', 'Coeficiente']))
-            elif not funcional and nome:
-                ranking = ranking.append(pd.DataFrame(temp, columns=['Nome', 'Coeficiente']))
-            else:
-                ranking = ranking.append(pd.DataFrame(temp, columns=['Coeficiente']))
+    # Como o CRP cresce com o CR, o ID é a posição do usuário no ranking de CRs (veja rendimento.ranking_coeficentes)
+    ranking.index = pd.RangeIndex(len(ranking), name='ID')
 
-        ranking = ranking.rename_axis('ID').sort_values(by=['Coeficiente', 'ID'], ascending=[False, True])
+    # Colunas retornadas
+    colunas = ['Coeficiente']
 
-        # Apenas os 20 primeiros
-        if top20:
-            ranking = ranking.head(20)
+    if funcional:
+        colunas = ['Funcional'] + colunas
+    if nome:
+        colunas = ['Nome'] + colunas
 
-    # Erro nas queries de seleção
-    except pd.io.sql.DatabaseError:
-        return None
+    ranking = ranking[colunas]
 
     # Ranking vazio
     if ranking.empty:
         return None
 
     return ranking
+
+# Calcula o CRP de cada usuário a partir de CRs já calculados, um por par nome/funcional (veja
+# rendimento.coeficientes). Retorna uma série com o mesmo índice dos CRs
+def coeficientes(cr):
+
+    media_total = cr.mean()
+
+    # Usuários sem CR (todas as notas nulas) ficam fora da média e do desvio padrão, como em estatisticas. Sem
+    # usuários (categoria sem provas), o desvio padrão é indefinido
+    desvio = np.nanstd(cr.to_numpy(dtype=float)) if cr.notna().any() else np.nan
+
+    return (cr - media_total) / desvio
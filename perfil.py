@@ -0,0 +1,153 @@
+import json
+import time
+import threading
+import contextlib
+import tracemalloc
+import pandas as pd
+
+"""
+    Neste arquivo, estão os ganchos de perfil das etapas do cálculo.
+
+    As etapas principais do cálculo são marcadas com etapa(nome): leitura das provas e do catálogo, agrupamentos por
+    usuário e treinamento, cálculo de CR, CP e CRP, montagem e ordenação das tabelas e gravação das planilhas. Enquanto
+    um perfil estiver ativo (veja perfilar), cada etapa tem medidos:
+
+        - tempo:   tempo total gasto na etapa, em segundos
+        - memoria: pico de memória alocada durante a etapa, acima da memória em uso no seu início, em MB (tracemalloc)
+        - vezes:   quantidade de vezes que a etapa foi executada
+
+    As etapas podem ser aninhadas. Cada etapa é identificada pelo caminho das etapas em que está contida, separado por
+    barras (por exemplo, leitura/sql). O tempo e a memória de uma etapa incluem os das etapas contidas nela.
+
+    Sem perfil ativo, as etapas não medem nada. Com perfil ativo, o tracemalloc deixa a execução mais lenta, então os
+    tempos servem para comparar execuções com perfil entre si. As etapas executadas em outros processos (veja
+    relatorio.gerar_rankings) não são medidas.
+
+    O relatório (veja relatorio e salvar) é um JSON com uma entrada por etapa, e comparar mostra a diferença entre dois
+    relatórios, por exemplo antes e depois de uma otimização.
+
+"""
+
+"""VARIÁVEIS GLOBAIS"""
+_perfis = []
+_pilha = threading.local()
+_trava = threading.Lock()
+
+"""FUNÇÕES"""
+
+# Indica se há algum perfil ativo
+def ativo():
+    return bool(_perfis)
+
+# Ativa um perfil durante o bloco with e o desativa ao final. Inicia o tracemalloc se ele ainda não estiver ativo
+@contextlib.contextmanager
+def perfilar():
+
+    perfil = {'etapas': {}, 'inicio': time.time(), 'fim': None}
+    iniciou = not tracemalloc.is_tracing()
+
+    if iniciou:
+        tracemalloc.start()
+
+    with _trava:
+        _perfis.append(perfil)
+
+    try:
+        yield perfil
+
+    finally:
+        with _trava:
+            _perfis.remove(perfil)
+
+        if iniciou:
+            tracemalloc.stop()
+
+        perfil['fim'] = time.time()
+
+# Marca uma etapa do cálculo. Com um perfil ativo, mede tempo e pico de memória do bloco with
+@contextlib.contextmanager
+def etapa(nome):
+
+    # Sem perfil ativo
+    if not _perfis or not tracemalloc.is_tracing():
+        yield
+        return
+
+    pilha = getattr(_pilha, 'etapas', None)
+    if pilha is None:
+        pilha = _pilha.etapas = []
+
+    # O pico da etapa de fora até aqui é guardado antes de o pico ser zerado para esta etapa
+    atual, pico = tracemalloc.get_traced_memory()
+    if pilha:
+        pilha[-1]['pico'] = max(pilha[-1]['pico'], pico)
+
+    tracemalloc.reset_peak()
+    registro = {'caminho': '/'.join([entrada['nome'] for entrada in pilha] + [nome]), 'nome': nome,
+                'base': atual, 'pico': atual}
+    pilha.append(registro)
+    inicio = time.perf_counter()
+
+    try:
+        yield
+
+    finally:
+        tempo = time.perf_counter() - inicio
+        pilha.pop()
+
+        registro['pico'] = max(registro['pico'], tracemalloc.get_traced_memory()[1])
+        if pilha:
+            pilha[-1]['pico'] = max(pilha[-1]['pico'], registro['pico'])
+
+        _registrar(registro['caminho'], tempo, (registro['pico'] - registro['base']) / 2 ** 20)
+
+# Soma as medidas de uma etapa nos perfis ativos
+def _registrar(caminho, tempo, memoria):
+
+    with _trava:
+        for perfil in _perfis:
+            medidas = perfil['etapas'].setdefault(caminho, {'tempo': 0.0, 'memoria': 0.0, 'vezes': 0})
+            medidas['tempo'] += tempo
+            medidas['memoria'] = max(medidas['memoria'], memoria)
+            medidas['vezes'] += 1
+
+# Retorna o relatório de um perfil: um dicionário serializável em JSON, com as medidas de cada etapa
+def relatorio(perfil):
+
+    return {'inicio': perfil['inicio'],
+            'fim': perfil['fim'],
+            'etapas': {caminho: dict(medidas) for caminho, medidas in sorted(perfil['etapas'].items())}}
+
+# Retorna as etapas de um perfil ou relatório em um DataFrame indexado pelo caminho da etapa
+def tabela(perfil):
+
+    etapas = perfil['etapas']
+
+    return pd.DataFrame.from_dict(etapas, orient='index', columns=['tempo', 'memoria', 'vezes']).rename_axis('etapa')
+
+# Grava o relatório de um perfil em um arquivo JSON
+def salvar(perfil, arquivo):
+
+    with open(arquivo, 'w', encoding='utf-8') as saida:
+        json.dump(relatorio(perfil), saida, indent=2, ensure_ascii=False)
+
+# Lê um relatório gravado por salvar
+def carregar(arquivo):
+
+    with open(arquivo, encoding='utf-8') as entrada:
+        return json.load(entrada)
+
+# Compara dois perfis ou relatórios. Retorna um DataFrame com tempo e memória de cada etapa antes e depois e a razão
+# entre eles
+def comparar(antes, depois):
+
+    tabela_antes = tabela(antes)
+    tabela_depois = tabela(depois)
+
+    comparacao = tabela_antes[['tempo', 'memoria']].join(tabela_depois[['tempo', 'memoria']], how='outer',
+                                                        lsuffix='_antes', rsuffix='_depois')
+
+    comparacao['razao_tempo'] = comparacao['tempo_depois'] / comparacao['tempo_antes']
+    comparacao['razao_memoria'] = comparacao['memoria_depois'] / comparacao['memoria_antes']
+
+    return comparacao
@@ -0,0 +1,255 @@
+import time
+import numpy as np
+import pandas as pd
+
+"""
+    Neste arquivo, estão as funções de consulta da posição de um usuário nos rankings.
+
+    Para responder "qual é a minha posição no ranking de Python?" sem montar e percorrer o ranking inteiro, os scores de
+    todos os usuários de uma categoria são calculados uma única vez (veja motor.py) e guardados em um índice, com uma
+    ordenação por métrica:
+
+        - score: Score Final
+        - cr:    Coeficiente de Rendimento
+        - cp:    Coeficiente de Progressão
+        - crp:   Coeficiente de Rendimento Padrão
+
+    Cada ordenação segue a regra dos rankings: maior valor primeiro e, em caso de empate, o primeiro a fazer as provas
+    (menor ID) fica na frente. Usuários sem valor ficam no fim. Os valores são comparados com casas_desempate casas
+    decimais, para que diferenças de arredondamento entre as formas de cálculo (em uma passagem ou em blocos, por
+    exemplo) não desfaçam empates. A posição de um usuário é encontrada por busca binária na ordenação e os primeiros
+    colocados são lidos diretamente do início dela.
+
+    Os índices ficam em cache por categoria, assim como as estatísticas de padrao.py. Quando a validade expira, as
+    marcas d'água das provas da categoria e do catálogo são consultadas (veja consultas.marca_provas) e o índice só é
+    recalculado se uma delas mudou. Ele também é recalculado quando invalidado ou quando a conexão é configurada para
+    outro banco (veja conexao.geracao). O serviço de scores (veja servico.py) mantém os seus próprios índices, que são
+    recalculados em segundo plano.
+
+"""
+
+from coeficiente import conexao, consultas, motor, identidades
+
+"""VARIÁVEIS GLOBAIS"""
+_indices = {}
+
+# Métricas com ordenação no índice
+metricas = ['score', 'cr', 'cp', 'crp']
+
+# Tempo, em segundos, em que um índice em cache é usado antes de ser recalculado
+validade_indices = 300
+
+# Casas decimais consideradas na comparação dos valores dos rankings. Diferenças menores contam como empate
+casas_desempate = 9
+
+"""FUNÇÕES"""
+
+# Retorna as chaves de ordenação dos rankings: valores arredondados em casas_desempate casas e negados, para ordem
+# crescente, com os nulos no fim
+def chaves(valores):
+
+    valores = np.asarray(valores, dtype=float)
+
+    return np.where(np.isnan(valores), np.inf, -np.round(valores, casas_desempate))
+
+# Ordena os IDs pela regra dos rankings: valor decrescente, depois ID crescente, com valores nulos no fim. Retorna as
+# chaves de ordenação (veja chaves), os IDs, na ordem, e o número de usuários com valor
+def _ordenar(valores, ids):
+
+    chaves_ordem = chaves(valores)
+    ordem = np.lexsort((ids, chaves_ordem))
+
+    return chaves_ordem[ordem], ids[ordem], int(np.count_nonzero(~np.isnan(valores)))
+
+# Converte um identificador em texto para os mapas. Números inteiros guardados como float (100017.0, por exemplo, em
+# colunas com nulos) viram o mesmo texto do inteiro ('100017')
+def _texto(valor):
+
+    if isinstance(valor, (float, np.floating)) and float(valor).is_integer():
+        valor = int(valor)
+
+    return str(valor)
+
+# Monta o mapa de um identificador (funcional ou racf) para o primeiro ID em que ele aparece
+def _mapa(coluna, ids):
+
+    mapa = {}
+
+    for valor, identificador in zip(coluna.tolist(), ids.tolist()):
+        mapa.setdefault(_texto(valor), identificador)
+
+    return mapa
+
+'''
+  Calcula os scores de todos os usuários de uma categoria (None para o ranking geral) e monta o índice de posições.
+  Retorna o índice, um dicionário com os scores, as ordenações por métrica e os mapas de funcional, racf e nome para ID.
+'''
+def construir(categoria=None):
+
+    # As marcas são lidas antes dos scores: uma mudança entre as consultas faz o índice ser recalculado na próxima
+    # verificação, em vez de passar despercebida
+    geracao = conexao.geracao()
+    marca = _marca_dagua(categoria=categoria)
+    scores = motor.scores(categoria=categoria)
+    ids = scores.index.to_numpy()
+
+    ordenacoes = {}
+    for metrica in metricas:
+        chaves_ordem, ordem, total = _ordenar(scores[metrica].to_numpy(dtype=float), ids)
+        ordenacoes[metrica] = {'chaves': chaves_ordem, 'ids': ordem, 'total': total}
+
+    indice = {'scores': scores,
+              'ordenacoes': ordenacoes,
+              'funcionais': _mapa(scores['funcional'], ids),
+              'racfs': _mapa(scores['racf'], ids),
+              'nomes': _mapa(scores['nome'], ids),
+              'normalizados': _mapa(scores['nome'].map(identidades.normalizar), ids),
+              'marca': marca,
+              'geracao': geracao,
+              'instante': time.monotonic()}
+
+    _indices[categoria] = indice
+
+    return indice
+
+# Marca d'água dos dados de um índice: a das provas da categoria e a do catálogo, usado no CP
+def _marca_dagua(categoria=None):
+    return consultas.marca_provas(categoria=categoria), consultas.marca_treinamentos()
+
+'''
+  Retorna o índice de posições de uma categoria. O índice em cache é usado enquanto a validade não expira e, depois
+disso, enquanto as marcas d'água dos dados não mudam. Forcar recalcula o índice.
+'''
+def indice(categoria=None, forcar=False):
+
+    entrada = _indices.get(categoria)
+    agora = time.monotonic()
+
+    # Sem cache, cache de outro banco (veja conexao.geracao) ou recálculo forçado
+    if entrada is None or forcar or entrada['geracao'] != conexao.geracao():
+        return construir(categoria)
+
+    # Cache dentro da validade
+    if agora - entrada['instante'] < validade_indices:
+        return entrada
+
+    # Validade expirada, mas os dados não mudaram
+    if _marca_dagua(categoria=categoria) == entrada['marca']:
+        entrada['instante'] = agora
+        return entrada
+
+    return construir(categoria)
+
+# Descarta o índice em cache de uma categoria ou, por padrão, de todas
+def invalidar(categoria=None):
+
+    if categoria is None:
+        _indices.clear()
+    else:
+        _indices.pop(categoria, None)
+
+# Retorna o ID de um usuário no índice, identificado pelo funcional, pelo racf ou pelo nome. Retorna None se ele não fez
+# provas na categoria
+def identificar(dados, funcional=None, racf=None, nome=None):
+
+    if funcional is not None:
+        return dados['funcionais'].get(_texto(funcional))
+
+    if racf is not None:
+        return dados['racfs'].get(_texto(racf))
+
+    # Nome exato não encontrado: busca pelo nome normalizado, como nas consultas (veja consultas.nomes)
+    identificador = dados['nomes'].get(_texto(nome))
+    if identificador is None:
+        identificador = dados['normalizados'].get(_texto(identidades.normalizar(nome)))
+
+    return identificador
+
+# Retorna a posição de um ID no ranking de uma métrica do índice, no formato de posicao. Retorna None se o usuário não
+# tem valor na métrica
+def localizar(dados, identificador, metrica='score'):
+
+    valor = dados['scores'].at[identificador, metrica]
+
+    # Usuário sem valor na métrica
+    if pd.isna(valor):
+        return None
+
+    # Busca binária: primeiro pelo valor e, entre os empatados, pelo ID
+    ordenacao = dados['ordenacoes'][metrica]
+    chave = chaves([valor])[0]
+    inicio = np.searchsorted(ordenacao['chaves'], chave, side='left')
+    fim = np.searchsorted(ordenacao['chaves'], chave, side='right')
+    lugar = int(inicio + np.searchsorted(ordenacao['ids'][inicio:fim], identificador))
+
+    # Usuários sem valor na métrica ficam fora do total e do percentil
+    total = ordenacao['total']
+
+    return {'posicao': lugar + 1,
+            'total': total,
+            'percentil': 100 * (total - lugar - 1) / total,
+            'valor': float(valor)}
+
+'''
+  Retorna a posição de um usuário, identificado pelo funcional, pelo racf ou pelo nome, no ranking de uma métrica (score,
+cr, cp ou crp) da categoria. O resultado é um dicionário com a posição (1 é o primeiro colocado), o total de usuários
+com valor na métrica, o percentil (porcentagem desses usuários que ficaram atrás dele) e o valor da métrica.
+  Retorna None se o usuário não fez provas na categoria ou não tem valor na métrica.
+'''
+def posicao(funcional=None, racf=None, categoria=None, metrica='score', nome=None):
+
+    # Métrica desconhecida
+    if metrica not in metricas:
+        raise ValueError('Métrica inválida: ' + str(metrica))
+
+    try:
+        dados = indice(categoria)
+
+    # Erro nas queries de seleção
+    except pd.io.sql.DatabaseError:
+        return None
+
+    identificador = identificar(dados, funcional=funcional, racf=racf, nome=nome)
+
+    # Usuário sem provas
+    if identificador is None:
+        return None
+
+    return localizar(dados, identificador, metrica=metrica)
+
+# Retorna os k primeiros colocados no ranking de uma métrica da categoria, na ordem, com os scores do motor (veja
+# motor.calcular)
+def primeiros(k=20, categoria=None, metrica='score'):
+
+    # Métrica desconhecida
+    if metrica not in metricas:
+        raise ValueError('Métrica inválida: ' + str(metrica))
+
+    try:
+        dados = indice(categoria)
+
+    # Erro nas queries de seleção
+    except pd.io.sql.DatabaseError:
+        return None
+
+    return dados['scores'].loc[dados['ordenacoes'][metrica]['ids'][:k]]
+
+'''
+  Ordena uma tabela de ranking pela coluna, com a regra dos rankings (valor decrescente e, em caso de empate, menor ID
+primeiro). Com k, retorna apenas os k primeiros, sem ordenar a tabela inteira: apenas as linhas com valor maior ou igual
+ao do k-ésimo colocado são ordenadas.
+'''
+def ordenar(tabela, coluna, k=None):
+
+    chaves_ordem = chaves(tabela[coluna])
+
+    if k is not None and 0 < k < len(tabela):
+        limite = np.partition(chaves_ordem, k - 1)[k - 1]
+        tabela, chaves_ordem = tabela[chaves_ordem <= limite], chaves_ordem[chaves_ordem <= limite]
+
+    tabela = tabela.iloc[np.lexsort((tabela.index.to_numpy(), chaves_ordem))]
+
+    if k is not None:
+        tabela = tabela.head(k)
+
+    return tabela
@@ -1,7 +1,7 @@
+import time
 import pandas as pd
-import numpy as np
 import pandas.io.sql
-import pyodbc
+from coeficiente import conexao, consultas, agregados, posicoes
 
 """
     Neste arquivo, estão as funções para cálculo do Coeficiente de Progressão (CP)
@@ -20,165 +20,191 @@ import pyodbc
     baseando-se nas provas realizadas e disponíveis. O índice varia de 0 a 1 (0% a 100%) e quanto mais próximo de 1,
     mais da trilha foi concluída. 1 indica que toda a trilha foi concluída e 0 que nada foi.
 
-    As consultas são feitas usando as variáveis globais abaixo, que servem para se conectar ao banco e fazer as buscas.
+    As consultas são feitas com as consultas parametrizadas de consultas.py.
     As funções permitem que se utilize filtros opcionais para se refinar a busca.
 
+    O catálogo de treinamentos com prova (TPd) é carregado uma única vez e mantido em memória, junto com a contagem de
+    provas disponíveis por categoria. Assim, o CP de um usuário custa apenas a consulta das suas provas. O catálogo pode
+    ser recarregado explicitamente com atualizar_catalogo ou, opcionalmente, expirar após validade_catalogo segundos.
+    Quando expira, a marca d'água do catálogo é consultada (veja consultas.marca_treinamentos) e ele só é recarregado
+    se ela mudou. O catálogo é sempre recarregado quando a conexão é configurada para outro banco (veja
+    conexao.geracao).
+
 """
 
 """VARIÁVEIS GLOBAIS"""
-_conexao = pyodbc.connect(r'Driver={ODBC Driver 17 for SQL Server};Server=10.58.56.161;Database=mentoria;Trusted_Connection=yes;Encrypt=no')
-_query_pessoa = """SELECT
-	[nome],
-	[racf],
-	[funcional],
-	[treinamento],
-	[nota],
-	[categoria]
-    FROM
-	[dbo].[coeficiente_mentoria]"""
-_query_treinamentos = """SELECT
-	Treinamento.[titulo] AS 'Treinamento',
-	Categoria.[descricao] AS 'Categoria'
-    FROM
-	(([mentoria].[dbo].[treinamento] AS Treinamento
-	INNER JOIN [mentoria].[dbo].[prova] AS Prova ON Treinamento.[id] = Prova.[treinamento_id])
-	INNER JOIN [mentoria].[dbo].[categoria] AS Categoria ON Treinamento.[categoria_id] = Categoria.[id])"""
+_catalogo = {'treinamentos': None, 'provas_categoria': None, 'provas_total': 0, 'marca': None, 'geracao': None,
+             'instante': None}
+
+# Tempo, em segundos, em que o catálogo em memória é válido. None mantém o catálogo até atualizar_catalogo ser chamada
+validade_catalogo = None
 
 """FUNÇÕES"""
 
-# Calcula o CP de um usuário fazendo a busca via FUNCIONAL. Categoria é um filtro opcional
-def por_funcional(funcional, categoria=None):
+# Recarrega do banco o catálogo de treinamentos com prova e a contagem de provas disponíveis por categoria
+def atualizar_catalogo():
 
-    try:
+    # A marca é lida antes do catálogo: uma mudança entre as duas consultas faz o catálogo ser recarregado na próxima
+    # verificação, em vez de passar despercebida
+    geracao = conexao.geracao()
+    marca = consultas.marca_treinamentos()
+    treinamentos = consultas.treinamentos()
 
-        # Filtro por categoria
-        if categoria is not None:
+    # O catálogo é publicado depois das contagens, para que buscas concorrentes nunca o vejam sem elas
+    _catalogo['provas_categoria'] = treinamentos.groupby('Categoria')['Treinamento'].count()
+    _catalogo['provas_total'] = treinamentos['Treinamento'].count()
+    _catalogo['marca'] = marca
+    _catalogo['geracao'] = geracao
+    _catalogo['instante'] = time.monotonic()
+    _catalogo['treinamentos'] = treinamentos
 
-            total_provas = pd.read_sql_query(_query_treinamentos
-                                             + " WHERE Categoria.[descricao] = '"
-                                             + categoria + "'", _conexao)
-            total_pessoa = pd.read_sql_query(_query_pessoa
-                                             + "WHERE [funcional] = '"
-                                             + funcional + "'"
-                                             + "AND [categoria] = '"
-                                             + categoria + "'", _conexao)
+    return treinamentos
 
-            coeficiente = total_pessoa['treinamento'].nunique() / total_provas['Treinamento'].count()
+# Descarta o catálogo em memória. Ele é recarregado do banco na próxima consulta
+def invalidar_catalogo():
 
-        # Sem filtro
-        else:
+    _catalogo['treinamentos'] = None
+    _catalogo['instante'] = None
 
-            total_provas = pd.read_sql_query(_query_treinamentos, _conexao)
-            total_pessoa = pd.read_sql_query(_query_pessoa
-                                             + "WHERE [funcional] = '"
-                                             + funcional + "'", _conexao)
+# Retorna o catálogo de treinamentos com prova, carregando-o na primeira vez, quando a conexão é configurada para outro
+# banco ou quando a validade expira e a marca d'água do catálogo mudou
+def catalogo():
 
-            coeficiente = total_pessoa['treinamento'].nunique() / total_provas['Treinamento'].count()
+    if _catalogo['treinamentos'] is None or _catalogo['geracao'] != conexao.geracao():
+        return atualizar_catalogo()
 
-    # Erro na query de seleção
-    except pandas.io.sql.DatabaseError:
-        return None
+    agora = time.monotonic()
+    expirado = (validade_catalogo is not None and _catalogo['instante'] is not None
+                and agora - _catalogo['instante'] >= validade_catalogo)
 
-    return coeficiente
+    # Validade expirada: o catálogo só é recarregado se a marca d'água mudou
+    if expirado:
+        if consultas.marca_treinamentos() != _catalogo['marca']:
+            return atualizar_catalogo()
+        _catalogo['instante'] = agora
 
-# Calcula o CP de um usuário fazendo a busca via FUNCIONAL. Categoria é um filtro opcional
-def por_racf(racf, categoria=None):
-    try:
+    return _catalogo['treinamentos']
 
-        # Filtro por categoria
-        if categoria is not None:
+# Retorna o total de provas disponíveis (TPd) a partir do catálogo em memória. Categoria é um filtro opcional. O total
+# é um escalar do numpy, como a contagem do pandas: em uma categoria sem provas, o CP é nan (ou inf), sem exceção
+def total_provas(categoria=None):
 
-            total_provas = pd.read_sql_query(_query_treinamentos
-                                             + " WHERE Categoria.[descricao] = '"
-                                             + categoria + "'", _conexao)
-            total_pessoa = pd.read_sql_query(_query_pessoa
-                                             + "WHERE [racf] = '"
-                                             + racf + "'"
-                                             + "AND [categoria] = '"
-                                             + categoria + "'", _conexao)
+    catalogo()
 
-            coeficiente = total_pessoa['treinamento'].nunique() / total_provas['Treinamento'].count()
+    # Filtro por categoria
+    if categoria is not None:
+        return _catalogo['provas_categoria'].reindex([categoria], fill_value=0).iloc[0]
 
-        # Sem filtro
-        else:
+    # Sem filtro
+    return _catalogo['provas_total']
 
-            total_provas = pd.read_sql_query(_query_treinamentos, _conexao)
-            total_pessoa = pd.read_sql_query(_query_pessoa
-                                             + "WHERE [racf] = '"
-                                             + racf + "'", _conexao)
+# Calcula o CP de um usuário fazendo a busca via FUNCIONAL. Categoria é um filtro opcional
+def por_funcional(funcional, categoria=None):
 
-            coeficiente = total_pessoa['treinamento'].nunique() / total_provas['Treinamento'].count()
+    # Resumo materializado ativo (veja agregados.py)
+    if agregados.ativo():
+        return _do_resumo(funcional=funcional, categoria=categoria)
+
+    try:
+        total_pessoa = consultas.provas(funcional=funcional, categoria=categoria)
 
     # Erro na query de seleção
     except pandas.io.sql.DatabaseError:
         return None
 
+    coeficiente = total_pessoa['treinamento'].nunique() / total_provas(categoria=categoria)
+
     return coeficiente
 
 # Calcula o CP de um usuário fazendo a busca via FUNCIONAL. Categoria é um filtro opcional
-def por_nome(nome, categoria=None):
+def por_racf(racf, categoria=None):
+
+    # Resumo materializado ativo (veja agregados.py)
+    if agregados.ativo():
+        return _do_resumo(racf=racf, categoria=categoria)
+
     try:
+        total_pessoa = consultas.provas(racf=racf, categoria=categoria)
 
-        # Filtro por categoria
-        if categoria is not None:
+    # Erro na query de seleção
+    except pandas.io.sql.DatabaseError:
+        return None
 
-            total_provas = pd.read_sql_query(_query_treinamentos
-                                             + " WHERE Categoria.[descricao] = '"
-                                             + categoria + "'", _conexao)
-            total_pessoa = pd.read_sql_query(_query_pessoa
-                                             + "WHERE [nome] = '"
-                                             + nome + "'"
-                                             + "AND [categoria] = '"
-                                             + categoria + "'", _conexao)
+    coeficiente = total_pessoa['treinamento'].nunique() / total_provas(categoria=categoria)
 
-            coeficiente = total_pessoa['treinamento'].nunique() / total_provas['Treinamento'].count()
+    return coeficiente
 
-        # Sem filtro
-        else:
+# Calcula o CP de um usuário fazendo a busca via FUNCIONAL. Categoria é um filtro opcional
+def por_nome(nome, categoria=None):
 
-            total_provas = pd.read_sql_query(_query_treinamentos, _conexao)
-            total_pessoa = pd.read_sql_query(_query_pessoa
-                                             + "WHERE [nome] = '"
-                                             + nome + "'", _conexao)
+    # Resumo materializado ativo (veja agregados.py)
+    if agregados.ativo():
+        return _do_resumo(nome=nome, categoria=categoria)
 
-            coeficiente = total_pessoa['treinamento'].nunique() / total_provas['Treinamento'].count()
+    try:
+        total_pessoa = consultas.provas(nome=nome, categoria=categoria)
 
     # Erro na query de seleção
     except pandas.io.sql.DatabaseError:
         return None
 
+    coeficiente = total_pessoa['treinamento'].nunique() / total_provas(categoria=categoria)
+
     return coeficiente
 
-# Calcula a média de CP de todos os usuários que fizeram provas. Categoria é um filtro opcional
-def progressao_media(categoria=None):
+# Calcula o CP de um usuário a partir do resumo materializado, contando os treinamentos distintos com prova, sem o grupo
+# das provas sem treinamento, como o nunique das funções acima. Os filtros seguem consultas.provas
+def _do_resumo(categoria=None, **filtros):
 
-    try:
+    grupos = agregados.medias('treinamento', categoria=categoria, **filtros)
 
-        temp = []
+    return int(grupos['treinamento'].notna().sum()) / total_provas(categoria=categoria)
 
-        # Filtro por categoria
-        if categoria is not None:
+# Calcula o CP de vários usuários de uma vez via FUNCIONAL, buscando as provas de todos em uma única consulta (dividida
+# em lotes para listas muito grandes). Categoria é um filtro opcional. Retorna um DataFrame indexado pelo funcional.
+# Usuários sem provas não aparecem no resultado
+def por_funcionais(funcionais, categoria=None):
+    return _em_lote('funcional', funcionais, categoria=categoria)
 
-            lista_nomes = pd.read_sql_query(_query_pessoa + "WHERE [categoria] = '" + categoria + "'", _conexao)
-            lista_nomes = lista_nomes['nome'].unique()
+# Calcula o CP de vários usuários de uma vez via RACF. Veja por_funcionais
+def por_racfs(racfs, categoria=None):
+    return _em_lote('racf', racfs, categoria=categoria)
 
-            for nome in lista_nomes:
-                coeficiente_pessoa = por_nome(nome, categoria=categoria)
-                temp.append(coeficiente_pessoa)
+# Busca as provas de vários usuários identificados pela chave e calcula seus CPs
+def _em_lote(chave, valores, categoria=None):
 
-            coeficiente = np.array(temp).mean()
+    # Resumo materializado ativo (veja agregados.py)
+    if agregados.ativo():
+        resumo = agregados.treinamentos(chave, lote=chave, valores=list(valores), categoria=categoria)
+        cp = coeficientes_resumo(resumo, catalogo(), categoria=categoria)
 
-        # Sem filtro
-        else:
+    else:
+        try:
+            total_pessoa = consultas.provas_em_lote(chave, valores, categoria=categoria)
 
-            consulta_nomes = pd.read_sql_query(_query_pessoa, _conexao)
-            lista_nomes = consulta_nomes['nome'].unique()
+        # Erro na query de seleção
+        except pandas.io.sql.DatabaseError:
+            return None
 
-            for nome in lista_nomes:
-                coeficiente_pessoa = por_nome(nome)
-                temp.append(coeficiente_pessoa)
+        cp = coeficientes(total_pessoa, catalogo(), categoria=categoria, chave=chave)
 
-            coeficiente = np.array(temp).mean()
+    return cp.set_axis(consultas.expandir(cp.index)).to_frame('Coeficiente')
+
+# Calcula a média de CP de todos os usuários que fizeram provas. Categoria é um filtro opcional. Com tamanho_bloco, as
+# provas são lidas em blocos desse número de linhas
+def progressao_media(categoria=None, tamanho_bloco=None):
+
+    try:
+        # Leitura em blocos ou resumo materializado: apenas os agregados por usuário ficam na memória (veja agregados.py)
+        if tamanho_bloco or agregados.ativo():
+            resumo = agregados.resumo(categoria=categoria, tamanho=tamanho_bloco)
+            cp = coeficientes_resumo(resumo['treinamentos'], catalogo(), categoria=categoria)
+
+        # Os CPs de todos os usuários são calculados de uma vez sobre as provas já lidas
+        else:
+            cp = coeficientes(consultas.provas(categoria=categoria), catalogo(), categoria=categoria)
+
+        coeficiente = cp.to_numpy(dtype=float).mean()
 
     # Erro na query de seleção
     except pandas.io.sql.DatabaseError:
@@ -187,81 +213,78 @@ def progressao_media(categoria=None):
     return coeficiente
 
 '''
-  Calcula todos os CRs de todos os usuários que realizaram ao menos uma prova e retorna uma lista ranqueada.
+  Calcula todos os CPs de todos os usuários que realizaram ao menos uma prova e retorna uma lista ranqueada.
   Categoria é um filtro opcional e top20 retorna apenas os 20 primeiros colocados. Em caso de empate, o primeiro a fazer
 as provas fica na frente.
   Por padrão, retorna nome e funcional. Mas a função também permite se escolher o que a tabela retornará.
 '''
-def ranking_progressao(categoria=None, nome=True, funcional=False, top20=False):
+def ranking_progressao(categoria=None, nome=True, funcional=False, top20=False, tamanho_bloco=None):
 
     try:
+        # Leitura em blocos ou resumo materializado: apenas os agregados por usuário ficam na memória (veja agregados.py)
+        if tamanho_bloco or agregados.ativo():
+            resumo = agregados.resumo(categoria=categoria, tamanho=tamanho_bloco)
+            usuarios = resumo['usuarios']
+            cp = coeficientes_resumo(resumo['treinamentos'], catalogo(), categoria=categoria)
 
-        temp = []
-        ranking = pd.DataFrame()
-
-        # Filtro categoria
-        if categoria is not None:
-
-            lista_nomes = pd.read_sql_query(_query_pessoa, _conexao)
-            lista_nomes = lista_nomes.drop_duplicates(subset=['nome', 'funcional'])
-
-            for index, row in lista_nomes.iterrows():
-                if funcional and nome:
-                    temp.append([row['nome'], row['funcional'], por_nome(row['nome'])])
-                elif funcional and not nome:
-                    temp.append([row['funcional'], por_nome(row['nome'])])
-                elif not funcional and nome:
-                    temp.append([row['nome'], por_nome(row['nome'])])
-                else:
-                    temp.append(por_nome(row['nome']))
-
-            if funcional and nome:
-                ranking = ranking.append(pd.DataFrame(temp, columns=['Nome', 'Funcional', 'Coeficiente']))
-            elif funcional and not nome:
-                ranking = ranking.append(pd.DataFrame(temp, columns=['Funcional', 'Coeficiente']))
-            elif not funcional and nome:
-                ranking = ranking.append(pd.DataFrame(temp, columns=['Nome', 'Coeficiente']))
-            else:
-                ranking = ranking.append(pd.DataFrame(temp, columns=['Coeficiente']))
-
-        # Sem filtos
         else:
+            # Os CPs de todos os usuários são calculados de uma vez sobre as provas já lidas, sem novas consultas
+            provas = consultas.provas(categoria=categoria)
+            usuarios = provas.drop_duplicates(subset=['nome', 'funcional'])
+            cp = coeficientes(provas, catalogo(), categoria=categoria)
 
-            lista_nomes = pd.read_sql_query(_query_pessoa, _conexao)
-            lista_nomes = lista_nomes.drop_duplicates(subset=['nome', 'funcional'])
+    # Erro nas queries de seleção
+    except pd.io.sql.DatabaseError:
+        return None
 
-            for index, row in lista_nomes.iterrows():
-                if funcional and nome:
-                    temp.append([row['nome'], row['funcional'], por_nome(row['nome'])])
-                elif funcional and not nome:
-                    temp.append([row['funcional'], por_nome(row['nome'])])
-                elif not funcional and nome:
-                    temp.append([row['nome'], por_nome(row['nome'])])
-                else:
-                    temp.append(por_nome(row['nome']))
+    usuarios = usuarios.reset_index(drop=True)
 
-            if funcional and nome:
-                ranking = ranking.append(pd.DataFrame(temp, columns=['Nome', 'Funcional', 'Coeficiente']))
-            elif funcional and not nome:
-                ranking = ranking.append(pd.DataFrame(temp, columns=['Funcional', 'Coeficiente']))
-            elif not funcional and nome:
-                ranking = ranking.append(pd.DataFrame(temp, columns=['Nome', 'Coeficiente']))
-            else:
-                ranking = ranking.append(pd.DataFrame(temp, columns=['Coeficiente']))
+    ranking = pd.DataFrame({'Nome': consultas.expandir(usuarios['nome']),
+                            'Funcional': consultas.expandir(usuarios['funcional']),
+                            'Coeficiente': agregados.alinhar(cp, usuarios[agregados.chave_usuario])})
 
-        ranking = ranking.rename_axis('ID').sort_values(by=['Coeficiente', 'ID'], ascending=[False, True])
+    # Ordenação pelo coeficiente. Com top20, apenas os 20 primeiros (veja posicoes.ordenar)
+    ranking = posicoes.ordenar(ranking.rename_axis('ID'), 'Coeficiente', k=20 if top20 else None)
 
-        # Apenas os 20 primeiros
-        if top20:
-            ranking = ranking.head(20)
+    # Colunas retornadas
+    colunas = ['Coeficiente']
 
+    if funcional:
+        colunas = ['Funcional'] + colunas
+    if nome:
+        colunas = ['Nome'] + colunas
 
-    # Erro nas queries de seleção
-    except pd.io.sql.DatabaseError:
-        return None
+    ranking = ranking[colunas]
 
     # Ranking vazio
     if ranking.empty:
         return None
 
     return ranking
+
+# Calcula o CP de cada usuário a partir de provas e catálogo de treinamentos já carregados, sem novas consultas ao banco.
+# Categoria é um filtro opcional. Chave é a coluna ou a lista de colunas que identifica o usuário (por padrão, o par
+# nome/funcional). Retorna uma série indexada pela chave
+def coeficientes(provas, treinamentos, categoria=None, chave=None):
+
+    # Filtro por categoria
+    if categoria is not None:
+        provas = provas[provas['categoria'] == categoria]
+        treinamentos = treinamentos[treinamentos['Categoria'] == categoria]
+
+    realizados = agregados.agrupar(provas, agregados.colunas_usuario(chave))['treinamento'].nunique()
+
+    return realizados / treinamentos['Treinamento'].count()
+
+# Calcula o CP de cada usuário a partir dos agregados por usuário e treinamento, como os de agregados.resumir, já
+# filtrados pela categoria. Retorna uma série indexada pelos níveis do usuário (todos menos o treinamento)
+def coeficientes_resumo(resumo, treinamentos, categoria=None):
+
+    # Filtro por categoria
+    if categoria is not None:
+        treinamentos = treinamentos[treinamentos['Categoria'] == categoria]
+
+    # Treinamentos distintos com prova, sem contar o grupo das provas sem treinamento
+    realizados = pd.Series(agregados.com_treinamento(resumo), index=resumo.index)
+
+    return agregados.rotular(resumo, agregados.por_usuario(realizados).sum()) / treinamentos['Treinamento'].count()
@@ -0,0 +1,302 @@
+import os
+import re
+import itertools
+import contextlib
+import concurrent.futures
+import pandas as pd
+
+"""
+    Neste arquivo, estão as funções para geração do relatório de rankings exportado por coleta-coeficiente.py.
+
+    O relatório calcula o ranking de Score Final de cada categoria e o ranking geral a partir de uma única leitura das
+    provas (veja motor.py). As provas são separadas por categoria uma única vez e cada categoria é calculada sobre as
+    suas próprias linhas, o que permite distribuir as categorias entre vários processos.
+
+    Os rankings podem ser gravados como abas de uma única planilha ou como planilhas separadas. As categorias conhecidas
+    mantêm os nomes de aba e de arquivo usados historicamente. As demais usam a própria descrição da categoria.
+
+    A exportação em fluxo (veja exportar_em_fluxo) calcula e grava uma categoria por vez e grava as linhas de cada
+    ranking em blocos, na ordem do ranking, à medida que são montadas (veja final.tabela_em_blocos). As provas também
+    não são carregadas de uma vez: os scores de cada categoria vêm do resumo materializado, se estiver ativo, ou da
+    leitura das provas da categoria em blocos (veja motor.scores). A tabela completa não chega a ser montada, e as
+    linhas já gravadas não ficam na memória: em Excel, a planilha é gravada pelo modo
+    write_only do openpyxl; em CSV, os blocos são acrescentados ao arquivo; e em Parquet, cada bloco é um row group
+    gravado pelo pyarrow. Em CSV e Parquet, cada ranking é sempre gravado em um arquivo próprio.
+
+"""
+
+from coeficiente import consultas, agregados, motor, final, perfil
+
+"""VARIÁVEIS GLOBAIS"""
+# Formatos da exportação em fluxo e extensão dos arquivos gerados
+formatos = {'xlsx': '.xlsx', 'csv': '.csv', 'parquet': '.parquet'}
+
+# Quantidade de linhas montadas e gravadas de cada vez na exportação em fluxo
+linhas_por_bloco = 10000
+
+# Quantidade de linhas de provas lidas de cada vez na exportação em fluxo, quando tamanho_bloco não é informado
+linhas_leitura = 100000
+
+_nomes = {'03 - VBA - Visual Basic': ('Ranking VBA', 'ranking_vba.xlsx'),
+          '10 - Java': ('Ranking Java', 'ranking_java.xlsx'),
+          '04 - Python': ('Ranking Python', 'ranking_python.xlsx'),
+          '13 - JavaScript': ('Ranking JavaScript', 'ranking_js.xlsx'),
+          None: ('Ranking Geral', 'ranking_geral.xlsx')}
+
+"""FUNÇÕES"""
+
+# Retorna o nome da aba e o nome do arquivo de uma categoria. None é o ranking geral
+def nomes_categoria(categoria):
+
+    if categoria in _nomes:
+        return _nomes[categoria]
+
+    # Abas do Excel têm no máximo 31 caracteres e não aceitam alguns símbolos
+    aba = re.sub(r'[\[\]:*?/\\]', '', categoria).strip()[:31]
+    arquivo = 'ranking_' + re.sub(r'\W+', '_', aba.lower()).strip('_') + '.xlsx'
+
+    return aba, arquivo
+
+# Separa as provas das categorias pedidas (por padrão, todas com provas). Com geral, inclui todas as provas para o ranking
+# geral, com a categoria None. Retorna as categorias e as provas de cada uma
+def _separar(provas, categorias=None, geral=True):
+
+    por_categoria = dict(tuple(provas.groupby('categoria', sort=True, observed=True)))
+
+    if categorias is None:
+        categorias = list(por_categoria)
+
+    categorias = list(categorias) + ([None] if geral else [])
+    partes = [provas if categoria is None else por_categoria.get(categoria, provas.iloc[0:0])
+              for categoria in categorias]
+
+    return categorias, partes
+
+# Retorna as categorias com provas, em ordem, a partir do resumo materializado, se estiver ativo, ou das provas no banco
+def _categorias():
+
+    if agregados.ativo():
+        return sorted(agregados.materializado()['categoria'].dropna().unique().tolist())
+
+    return consultas.categorias()
+
+# Calcula a tabela ranqueada de uma categoria a partir das suas provas. Executada em outro processo quando há paralelismo
+def _calcular(provas, catalogo, categoria, opcoes):
+    return final.montar_tabela(motor.calcular(provas, catalogo, categoria=categoria), **opcoes)
+
+'''
+  Calcula os rankings de várias categorias e o ranking geral lendo as provas uma única vez. Categorias é uma lista
+opcional; por padrão, todas as categorias com provas são calculadas. Geral inclui o ranking geral. Processos distribui
+as categorias entre vários processos. As demais opções seguem final.gerar_tabela.
+  Retorna um dicionário com a tabela de cada categoria, em que a chave None é o ranking geral.
+'''
+def gerar_rankings(categorias=None, geral=True, processos=1, nome=True, funcional=False, top20=False,
+                   apenas_final=False):
+
+    try:
+        provas, catalogo = motor.carregar()
+
+    # Erro nas queries de seleção
+    except pd.io.sql.DatabaseError:
+        return None
+
+    opcoes = {'nome': nome, 'funcional': funcional, 'top20': top20, 'apenas_final': apenas_final}
+    categorias, partes = _separar(provas, categorias=categorias, geral=geral)
+
+    # Em paralelo, cada processo recebe apenas as provas da sua categoria
+    if processos > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processos) as executor:
+            tabelas = list(executor.map(_calcular, partes, itertools.repeat(catalogo), categorias,
+                                        itertools.repeat(opcoes)))
+
+    else:
+        tabelas = [_calcular(parte, catalogo, categoria, opcoes) for parte, categoria in zip(partes, categorias)]
+
+    return dict(zip(categorias, tabelas))
+
+'''
+  Gera os rankings (veja gerar_rankings) e os grava em Excel. Por padrão, cada ranking é uma aba da planilha arquivo.
+Com separado, cada ranking é gravado em uma planilha própria dentro de pasta. Rankings vazios não são gravados.
+  Retorna os rankings gerados.
+'''
+def exportar(arquivo='rankings.xlsx', separado=False, pasta='.', **opcoes):
+
+    rankings = gerar_rankings(**opcoes)
+
+    # Erro nas queries de seleção
+    if rankings is None:
+        return None
+
+    with perfil.etapa('excel'):
+        if separado:
+            for categoria, tabela in rankings.items():
+                aba, nome_arquivo = nomes_categoria(categoria)
+
+                if tabela is not None:
+                    tabela.to_excel(os.path.join(pasta, nome_arquivo), sheet_name=aba)
+
+        else:
+            with pd.ExcelWriter(arquivo) as planilha:
+                for categoria, tabela in rankings.items():
+                    aba, nome_arquivo = nomes_categoria(categoria)
+
+                    if tabela is not None:
+                        tabela.to_excel(planilha, sheet_name=aba)
+
+    return rankings
+
+# Cria uma planilha do openpyxl em modo write_only, em que as linhas são gravadas à medida que são acrescentadas. É
+# necessário ter o openpyxl instalado, como em to_excel
+def _nova_planilha():
+
+    import openpyxl
+
+    return openpyxl.Workbook(write_only=True)
+
+# Grava os blocos de um ranking em uma aba de uma planilha do openpyxl em modo write_only, com o mesmo cabeçalho de
+# to_excel. Valores nulos ficam em branco
+def _gravar_excel(planilha, aba, blocos):
+
+    folha = planilha.create_sheet(title=aba)
+    linhas = 0
+
+    for bloco in blocos:
+        if not linhas:
+            folha.append([bloco.index.name] + list(bloco.columns))
+
+        valores = bloco.reset_index().astype(object)
+
+        for linha in valores.where(valores.notna(), None).itertuples(index=False, name=None):
+            folha.append(list(linha))
+
+        linhas += len(bloco)
+
+    return linhas
+
+# Grava os blocos de um ranking em um arquivo CSV, acrescentando um bloco por vez
+def _gravar_csv(arquivo, blocos):
+
+    linhas = 0
+
+    with open(arquivo, 'w', encoding='utf-8', newline='') as saida:
+        for bloco in blocos:
+            bloco.to_csv(saida, header=not linhas)
+            linhas += len(bloco)
+
+    return linhas
+
+# Grava os blocos de um ranking em um arquivo Parquet, um row group por bloco. É necessário ter o pyarrow instalado
+def _gravar_parquet(arquivo, blocos):
+
+    import pyarrow
+    import pyarrow.parquet
+
+    gravador = None
+    linhas = 0
+
+    try:
+        for bloco in blocos:
+            dados = pyarrow.Table.from_pandas(bloco.reset_index(), preserve_index=False)
+
+            if gravador is None:
+                gravador = pyarrow.parquet.ParquetWriter(arquivo, dados.schema)
+
+            gravador.write_table(dados.cast(gravador.schema))
+            linhas += len(bloco)
+
+    finally:
+        if gravador is not None:
+            gravador.close()
+
+    return linhas
+
+'''
+  Calcula os rankings de várias categorias e do ranking geral e os grava em fluxo, uma categoria por vez, no formato
+xlsx, csv ou parquet. Com xlsx, cada ranking é uma aba da planilha arquivo ou, com separado, uma planilha própria
+dentro de pasta. Com csv e parquet, cada ranking é gravado em um arquivo próprio dentro de pasta, com o nome da planilha
+separada (veja nomes_categoria) e a extensão do formato. Rankings vazios não são gravados. As demais opções seguem
+gerar_rankings.
+  As provas não são carregadas de uma vez: os scores de cada categoria são calculados, uma categoria por vez, a partir
+do resumo materializado, se estiver ativo, ou lendo as suas provas em blocos de tamanho_bloco linhas (por padrão,
+linhas_leitura; veja motor.scores). Por padrão, as categorias são as que têm provas. Apenas com processos maior que 1 e
+sem tamanho_bloco as provas são carregadas de uma vez, para que cada processo receba as provas da sua categoria.
+  Retorna um dicionário com o número de linhas gravadas de cada categoria, em que a chave None é o ranking geral.
+'''
+def exportar_em_fluxo(arquivo='rankings.xlsx', formato='xlsx', separado=False, pasta='.', categorias=None, geral=True,
+                      processos=1, nome=True, funcional=False, top20=False, apenas_final=False, tamanho_bloco=None):
+
+    # Formato desconhecido
+    if formato not in formatos:
+        raise ValueError('Formato inválido: ' + str(formato))
+
+    opcoes = {'nome': nome, 'funcional': funcional, 'top20': top20, 'apenas_final': apenas_final}
+    planilha = None
+    gravadas = {}
+
+    # Em paralelo, as provas são carregadas de uma vez e separadas por categoria para os processos
+    paralelo = processos > 1 and not tamanho_bloco
+
+    try:
+        if paralelo:
+            provas, catalogo = motor.carregar()
+            categorias, partes = _separar(provas, categorias=categorias, geral=geral)
+            del provas
+
+        # Uma categoria por vez: por padrão, as categorias com provas
+        else:
+            if categorias is None:
+                categorias = _categorias()
+
+            categorias = list(categorias) + ([None] if geral else [])
+
+    # Erro nas queries de seleção
+    except pd.io.sql.DatabaseError:
+        return None
+
+    # Planilha única, com uma aba por ranking
+    if formato == 'xlsx' and not separado:
+        planilha = _nova_planilha()
+
+    with contextlib.ExitStack() as pilha:
+
+        # Em paralelo, os scores de cada categoria são calculados em outro processo e recebidos na ordem das categorias
+        if paralelo:
+            executor = pilha.enter_context(concurrent.futures.ProcessPoolExecutor(max_workers=processos))
+            todos_scores = executor.map(motor.calcular, partes, itertools.repeat(catalogo), categorias)
+
+        # Os scores de cada categoria são calculados apenas quando ela é gravada
+        else:
+            todos_scores = (motor.scores(categoria=categoria, tamanho=tamanho_bloco or linhas_leitura)
+                            for categoria in categorias)
+
+        for categoria, scores in zip(categorias, todos_scores):
+
+            # Ranking vazio
+            if scores.empty:
+                continue
+
+            aba, nome_arquivo = nomes_categoria(categoria)
+            destino = os.path.join(pasta, os.path.splitext(nome_arquivo)[0] + formatos[formato])
+            blocos = final.tabela_em_blocos(scores, tamanho=linhas_por_bloco, **opcoes)
+
+            with perfil.etapa('excel' if formato == 'xlsx' else formato):
+                if planilha is not None:
+                    gravadas[categoria] = _gravar_excel(planilha, aba, blocos)
+
+                elif formato == 'xlsx':
+                    separada = _nova_planilha()
+                    gravadas[categoria] = _gravar_excel(separada, aba, blocos)
+                    separada.save(destino)
+
+                elif formato == 'csv':
+                    gravadas[categoria] = _gravar_csv(destino, blocos)
+
+                else:
+                    gravadas[categoria] = _gravar_parquet(destino, blocos)
+
+    # A planilha única só é gravada se algum ranking não estiver vazio
+    if planilha is not None and gravadas:
+        with perfil.etapa('excel'):
+            planilha.save(arquivo)
+
+    return gravadas
@@ -1,6 +1,5 @@
 import pandas as pd
-import pandas.io.sql
-import pyodbc
+from coeficiente import consultas, agregados, posicoes
 import numpy as np
 
 """
@@ -21,303 +20,218 @@ import numpy as np
     O CR permite que se saiba o quão bem o usuário foi no geral ou em certa categoria ou treinamento, ponderando seu 
     desempenho inicial e geral. O índice do CR vai de 0 a 1 (0% a 100%) e quanto mais alto, melhor é a avaliação.
        
-    As consultas são feitas usando as variáveis globais abaixo, que servem para se conectar ao banco e fazer a busca.
+    As consultas são feitas com as consultas parametrizadas de consultas.py.
     As funções permitem que se utilize filtros opcionais para se refinar a busca.
     
 """
 
-"""VARIÁVEIS GLOBAIS"""
-_conexao = pyodbc.connect(r'Driver={ODBC Driver 17 for SQL Server};Server=10.58.56.161;Database=mentoria;Trusted_Connection=yes;Encrypt=no')
-_query = """SELECT
-	[nome],
-	[racf],
-	[funcional],
-	[treinamento],
-	[nota],
-	[categoria]
-    FROM
-	[dbo].[coeficiente_mentoria]"""
-
 """FUNÇÕES"""
 
 # Calcula o CR de um usuário fazendo a busca via FUNCIONAL. Categoria e Treinamento são filtros de CR opcionais
 def por_funcional(funcional, categoria=None, treinamento=None):
 
-    try:
-        if categoria is not None:
-            if treinamento is not None:
-
-                # Filtro por categoria e treinamento
-                resultado = pd.read_sql_query(_query + "\nWHERE [funcional] = "
-                                              + funcional
-                                              + " AND [categoria] = '"
-                                              + categoria + "'"
-                                              + " AND [treinamento] = '"
-                                              + treinamento + "'", _conexao)
-                coeficiente = (resultado['nota'].mean() + resultado.groupby('treinamento').first()['nota'].mean()) / 20
-
-            else:
-
-                # Filtro por categoria
-                resultado = pd.read_sql_query(_query + "\nWHERE [funcional] = "
-                                              + funcional
-                                              + " AND [categoria] = '"
-                                              + categoria + "'", _conexao)
-                coeficiente = (resultado['nota'].mean() + resultado.groupby('treinamento').first()['nota'].mean()) / 20
-
-        elif treinamento is not None:
-
-            # Filtro por treinamento
-            resultado = pd.read_sql_query(_query + "\nWHERE [funcional] = "
-                                          + funcional
-                                          + " AND [treinamento] = '"
-                                          + treinamento + "'", _conexao)
-            coeficiente = (resultado['nota'].mean() + resultado.groupby('treinamento').first()['nota'].mean()) / 20
-
-        else:
+    # Resumo materializado ativo (veja agregados.py)
+    if agregados.ativo():
+        return _do_resumo(funcional=funcional, categoria=categoria, treinamento=treinamento)
 
-            # Sem filtos
-            resultado = pd.read_sql_query(_query + "\nWHERE [funcional] = " + funcional, _conexao)
-            coeficiente = (resultado['nota'].mean() + resultado.groupby('treinamento').first()['nota'].mean()) / 20
+    try:
+        resultado = consultas.provas(funcional=funcional, categoria=categoria, treinamento=treinamento)
 
     # Erro na query de seleção
     except pd.io.sql.DatabaseError:
         return None
 
+    primeiras = resultado.groupby('treinamento', observed=True).first()['nota']
+    coeficiente = (resultado['nota'].mean() + primeiras.mean()) / 20
+
     return coeficiente
 
 # Calcula o CR de um usuário fazendo a busca via RACF. Categoria e Treinamento são filtros de CR opcionais
 def por_racf(racf, categoria=None, treinamento=None):
 
-    try:
-        if categoria is not None:
-            if treinamento is not None:
-
-                # Filtro por categoria e treinamento
-                resultado = pd.read_sql_query(_query + "\nWHERE [racf] = '"
-                                              + racf + "'"
-                                              + " AND [categoria] = '"
-                                              + categoria + "'"
-                                              + " AND [treinamento] = '"
-                                              + treinamento + "'", _conexao)
-                coeficiente = (resultado['nota'].mean() + resultado.groupby('treinamento').first()['nota'].mean()) / 20
-
-            else:
-
-                # Filtro por categoria
-                resultado = pd.read_sql_query(_query + "\nWHERE [racf] = '"
-                                              + racf + "'"
-                                              + " AND [categoria] = '"
-                                              + categoria + "'", _conexao)
-                coeficiente = (resultado['nota'].mean() + resultado.groupby('treinamento').first()['nota'].mean()) / 20
-
-        elif treinamento is not None:
-
-            # Filtro por treinamento
-            resultado = pd.read_sql_query(_query + "\nWHERE [racf] = '"
-                                          + racf + "'"
-                                          + " AND [treinamento] = '"
-                                          + treinamento + "'", _conexao)
-            coeficiente = (resultado['nota'].mean() + resultado.groupby('treinamento').first()['nota'].mean()) / 20
-
-        else:
+    # Resumo materializado ativo (veja agregados.py)
+    if agregados.ativo():
+        return _do_resumo(racf=racf, categoria=categoria, treinamento=treinamento)
 
-            # Sem filtros
-            resultado = pd.read_sql_query(_query + "\nWHERE [racf] = '" + racf + "'", _conexao)
-            coeficiente = (resultado['nota'].mean() + resultado.groupby('treinamento').first()['nota'].mean()) / 20
+    try:
+        resultado = consultas.provas(racf=racf, categoria=categoria, treinamento=treinamento)
 
     # Erro na query de seleção
     except pd.io.sql.DatabaseError:
         return None
 
+    primeiras = resultado.groupby('treinamento', observed=True).first()['nota']
+    coeficiente = (resultado['nota'].mean() + primeiras.mean()) / 20
+
     return coeficiente
 
 # Calcula o CR de um usuário fazendo a busca via NOME. Categoria e Treinamento são filtros de CR opcionais
 def por_nome(nome, categoria=None, treinamento=None):
 
-    try:
-        if categoria is not None:
-            if treinamento is not None:
-
-                # Filtro por categoria e treinamento
-                resultado = pd.read_sql_query(_query + "\nWHERE [nome] = '"
-                                              + nome + "'"
-                                              + " AND [categoria] = '"
-                                              + categoria + "'"
-                                              + " AND [treinamento] = '"
-                                              + treinamento + "'", _conexao)
-                coeficiente = (resultado['nota'].mean() + resultado.groupby('treinamento').first()['nota'].mean()) / 20
-
-            else:
-
-                # Filtro por categoria
-                resultado = pd.read_sql_query(_query + "\nWHERE [nome] = '"
-                                              + nome + "'"
-                                              + " AND [categoria] = '"
-                                              + categoria + "'", _conexao)
-                coeficiente = (resultado['nota'].mean() + resultado.groupby('treinamento').first()['nota'].mean()) / 20
-
-        elif treinamento is not None:
-
-            # Filtro por treinamento
-            resultado = pd.read_sql_query(_query + "\nWHERE [nome] = '"
-                                          + nome + "'"
-                                          + " AND [treinamento] = '"
-                                          + treinamento + "'", _conexao)
-            coeficiente = (resultado['nota'].mean() + resultado.groupby('treinamento').first()['nota'].mean()) / 20
-
-        else:
+    # Resumo materializado ativo (veja agregados.py)
+    if agregados.ativo():
+        return _do_resumo(nome=nome, categoria=categoria, treinamento=treinamento)
 
-            # Sem filtros
-            resultado = pd.read_sql_query(_query + "\nWHERE [nome] = '" + nome + "'", _conexao)
-            coeficiente = (resultado['nota'].mean() + resultado.groupby('treinamento').first()['nota'].mean()) / 20
+    try:
+        resultado = consultas.provas(nome=nome, categoria=categoria, treinamento=treinamento)
 
     # Erro na query de seleção
     except pd.io.sql.DatabaseError:
         return None
 
+    primeiras = resultado.groupby('treinamento', observed=True).first()['nota']
+    coeficiente = (resultado['nota'].mean() + primeiras.mean()) / 20
+
     return coeficiente
 
 
+# Calcula o CR de um usuário a partir do resumo materializado, com as mesmas médias das funções acima. Os filtros seguem
+# consultas.provas
+def _do_resumo(**filtros):
+
+    grupos = agregados.medias('treinamento', **filtros)
+    contagem = grupos['contagem'].sum()
+
+    media_geral = grupos['soma'].sum() / contagem if contagem else np.nan
+    media_primaria = grupos.loc[grupos['treinamento'].notna(), 'primeira'].astype(float).mean()
+
+    return (media_geral + media_primaria) / 20
+
+# Calcula o CR de vários usuários de uma vez via FUNCIONAL, buscando as provas de todos em uma única consulta (dividida
+# em lotes para listas muito grandes). Categoria e Treinamento são filtros opcionais. Retorna um DataFrame indexado pelo
+# funcional. Usuários sem provas não aparecem no resultado
+def por_funcionais(funcionais, categoria=None, treinamento=None):
+    return _em_lote('funcional', funcionais, categoria=categoria, treinamento=treinamento)
+
+# Calcula o CR de vários usuários de uma vez via RACF. Veja por_funcionais
+def por_racfs(racfs, categoria=None, treinamento=None):
+    return _em_lote('racf', racfs, categoria=categoria, treinamento=treinamento)
+
+# Busca as provas de vários usuários identificados pela chave e calcula seus CRs
+def _em_lote(chave, valores, categoria=None, treinamento=None):
+
+    # Resumo materializado ativo (veja agregados.py)
+    if agregados.ativo():
+        resumo = agregados.treinamentos(chave, lote=chave, valores=list(valores), categoria=categoria,
+                                        treinamento=treinamento)
+        cr = coeficientes_resumo(resumo)
+
+    else:
+        try:
+            resultado = consultas.provas_em_lote(chave, valores, categoria=categoria, treinamento=treinamento)
+
+        # Erro na query de seleção
+        except pd.io.sql.DatabaseError:
+            return None
+
+        cr = coeficientes(resultado, chave=chave)
+
+    return cr.set_axis(consultas.expandir(cr.index)).to_frame('Coeficiente')
+
 '''
   Calcula todos os CRs de todos os usuários que realizaram ao menos uma prova e retorna uma lista ranqueada.
   Categoria é um filtro opcional e top20 retorna apenas os 20 primeiros colocados. Em caso de empate, o primeiro a fazer
 as provas fica na frente.
   Por padrão, retorna nome e funcional. Mas a função também permite se escolher o que a tabela retornará.
 '''
-def ranking_coeficentes(categoria=None, nome=True, funcional=False, top20=False):
+def ranking_coeficentes(categoria=None, nome=True, funcional=False, top20=False, tamanho_bloco=None):
 
     try:
+        # Leitura em blocos ou resumo materializado: apenas os agregados por usuário ficam na memória (veja agregados.py)
+        if tamanho_bloco or agregados.ativo():
+            resumo = agregados.resumo(categoria=categoria, tamanho=tamanho_bloco)
+            usuarios, cr = resumo['usuarios'], coeficientes_resumo(resumo['treinamentos'])
 
-        temp = []
-        ranking = pd.DataFrame()
-
-        # Filtro categoria
-        if categoria is not None:
-
-            lista_nomes = pd.read_sql_query(_query + "\nWHERE [categoria] = '" + categoria + "'", _conexao)
-            lista_nomes = lista_nomes.drop_duplicates(subset=['nome', 'funcional'])
-
-            for index, row in lista_nomes.iterrows():
-                if funcional and nome:
-                    temp.append([row['nome'], row['funcional'], por_nome(row['nome'], categoria=categoria)])
-                elif funcional and not nome:
-                    temp.append([row['funcional'], por_nome(row['nome'], categoria=categoria)])
-                elif not funcional and nome:
-                    temp.append([row['nome'], por_nome(row['nome'], categoria=categoria)])
-                else:
-                    temp.append(por_nome(row['nome']))
-
-            if funcional and nome:
-                ranking = ranking.append(pd.DataFrame(temp, columns=['Nome', 'Funcional', 'Coeficiente']))
-            elif funcional and not nome:
-                ranking = ranking.append(pd.DataFrame(temp, columns=['Funcional', 'Coeficiente']))
-            elif not funcional and nome:
-                ranking = ranking.append(pd.DataFrame(temp, columns=['Nome', 'Coeficiente']))
-            else:
-                ranking = ranking.append(pd.DataFrame(temp, columns=['Coeficiente']))
-
-        # Sem filtos
         else:
-
-            lista_nomes = pd.read_sql_query(_query, _conexao)
-            lista_nomes = lista_nomes.drop_duplicates(subset=['nome', 'funcional'])
-
-            for index, row in lista_nomes.iterrows():
-                if funcional and nome:
-                    temp.append([row['nome'], row['funcional'], por_nome(row['nome'])])
-                elif funcional and not nome:
-                    temp.append([row['funcional'], por_nome(row['nome'])])
-                elif not funcional and nome:
-                    temp.append([row['nome'], por_nome(row['nome'])])
-                else:
-                    temp.append(por_nome(row['nome']))
-
-            if funcional and nome:
-                ranking = ranking.append(pd.DataFrame(temp, columns=['Nome', 'Funcional', 'Coeficiente']))
-            elif funcional and not nome:
-                ranking = ranking.append(pd.DataFrame(temp, columns=['Funcional', 'Coeficiente']))
-            elif not funcional and nome:
-                ranking = ranking.append(pd.DataFrame(temp, columns=['Nome', 'Coeficiente']))
-            else:
-                ranking = ranking.append(pd.DataFrame(temp, columns=['Coeficiente']))
-
-        ranking = ranking.rename_axis('ID').sort_values(by=['Coeficiente', 'ID'], ascending=[False, True])
-
-        # Apenas os 20 primeiros
-        if top20:
-            ranking = ranking.head(20)
+            # Os CRs de todos os usuários são calculados de uma vez sobre as provas já lidas, sem novas consultas
+            provas = consultas.provas(categoria=categoria)
+            usuarios, cr = provas.drop_duplicates(subset=['nome', 'funcional']), coeficientes(provas)
 
     # Erro nas queries de seleção
     except pd.io.sql.DatabaseError:
         return None
 
+    usuarios = usuarios.reset_index(drop=True)
+
+    ranking = pd.DataFrame({'Nome': consultas.expandir(usuarios['nome']),
+                            'Funcional': consultas.expandir(usuarios['funcional']),
+                            'Coeficiente': agregados.alinhar(cr, usuarios[agregados.chave_usuario])})
+
+    # Ordenação pelo coeficiente. Com top20, apenas os 20 primeiros (veja posicoes.ordenar)
+    ranking = posicoes.ordenar(ranking.rename_axis('ID'), 'Coeficiente', k=20 if top20 else None)
+
+    # Colunas retornadas
+    colunas = ['Coeficiente']
+
+    if funcional:
+        colunas = ['Funcional'] + colunas
+    if nome:
+        colunas = ['Nome'] + colunas
+
+    ranking = ranking[colunas]
+
     # Ranking vazio
     if ranking.empty:
         return None
 
     return ranking
 
-# Calcula o CR total geral de todos os usuários que fizeram prova. Pode-se aplicar filtros de categoria e/ou treinamento
-def rendimento_medio(categoria=None, treinamento=None):
+# Calcula o CR de cada usuário que fez prova com uma única consulta. Pode-se aplicar filtros de categoria e/ou
+# treinamento. Retorna uma série indexada pelo par nome/funcional, que pode ser reaproveitada por outros cálculos. Com
+# tamanho_bloco, as provas são lidas em blocos desse número de linhas. Com o resumo materializado ativo, ele é usado no
+# lugar das provas (veja agregados.py)
+def coeficientes_usuarios(categoria=None, treinamento=None, tamanho_bloco=None):
 
     try:
+        if tamanho_bloco or agregados.ativo():
+            resumo = agregados.resumo(categoria=categoria, treinamento=treinamento, tamanho=tamanho_bloco)
+            return coeficientes_resumo(resumo['treinamentos'])
 
-        temp = []
-
-        if categoria is not None:
-            if treinamento is not None:
+        resultado = consultas.provas(categoria=categoria, treinamento=treinamento)
 
-                # Filtro por categoria e treinamento
-                resultado = pd.read_sql_query(_query + "\nWHERE [categoria] = '" + categoria + "'"
-                                              + " AND [treinamento] = '" + treinamento + "'", _conexao)
-                lista_nomes = resultado['nome'].unique()
-
-                for nome in lista_nomes:
-                    cr_pessoa = por_nome(nome, categoria=categoria, treinamento=treinamento)
-                    temp.append(cr_pessoa)
-
-                coefiente = np.array(temp).mean()
-
-            else:
+    # Erro na query de seleção
+    except pd.io.sql.DatabaseError:
+        return None
 
-                # Filtro por categoria
-                resultado = pd.read_sql_query(_query + "\nWHERE [categoria] = '" + categoria + "'", _conexao)
-                lista_nomes = resultado['nome'].unique()
+    return coeficientes(resultado)
 
-                for nome in lista_nomes:
-                    cr_pessoa = por_nome(nome, categoria=categoria)
-                    temp.append(cr_pessoa)
+# Calcula o CR total geral de todos os usuários que fizeram prova. Pode-se aplicar filtros de categoria e/ou treinamento.
+# Tamanho_bloco segue coeficientes_usuarios
+def rendimento_medio(categoria=None, treinamento=None, tamanho_bloco=None):
 
-                coefiente = np.array(temp).mean()
+    cr_usuarios = coeficientes_usuarios(categoria=categoria, treinamento=treinamento, tamanho_bloco=tamanho_bloco)
 
-        elif treinamento is not None:
+    # Erro na query de seleção
+    if cr_usuarios is None:
+        return None
 
-            # Filtro por treinamento
-            resultado = pd.read_sql_query(_query + "\nWHERE [treinamento] = '" + treinamento + "'", _conexao)
-            lista_nomes = resultado['nome'].unique()
+    return cr_usuarios.mean()
 
-            for nome in lista_nomes:
-                cr_pessoa = por_nome(nome, treinamento=treinamento)
-                temp.append(cr_pessoa)
+# Calcula o CR de cada usuário a partir de provas já carregadas, sem novas consultas ao banco. Chave é a coluna ou a
+# lista de colunas que identifica o usuário (por padrão, o par nome/funcional). Retorna uma série indexada pela chave
+def coeficientes(provas, chave=None):
 
-            coefiente = np.array(temp).mean()
+    colunas = agregados.colunas_usuario(chave)
 
-        else:
+    # Média geral sobre as notas, como em por_nome, inclusive as das provas sem treinamento
+    media_geral = agregados.agrupar(provas, colunas)['nota'].mean()
 
-            # Sem filtros
-            resultado = pd.read_sql_query(_query, _conexao)
+    # Média primária: primeira nota de cada treinamento, sem o grupo das provas sem treinamento
+    primeiras = agregados.agrupar(provas, colunas + ['treinamento'])['nota'].first()
+    primeiras = primeiras[agregados.com_treinamento(primeiras)]
+    media_primaria = agregados.rotular(primeiras, agregados.por_usuario(primeiras).mean())
 
-            lista_nomes = resultado['nome'].unique()
+    return (media_geral + agregados.alinhar(media_primaria, media_geral.index)) / 20
 
-            for nome in lista_nomes:
-                cr_pessoa = por_nome(nome)
-                temp.append(cr_pessoa)
+# Calcula o CR de cada usuário a partir dos agregados por usuário e treinamento (soma, contagem e primeira nota), como
+# os de agregados.resumir. Retorna uma série indexada pelos níveis do usuário (todos menos o treinamento)
+def coeficientes_resumo(treinamentos):
 
-            coefiente = np.array(temp).mean()
+    por_usuario = agregados.por_usuario(treinamentos)
+    media_geral = agregados.rotular(treinamentos, por_usuario['soma'].sum() / por_usuario['contagem'].sum())
 
-    # Erro na query de seleção
-    except pd.io.sql.DatabaseError:
-        return None
+    # Provas sem treinamento entram apenas na média geral
+    validos = treinamentos[agregados.com_treinamento(treinamentos)]
+    media_primaria = agregados.rotular(validos, agregados.por_usuario(validos)['primeira'].mean())
 
-    return coefiente
+    return (media_geral + agregados.alinhar(media_primaria, media_geral.index)) / 20
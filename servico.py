@@ -0,0 +1,440 @@
+import json
+import math
+import time
+import argparse
+import threading
+import socketserver
+import urllib.parse
+import http.server
+
+"""
+    Neste arquivo, está o serviço de scores, que mantém os dados de cálculo em memória entre as consultas.
+
+    Cada execução de script ou célula de notebook importa o pacote, conecta ao banco e calcula tudo do zero. O serviço
+    é um processo de longa duração que faz esse trabalho uma única vez (veja aquecer) e mantém em memória:
+
+        - a cópia local das provas, quando usada (veja armazenamento.py)
+        - o resumo materializado das provas (veja agregados.py)
+        - o índice de posições de cada categoria e do ranking geral, com os scores de todos os usuários (veja
+          posicoes.py), e as estatísticas da população de CRs usadas no CRP
+
+    Uma thread em segundo plano busca as provas novas a cada intervalo_atualizacao segundos (veja atualizar). Quando há
+    provas novas, o resumo é atualizado apenas com elas e os índices são recalculados a partir dele e trocados de uma só
+    vez, de modo que as consultas nunca veem um índice pela metade. As consultas não acessam o banco: score, posição e
+    páginas dos rankings são lidos dos índices em memória.
+
+    As consultas podem ser feitas pelas funções deste arquivo ou por HTTP, em uma porta TCP ou em um socket Unix (veja
+    criar_servidor). As rotas aceitam apenas GET e respondem em JSON:
+
+        - /score?funcional=...&categoria=...   CR, CP, CRP e Score Final do usuário, com sua posição no ranking
+        - /posicao?racf=...&metrica=cr         posição do usuário no ranking de uma métrica (score, cr, cp ou crp)
+        - /ranking?categoria=...&pagina=2      uma página do ranking de uma métrica
+        - /estatisticas?categoria=...          estatísticas da população de CRs
+        - /situacao                            categorias carregadas, instante e número de provas da última atualização
+
+    O usuário é identificado por funcional, racf ou nome, e a categoria é opcional (sem ela, o ranking geral é usado).
+
+    Como o resumo materializado fica ativo, as demais funções do pacote chamadas no mesmo processo também passam a ser
+    calculadas a partir dele.
+
+    Uso:
+
+        python -m coeficiente.servico --porta 8000
+        python -m coeficiente.servico --socket /tmp/coeficiente.sock --sqlite dados.db
+
+"""
+
+from coeficiente import conexao, consultas, agregados, armazenamento, padrao, posicoes, progressao
+
+"""VARIÁVEIS GLOBAIS"""
+# Índices de posições por categoria (None é o ranking geral) e informações da última atualização
+_estado = {'indices': {}, 'pasta': None, 'tamanho': None, 'atualizado': None, 'provas': 0, 'erro': None}
+_trava = threading.Lock()
+_parar = threading.Event()
+_atualizador = {'thread': None}
+
+# Tempo, em segundos, entre duas buscas de provas novas
+intervalo_atualizacao = 30
+
+# Quantidade de linhas por página dos rankings, quando nenhuma é informada
+tamanho_pagina = 20
+
+"""FUNÇÕES"""
+
+# Retorna as categorias com provas no resumo materializado
+def _categorias():
+
+    tabela = agregados.materializado()
+
+    return sorted(str(categoria) for categoria in tabela['categoria'].dropna().unique())
+
+# Calcula as estatísticas da população de CRs a partir dos scores do índice, como em padrao.estatisticas
+def _estatisticas(scores):
+
+    return {'media': scores['cr'].mean(),
+            'desvio': scores['cr'].std(ddof=0),
+            'usuarios': int(scores['cr'].count())}
+
+# Monta o índice de posições de uma categoria, com as estatísticas da população
+def _construir(categoria):
+
+    dados = posicoes.construir(categoria)
+    dados['estatisticas'] = _estatisticas(dados['scores'])
+
+    return dados
+
+# Recalcula os índices do ranking geral e de todas as categorias e os troca pelos anteriores de uma só vez
+def _reconstruir():
+
+    indices = {categoria: _construir(categoria) for categoria in [None] + _categorias()}
+
+    _estado['indices'] = indices
+    _estado['atualizado'] = time.time()
+
+    # As estatísticas em cache de padrao.py também são recalculadas a partir do resumo, e os nomes novos passam a ser
+    # encontrados nas buscas por nome
+    padrao.invalidar_estatisticas()
+    consultas.invalidar_nomes()
+
+'''
+  Carrega os dados em memória: ativa a cópia local em pasta, se informada, monta o resumo materializado lendo as provas
+em blocos de até tamanho linhas e calcula os índices de todas as categorias.
+  Retorna o número de provas lidas.
+'''
+def aquecer(pasta=None, tamanho=None):
+
+    with _trava:
+        _estado['pasta'] = pasta
+        _estado['tamanho'] = tamanho
+
+        if pasta is not None:
+            armazenamento.ativar(pasta)
+
+        provas = agregados.materializar(tamanho)
+        _reconstruir()
+        _estado['provas'] = provas
+
+    return provas
+
+'''
+  Busca as provas novas, atualiza a cópia local (se ativa) e o resumo materializado e recarrega o catálogo de
+treinamentos. Se houver provas novas ou o catálogo mudou, recalcula os índices. Retorna o número de provas novas.
+'''
+def atualizar():
+
+    with _trava:
+
+        # Cópia local ativa: as provas novas são gravadas nela antes de atualizar o resumo
+        if _estado['pasta'] is not None and armazenamento.atualizar(_estado['pasta']):
+            armazenamento.ativar(_estado['pasta'], sincronizar=False)
+
+        novas = agregados.atualizar(_estado['tamanho'])
+
+        # Treinamentos novos mudam o total de provas disponíveis e, com ele, o CP de todos os usuários
+        catalogo = progressao.catalogo()
+        mudou = not progressao.atualizar_catalogo().equals(catalogo)
+
+        if novas or mudou:
+            _reconstruir()
+
+        _estado['provas'] = novas
+
+    return novas
+
+# Laço da thread de atualização. Qualquer erro é guardado na situação do serviço e a atualização é tentada de novo no
+# próximo intervalo, sem encerrar a thread
+def _atualizar_periodicamente():
+
+    while not _parar.wait(intervalo_atualizacao):
+        try:
+            atualizar()
+            _estado['erro'] = None
+
+        except Exception as erro:
+            _estado['erro'] = type(erro).__name__ + ': ' + str(erro)
+
+# Inicia a thread que busca as provas novas a cada intervalo_atualizacao segundos
+def iniciar_atualizacao():
+
+    if _atualizador['thread'] is not None and _atualizador['thread'].is_alive():
+        return
+
+    _parar.clear()
+    _atualizador['thread'] = threading.Thread(target=_atualizar_periodicamente, name='coeficiente-atualizacao',
+                                              daemon=True)
+    _atualizador['thread'].start()
+
+# Encerra a thread de atualização, aguardando a atualização em andamento terminar
+def parar_atualizacao():
+
+    _parar.set()
+
+    if _atualizador['thread'] is not None:
+        _atualizador['thread'].join()
+        _atualizador['thread'] = None
+
+# Retorna o índice de uma categoria. Categorias ainda sem índice (sem provas na última atualização) retornam None
+def _indice(categoria=None):
+
+    # Serviço ainda não aquecido
+    if not _estado['indices']:
+        raise RuntimeError('Serviço não aquecido. Chame aquecer antes das consultas')
+
+    return _estado['indices'].get(categoria)
+
+# Exige ao menos um identificador do usuário. Sem nenhum, a busca é inválida (e o serviço HTTP responde 400)
+def _identificado(funcional=None, racf=None, nome=None):
+
+    if funcional is None and racf is None and nome is None:
+        raise ValueError('Informe o funcional, o racf ou o nome do usuário')
+
+# Monta a linha de um usuário do índice: identificação e scores
+def _linha(scores, identificador):
+
+    linha = scores.loc[identificador]
+
+    return {'id': int(identificador),
+            'nome': linha['nome'],
+            'racf': linha['racf'],
+            'funcional': linha['funcional'],
+            'cr': linha['cr'],
+            'cp': linha['cp'],
+            'crp': linha['crp'],
+            'score': linha['score']}
+
+'''
+  Retorna CR, CP, CRP e Score Final de um usuário, identificado pelo funcional, pelo racf ou pelo nome, na categoria (ou
+no ranking geral), junto com sua posição, o total de usuários e o percentil no ranking de Score Final. CR e CP estão na
+base 0 a 1.
+  Retorna None se o usuário não fez provas na categoria. Sem funcional, racf e nome, levanta ValueError.
+'''
+def score(funcional=None, racf=None, nome=None, categoria=None):
+
+    _identificado(funcional=funcional, racf=racf, nome=nome)
+
+    dados = _indice(categoria)
+
+    # Categoria sem provas
+    if dados is None:
+        return None
+
+    identificador = posicoes.identificar(dados, funcional=funcional, racf=racf, nome=nome)
+
+    # Usuário sem provas
+    if identificador is None:
+        return None
+
+    resultado = _linha(dados['scores'], identificador)
+    resultado.update(posicoes.localizar(dados, identificador) or {'posicao': None, 'total': None, 'percentil': None})
+    resultado.pop('valor', None)
+
+    return resultado
+
+'''
+  Retorna a posição de um usuário, identificado pelo funcional, pelo racf ou pelo nome, no ranking de uma métrica
+(score, cr, cp ou crp) da categoria, no formato de posicoes.posicao.
+  Retorna None se o usuário não fez provas na categoria ou não tem valor na métrica. Sem funcional, racf e nome, levanta
+ValueError.
+'''
+def posicao(funcional=None, racf=None, nome=None, categoria=None, metrica='score'):
+
+    # Métrica desconhecida
+    if metrica not in posicoes.metricas:
+        raise ValueError('Métrica inválida: ' + str(metrica))
+
+    _identificado(funcional=funcional, racf=racf, nome=nome)
+
+    dados = _indice(categoria)
+
+    # Categoria sem provas
+    if dados is None:
+        return None
+
+    identificador = posicoes.identificar(dados, funcional=funcional, racf=racf, nome=nome)
+
+    # Usuário sem provas
+    if identificador is None:
+        return None
+
+    return posicoes.localizar(dados, identificador, metrica=metrica)
+
+'''
+  Retorna uma página do ranking de uma métrica da categoria: um dicionário com a página, o tamanho da página, o total de
+usuários e as linhas, cada uma com a posição, a identificação e os scores do usuário. A primeira página é a 1.
+'''
+def ranking(categoria=None, metrica='score', pagina=1, tamanho=None):
+
+    # Métrica desconhecida
+    if metrica not in posicoes.metricas:
+        raise ValueError('Métrica inválida: ' + str(metrica))
+
+    tamanho = tamanho or tamanho_pagina
+    dados = _indice(categoria)
+
+    # Categoria sem provas
+    if dados is None:
+        return {'pagina': pagina, 'tamanho': tamanho, 'total': 0, 'linhas': []}
+
+    ids = dados['ordenacoes'][metrica]['ids']
+    inicio = (max(pagina, 1) - 1) * tamanho
+    linhas = []
+
+    for lugar, identificador in enumerate(ids[inicio:inicio + tamanho].tolist(), start=inicio + 1):
+        linhas.append(dict(_linha(dados['scores'], identificador), posicao=lugar))
+
+    return {'pagina': pagina, 'tamanho': tamanho, 'total': len(ids), 'linhas': linhas}
+
+# Retorna as estatísticas da população de CRs da categoria: média (MCR), desvio padrão (DpCRT) e número de usuários
+def estatisticas(categoria=None):
+
+    dados = _indice(categoria)
+
+    # Categoria sem provas
+    if dados is None:
+        return None
+
+    return dict(dados['estatisticas'])
+
+# Retorna a situação do serviço: categorias carregadas, instante e número de provas novas da última atualização e o
+# último erro da atualização em segundo plano
+def situacao():
+
+    return {'categorias': [categoria for categoria in _estado['indices'] if categoria is not None],
+            'atualizado': _estado['atualizado'],
+            'provas': _estado['provas'],
+            'erro': _estado['erro'],
+            'atualizando': _atualizador['thread'] is not None and _atualizador['thread'].is_alive()}
+
+# Converte um valor para JSON: números do numpy como números do Python e valores nulos como null
+def _json(valor):
+
+    if isinstance(valor, dict):
+        return {chave: _json(item) for chave, item in valor.items()}
+
+    if isinstance(valor, list):
+        return [_json(item) for item in valor]
+
+    if hasattr(valor, 'item'):
+        valor = valor.item()
+
+    if valor is None or (isinstance(valor, float) and math.isnan(valor)):
+        return None
+
+    return valor
+
+# Atende as requisições HTTP do serviço
+class _Requisicao(http.server.BaseHTTPRequestHandler):
+
+    # Rotas: função e argumentos aceitos na query string
+    _rotas = {'/score': (score, ['funcional', 'racf', 'nome', 'categoria']),
+              '/posicao': (posicao, ['funcional', 'racf', 'nome', 'categoria', 'metrica']),
+              '/ranking': (ranking, ['categoria', 'metrica', 'pagina', 'tamanho']),
+              '/estatisticas': (estatisticas, ['categoria']),
+              '/situacao': (situacao, [])}
+
+    def do_GET(self):
+
+        endereco = urllib.parse.urlsplit(self.path)
+        rota = self._rotas.get(endereco.path.rstrip('/'))
+
+        if rota is None:
+            return self._responder(404, {'erro': 'Rota não encontrada: ' + endereco.path})
+
+        funcao, aceitos = rota
+        argumentos = {chave: valores[-1] for chave, valores in urllib.parse.parse_qs(endereco.query).items()
+                      if chave in aceitos}
+
+        try:
+            for chave in ['pagina', 'tamanho']:
+                if chave in argumentos:
+                    argumentos[chave] = int(argumentos[chave])
+
+            resultado = funcao(**argumentos)
+
+        except ValueError as erro:
+            return self._responder(400, {'erro': str(erro)})
+
+        except RuntimeError as erro:
+            return self._responder(503, {'erro': str(erro)})
+
+        # Usuário ou categoria sem provas
+        if resultado is None:
+            return self._responder(404, {'erro': 'Não encontrado'})
+
+        self._responder(200, resultado)
+
+    def _responder(self, codigo, conteudo):
+
+        corpo = json.dumps(_json(conteudo), ensure_ascii=False).encode('utf-8')
+
+        self.send_response(codigo)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    # Em sockets Unix, o endereço do cliente é vazio
+    def address_string(self):
+        return str(self.client_address[0]) if self.client_address else 'unix'
+
+    # As requisições não são registradas
+    def log_message(self, formato, *args):
+        pass
+
+# Servidor HTTP em um socket Unix, com uma thread por requisição
+class _ServidorUnix(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+'''
+  Cria o servidor HTTP do serviço na porta TCP do endereço ou, com socket, no socket Unix informado. O servidor atende
+cada requisição em uma thread. Use serve_forever para atender as requisições e shutdown para encerrá-lo.
+'''
+def criar_servidor(endereco='127.0.0.1', porta=8000, socket=None):
+
+    if socket is not None:
+        return _ServidorUnix(socket, _Requisicao)
+
+    servidor = http.server.ThreadingHTTPServer((endereco, porta), _Requisicao)
+    servidor.daemon_threads = True
+
+    return servidor
+
+'''
+  Aquece o serviço (veja aquecer), inicia a atualização em segundo plano e atende as requisições HTTP até ser
+interrompido.
+'''
+def servir(endereco='127.0.0.1', porta=8000, socket=None, pasta=None, tamanho=None):
+
+    aquecer(pasta=pasta, tamanho=tamanho)
+    iniciar_atualizacao()
+
+    servidor = criar_servidor(endereco=endereco, porta=porta, socket=socket)
+
+    try:
+        servidor.serve_forever()
+
+    finally:
+        servidor.server_close()
+        parar_atualizacao()
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Serviço de scores com os dados de cálculo mantidos em memória.')
+    parser.add_argument('--endereco', default='127.0.0.1', help='Endereço em que o serviço atende')
+    parser.add_argument('--porta', type=int, default=8000, help='Porta TCP em que o serviço atende')
+    parser.add_argument('--socket', default=None, help='Socket Unix em que o serviço atende, no lugar da porta TCP')
+    parser.add_argument('--intervalo', type=float, default=intervalo_atualizacao,
+                        help='Tempo, em segundos, entre duas buscas de provas novas')
+    parser.add_argument('--pasta', default=None, help='Pasta da cópia local das provas (veja armazenamento.py)')
+    parser.add_argument('--tamanho', type=int, default=None, help='Linhas por bloco na leitura das provas')
+    parser.add_argument('--sqlite', default=None, help='Banco SQLite local usado no lugar do SQL Server')
+    argumentos = parser.parse_args()
+
+    intervalo_atualizacao = argumentos.intervalo
+
+    # Banco SQLite local com as mesmas tabelas (veja benchmark.gerar)
+    if argumentos.sqlite:
+        conexao.configurar(fabrica=conexao.fabrica_sqlite(argumentos.sqlite))
+
+    servir(endereco=argumentos.endereco, porta=argumentos.porta, socket=argumentos.socket, pasta=argumentos.pasta,
+           tamanho=argumentos.tamanho)
@@ -0,0 +1,26 @@
+import os
+
+"""
+    Banco de dados usado pelos testes, gerado com os dados sintéticos da suíte de benchmarks (veja benchmark.gerar).
+
+"""
+
+from coeficiente import benchmark, conexao
+
+"""VARIÁVEIS GLOBAIS"""
+categorias = ['04 - Python', '10 - Java', '02 - SQL']
+
+"""FUNÇÕES"""
+
+'''
+  Gera em pasta um banco com usuarios usuários e configura a conexão para usá-lo. Semente torna a geração
+reprodutível. Retorna o caminho do banco.
+'''
+def preparar(pasta, usuarios=60, semente=1):
+
+    caminho = os.path.join(pasta, 'provas.db')
+    benchmark.gerar(caminho, usuarios=usuarios, semente=semente)
+
+    conexao.configurar(fabrica=conexao.fabrica_sqlite(caminho))
+
+    return caminho
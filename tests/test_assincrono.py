@@ -0,0 +1,67 @@
+import os
+import sys
+import asyncio
+import tempfile
+import unittest
+import pandas as pd
+
+# O pacote é importado como coeficiente, a partir da pasta que contém o projeto
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from coeficiente import conexao, assincrono, rendimento, progressao, padrao, media, final
+from coeficiente.tests import dados
+
+"""
+    Testes das variantes assíncronas: buscas disparadas ao mesmo tempo retornam os mesmos valores das buscas síncronas
+por funcional, racf e nome.
+
+"""
+
+class TesteAssincrono(unittest.TestCase):
+
+    modulos = {'rendimento': rendimento, 'progressao': progressao, 'padrao': padrao, 'media': media, 'final': final}
+
+    @classmethod
+    def setUpClass(cls):
+
+        cls.pasta = tempfile.TemporaryDirectory()
+        dados.preparar(cls.pasta.name)
+
+    @classmethod
+    def tearDownClass(cls):
+
+        assincrono.fechar()
+        conexao.configurar()
+        cls.pasta.cleanup()
+
+    def setUp(self):
+        padrao.invalidar_estatisticas()
+
+    def test_igual_as_buscas_sincronas(self):
+
+        # Usuário, identificado pelo funcional, racf e nome, em todas as categorias e em Python
+        chamadas = []
+        for usuario in range(8):
+            for categoria in [None, '04 - Python']:
+                for chave, valor in [('funcional', str(100000 + usuario)), ('racf', 'R%06d' % usuario),
+                                     ('nome', 'Usuário ' + str(usuario))]:
+                    for modulo in self.modulos:
+                        chamadas.append((modulo, 'por_' + chave, valor, categoria))
+
+        async def executar():
+            return await asyncio.gather(*[getattr(assincrono, modulo + '_' + funcao)(valor, categoria=categoria)
+                                          for modulo, funcao, valor, categoria in chamadas])
+
+        resultados = asyncio.run(executar())
+
+        for (modulo, funcao, valor, categoria), resultado in zip(chamadas, resultados):
+            esperado = getattr(self.modulos[modulo], funcao)(valor, categoria=categoria)
+
+            # Usuário sem provas na categoria
+            if pd.isna(esperado):
+                self.assertTrue(pd.isna(resultado), msg=(modulo, funcao, valor, categoria))
+            else:
+                self.assertAlmostEqual(resultado, esperado, msg=(modulo, funcao, valor, categoria))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import sys
+import tempfile
+import unittest
+import pandas as pd
+
+# O pacote é importado como coeficiente, a partir da pasta que contém o projeto
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from coeficiente import conexao, final, rendimento, progressao
+from coeficiente.tests import dados
+
+"""
+    Testes da leitura em blocos: os resultados com tamanho_bloco são iguais aos da leitura da tabela inteira, qualquer
+que seja o tamanho dos blocos.
+
+"""
+
+class TesteBlocos(unittest.TestCase):
+
+    tamanhos = [7, 100, 100000]
+
+    @classmethod
+    def setUpClass(cls):
+
+        cls.pasta = tempfile.TemporaryDirectory()
+        dados.preparar(cls.pasta.name)
+
+    @classmethod
+    def tearDownClass(cls):
+
+        conexao.configurar()
+        cls.pasta.cleanup()
+
+    def test_gerar_tabela(self):
+
+        for categoria in [None, '10 - Java']:
+            tabela = final.gerar_tabela(categoria=categoria, funcional=True)
+
+            for tamanho in self.tamanhos:
+                pd.testing.assert_frame_equal(final.gerar_tabela(categoria=categoria, funcional=True,
+                                                                 tamanho_bloco=tamanho), tabela)
+
+    def test_ranking_coeficentes(self):
+
+        ranking = rendimento.ranking_coeficentes(funcional=True)
+
+        for tamanho in self.tamanhos:
+            pd.testing.assert_frame_equal(rendimento.ranking_coeficentes(funcional=True, tamanho_bloco=tamanho), ranking)
+
+    def test_medias(self):
+
+        for tamanho in self.tamanhos:
+            self.assertAlmostEqual(rendimento.rendimento_medio(tamanho_bloco=tamanho), rendimento.rendimento_medio())
+            self.assertAlmostEqual(progressao.progressao_media(tamanho_bloco=tamanho), progressao.progressao_media())
+
+if __name__ == '__main__':
+    unittest.main()
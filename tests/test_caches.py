@@ -0,0 +1,96 @@
+import os
+import sys
+import sqlite3
+import tempfile
+import unittest
+
+# O pacote é importado como coeficiente, a partir da pasta que contém o projeto
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from coeficiente import conexao, padrao, posicoes, progressao
+from coeficiente.tests import dados
+
+"""
+    Testes dos caches calculados a partir de todas as provas (estatísticas do CRP, catálogo e índices de posições): eles
+são reaproveitados enquanto as marcas d'água não mudam e recalculados quando há provas novas ou quando a conexão é
+configurada para outro banco.
+
+"""
+
+class TesteCaches(unittest.TestCase):
+
+    categoria = '10 - Java'
+
+    def setUp(self):
+
+        self.pasta = tempfile.TemporaryDirectory()
+        self.caminho = dados.preparar(self.pasta.name)
+
+        progressao.invalidar_catalogo()
+        padrao.invalidar_estatisticas()
+        posicoes.invalidar()
+
+    def tearDown(self):
+
+        padrao.validade_estatisticas = 300
+        posicoes.validade_indices = 300
+        progressao.validade_catalogo = None
+
+        conexao.configurar()
+        self.pasta.cleanup()
+
+    # Inclui as provas de um novo usuário em Java no banco
+    def incluir(self):
+
+        con = sqlite3.connect(self.caminho)
+        con.executemany('INSERT INTO coeficiente_mentoria (nome, racf, funcional, treinamento, nota, categoria) '
+                        'VALUES (?, ?, ?, ?, ?, ?)',
+                        [('Novo', 'RNOVO1', 900001, 'Java - Módulo 1', 10.0, self.categoria),
+                         ('Novo', 'RNOVO1', 900001, 'Java - Módulo 2', 10.0, self.categoria)])
+        con.commit()
+        con.close()
+
+    def test_validade_expirada_sem_mudancas(self):
+
+        padrao.validade_estatisticas = 0
+        posicoes.validade_indices = 0
+        progressao.validade_catalogo = 0
+
+        populacao = padrao.estatisticas(categoria=self.categoria)
+        indice = posicoes.indice(categoria=self.categoria)
+        catalogo = progressao.catalogo()
+
+        self.assertIs(padrao.estatisticas(categoria=self.categoria), populacao)
+        self.assertIs(posicoes.indice(categoria=self.categoria), indice)
+        self.assertIs(progressao.catalogo(), catalogo)
+
+    def test_provas_novas(self):
+
+        padrao.validade_estatisticas = 0
+        posicoes.validade_indices = 0
+
+        usuarios = padrao.estatisticas(categoria=self.categoria)['usuarios']
+        self.assertIsNone(posicoes.posicao(funcional='900001', categoria=self.categoria))
+
+        self.incluir()
+
+        self.assertEqual(padrao.estatisticas(categoria=self.categoria)['usuarios'], usuarios + 1)
+        self.assertIsNotNone(posicoes.posicao(funcional='900001', categoria=self.categoria))
+
+    def test_outro_banco(self):
+
+        # Caches dentro da validade
+        usuarios = padrao.estatisticas()['usuarios']
+        indice = posicoes.indice()
+        catalogo = progressao.catalogo()
+
+        outra = tempfile.TemporaryDirectory()
+        self.addCleanup(outra.cleanup)
+        dados.preparar(outra.name, usuarios=30, semente=2)
+
+        self.assertNotEqual(padrao.estatisticas()['usuarios'], usuarios)
+        self.assertIsNot(posicoes.indice(), indice)
+        self.assertFalse(progressao.catalogo().equals(catalogo))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import os
+import sys
+import tempfile
+import unittest
+import pandas as pd
+
+# O pacote é importado como coeficiente, a partir da pasta que contém o projeto
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from coeficiente import conexao, agregados, padrao, final
+from coeficiente.tests import dados
+
+"""
+    Testes dos scores de todas as categorias de uma vez: cada categoria de final.gerar_matriz é igual a
+final.gerar_tabela com a categoria, lendo as provas de uma vez, em blocos ou com o resumo materializado.
+
+"""
+
+class TesteCategorias(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        cls.pasta = tempfile.TemporaryDirectory()
+        dados.preparar(cls.pasta.name)
+
+    @classmethod
+    def tearDownClass(cls):
+
+        conexao.configurar()
+        cls.pasta.cleanup()
+
+    def setUp(self):
+        padrao.invalidar_estatisticas()
+
+    def tearDown(self):
+        agregados.descartar()
+
+    # Compara cada categoria da matriz com gerar_tabela da categoria. Com tamanho_bloco, as tabelas são lidas em blocos
+    def comparar(self, matriz, tamanho_bloco=None):
+
+        categorias = matriz.index.get_level_values('Categoria').unique()
+        self.assertTrue(set(dados.categorias) <= set(categorias))
+
+        for categoria in categorias:
+            esperado = final.gerar_tabela(categoria=categoria, funcional=True, tamanho_bloco=tamanho_bloco)
+            pd.testing.assert_frame_equal(matriz.loc[categoria], esperado, obj=categoria)
+
+    def test_formato_longo(self):
+
+        matriz = final.gerar_matriz(funcional=True)
+
+        self.comparar(matriz)
+        self.comparar(matriz, tamanho_bloco=100)
+
+        agregados.materializar()
+        self.comparar(final.gerar_matriz(funcional=True))
+
+    def test_formato_largo(self):
+
+        largo = final.gerar_matriz(formato='largo')
+
+        for categoria in largo.columns.get_level_values(1).unique():
+            esperado = final.gerar_tabela(categoria=categoria, funcional=True).set_index(['Nome', 'Funcional'])
+            obtido = largo[('Score Final', categoria)].dropna()
+            pd.testing.assert_series_equal(obtido.sort_index(), esperado['Score Final'].sort_index(),
+                                           check_names=False, obj=categoria)
+
+if __name__ == '__main__':
+    unittest.main()
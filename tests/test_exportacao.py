@@ -0,0 +1,91 @@
+import os
+import sys
+import tempfile
+import unittest
+import importlib.util
+import pandas as pd
+
+# O pacote é importado como coeficiente, a partir da pasta que contém o projeto
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from coeficiente import conexao, consultas, agregados, final, relatorio
+from coeficiente.tests import dados
+
+"""
+    Testes da exportação em fluxo: cada ranking gravado, em qualquer formato e gravado em vários blocos, é igual à tabela
+de final.gerar_tabela da categoria.
+
+"""
+
+class TesteExportacao(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        cls.pasta = tempfile.TemporaryDirectory()
+        dados.preparar(cls.pasta.name)
+
+    @classmethod
+    def tearDownClass(cls):
+
+        conexao.configurar()
+        cls.pasta.cleanup()
+
+    def setUp(self):
+
+        self.linhas_por_bloco = relatorio.linhas_por_bloco
+        relatorio.linhas_por_bloco = 7
+        self.saida = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+
+        relatorio.linhas_por_bloco = self.linhas_por_bloco
+        self.saida.cleanup()
+
+    # Exporta os rankings em formato e compara cada arquivo lido por ler com a tabela da categoria
+    def comparar(self, formato, ler, **opcoes):
+
+        gravadas = relatorio.exportar_em_fluxo(formato=formato, separado=True, pasta=self.saida.name, funcional=True,
+                                               **opcoes)
+        # Todas as categorias com provas e o ranking geral
+        self.assertEqual(set(gravadas), set(consultas.categorias()) | {None})
+
+        for categoria, linhas in gravadas.items():
+            tabela = final.gerar_tabela(categoria=categoria, funcional=True)
+            nome_arquivo = os.path.splitext(relatorio.nomes_categoria(categoria)[1])[0] + relatorio.formatos[formato]
+            lida = ler(os.path.join(self.saida.name, nome_arquivo))
+
+            self.assertEqual(linhas, len(tabela))
+            pd.testing.assert_frame_equal(lida, tabela, check_dtype=False, check_index_type=False)
+
+    def test_csv(self):
+
+        self.comparar('csv', lambda arquivo: pd.read_csv(arquivo, index_col='ID'))
+
+    def test_csv_em_blocos(self):
+
+        self.comparar('csv', lambda arquivo: pd.read_csv(arquivo, index_col='ID'), tamanho_bloco=50)
+
+    def test_csv_com_resumo_materializado(self):
+
+        agregados.materializar()
+        self.addCleanup(agregados.descartar)
+
+        self.comparar('csv', lambda arquivo: pd.read_csv(arquivo, index_col='ID'))
+
+    def test_csv_em_paralelo(self):
+
+        self.comparar('csv', lambda arquivo: pd.read_csv(arquivo, index_col='ID'), processos=2)
+
+    @unittest.skipIf(importlib.util.find_spec('openpyxl') is None, 'openpyxl não instalado')
+    def test_xlsx(self):
+
+        self.comparar('xlsx', lambda arquivo: pd.read_excel(arquivo, index_col='ID'))
+
+    @unittest.skipIf(importlib.util.find_spec('pyarrow') is None, 'pyarrow não instalado')
+    def test_parquet(self):
+
+        self.comparar('parquet', lambda arquivo: pd.read_parquet(arquivo).set_index('ID'))
+
+if __name__ == '__main__':
+    unittest.main()
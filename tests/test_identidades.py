@@ -0,0 +1,93 @@
+import os
+import sys
+import tempfile
+import unittest
+import pandas as pd
+
+# O pacote é importado como coeficiente, a partir da pasta que contém o projeto
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from coeficiente import conexao, agregados, rendimento, progressao, padrao, media, final
+from coeficiente.tests import dados
+
+"""
+    Testes do índice de identidades: com o resumo materializado ativo, as buscas por funcional, racf e nome retornam os
+mesmos valores das consultas ao banco.
+
+"""
+
+class TesteIdentidades(unittest.TestCase):
+
+    modulos = [rendimento, progressao, padrao, media, final]
+
+    @classmethod
+    def setUpClass(cls):
+
+        cls.pasta = tempfile.TemporaryDirectory()
+        dados.preparar(cls.pasta.name)
+
+    @classmethod
+    def tearDownClass(cls):
+
+        conexao.configurar()
+        cls.pasta.cleanup()
+
+    def setUp(self):
+        padrao.invalidar_estatisticas()
+
+    def tearDown(self):
+        agregados.descartar()
+
+    # Buscas comparadas: cada usuário pelo funcional, racf e nome, em todas as categorias e em Python
+    def buscar(self):
+
+        resultados = {}
+        for usuario in [1, 7, 23]:
+            for categoria in [None, '04 - Python']:
+                for chave, valor in [('funcional', str(100000 + usuario)), ('racf', 'R%06d' % usuario),
+                                     ('nome', 'Usuário ' + str(usuario))]:
+                    for modulo in self.modulos:
+                        funcao = getattr(modulo, 'por_' + chave)
+                        resultados[(modulo.__name__, chave, valor, categoria)] = funcao(valor, categoria=categoria)
+
+        return resultados
+
+    def test_igual_ao_banco(self):
+
+        esperado = self.buscar()
+
+        agregados.materializar()
+        obtido = self.buscar()
+
+        for chamada, valor in esperado.items():
+            # Usuário sem provas na categoria
+            if pd.isna(valor):
+                self.assertTrue(pd.isna(obtido[chamada]), msg=chamada)
+            else:
+                self.assertAlmostEqual(obtido[chamada], valor, msg=chamada)
+
+    def test_em_lote(self):
+
+        funcionais = ['100002', '100011', '100005']
+        racfs = ['R000004', 'R000009']
+        esperado = {modulo.__name__: (modulo.por_funcionais(funcionais), modulo.por_racfs(racfs))
+                    for modulo in self.modulos}
+
+        agregados.materializar()
+
+        # A ordem dos usuários no resultado não é garantida
+        for modulo in self.modulos:
+            pd.testing.assert_frame_equal(modulo.por_funcionais(funcionais).sort_index(),
+                                          esperado[modulo.__name__][0].sort_index())
+            pd.testing.assert_frame_equal(modulo.por_racfs(racfs).sort_index(),
+                                          esperado[modulo.__name__][1].sort_index())
+
+    def test_nome_normalizado(self):
+
+        agregados.materializar()
+
+        for modulo in self.modulos:
+            self.assertAlmostEqual(modulo.por_nome(' usuario  7'), modulo.por_nome('Usuário 7'), msg=modulo.__name__)
+
+if __name__ == '__main__':
+    unittest.main()
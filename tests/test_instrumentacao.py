@@ -0,0 +1,54 @@
+import os
+import sys
+import tempfile
+import unittest
+import warnings
+
+# O pacote é importado como coeficiente, a partir da pasta que contém o projeto
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from coeficiente import conexao, instrumentacao, final
+from coeficiente.tests import dados
+
+"""
+    Testes da instrumentação das consultas: com um coletor ativo, as consultas são registradas e os resultados são os
+mesmos, sem avisos do pandas sobre a conexão.
+
+"""
+
+class TesteInstrumentacao(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        cls.pasta = tempfile.TemporaryDirectory()
+        dados.preparar(cls.pasta.name)
+
+    @classmethod
+    def tearDownClass(cls):
+
+        conexao.configurar()
+        cls.pasta.cleanup()
+
+    def test_registros_sem_avisos(self):
+
+        esperado = final.gerar_tabela(funcional=True)
+        em_blocos = final.gerar_tabela(funcional=True, tamanho_bloco=100)
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', UserWarning)
+
+            with instrumentacao.coletar() as coletor:
+                obtido = final.gerar_tabela(funcional=True)
+                obtido_em_blocos = final.gerar_tabela(funcional=True, tamanho_bloco=100)
+
+        self.assertTrue(obtido.equals(esperado))
+        self.assertTrue(obtido_em_blocos.equals(em_blocos))
+
+        totais = instrumentacao.resumo(coletor).sum()
+        self.assertGreaterEqual(totais['consultas'], 2)
+        self.assertGreater(totais['linhas'], 0)
+        self.assertGreater(totais['tempo'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import os
+import sys
+import sqlite3
+import tempfile
+import unittest
+import pandas as pd
+
+# O pacote é importado como coeficiente, a partir da pasta que contém o projeto
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from coeficiente import conexao, agregados, final, rendimento, progressao, media
+from coeficiente.tests import dados
+
+"""
+    Testes do resumo materializado: com ele ativo, rankings, médias e buscas individuais são iguais aos calculados a
+partir das provas, inclusive depois de novas provas serem incluídas com agregados.atualizar.
+
+"""
+
+class TesteMaterializado(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        cls.pasta = tempfile.TemporaryDirectory()
+        cls.caminho = dados.preparar(cls.pasta.name)
+
+    @classmethod
+    def tearDownClass(cls):
+
+        conexao.configurar()
+        cls.pasta.cleanup()
+
+    def setUp(self):
+        agregados.descartar()
+
+    def tearDown(self):
+        agregados.descartar()
+
+    # Resultados comparados, calculados pelo caminho ativo no momento
+    def calcular(self):
+
+        return {'tabela': final.gerar_tabela(funcional=True),
+                'tabela java': final.gerar_tabela(categoria='10 - Java', funcional=True),
+                'ranking': rendimento.ranking_coeficentes(funcional=True),
+                'rendimento medio': rendimento.rendimento_medio(),
+                'progressao media': progressao.progressao_media(),
+                'media': media.por_categoria('04 - Python', opcao='todas'),
+                'rendimento': rendimento.por_funcional('100003'),
+                'progressao': progressao.por_funcional('100003'),
+                'score': final.por_funcional('100003'),
+                'scores': final.por_funcionais(['100003', '100004', '100005'])}
+
+    def comparar(self, obtido, esperado):
+
+        for chave, valor in esperado.items():
+            if isinstance(valor, pd.DataFrame):
+                pd.testing.assert_frame_equal(obtido[chave], valor)
+            elif isinstance(valor, dict):
+                self.comparar(obtido[chave], valor)
+            else:
+                self.assertAlmostEqual(obtido[chave], valor, msg=chave)
+
+    def test_igual_as_provas(self):
+
+        esperado = self.calcular()
+        agregados.materializar(tamanho=50)
+
+        self.comparar(self.calcular(), esperado)
+
+    def test_atualizar(self):
+
+        agregados.materializar()
+
+        # Nova tentativa de um usuário existente e provas de um novo usuário
+        con = sqlite3.connect(self.caminho)
+        con.executemany('INSERT INTO coeficiente_mentoria (nome, racf, funcional, treinamento, nota, categoria) '
+                        'VALUES (?, ?, ?, ?, ?, ?)',
+                        [('Usuário 3', 'R000003', 100003, 'Java - Módulo 1', 9.5, '10 - Java'),
+                         ('Novo', 'RNOVO1', 900001, 'Java - Módulo 1', 4.0, '10 - Java'),
+                         ('Novo', 'RNOVO1', 900001, 'Java - Módulo 1', 7.0, '10 - Java')])
+        con.commit()
+        con.close()
+
+        self.assertEqual(agregados.atualizar(), 3)
+        obtido = self.calcular()
+
+        agregados.descartar()
+        self.comparar(obtido, self.calcular())
+
+    def test_categoria_sem_provas(self):
+
+        # Sem provas disponíveis na categoria, o CP é nulo e o score não é calculado, com ou sem o resumo
+        for materializar in [False, True]:
+            if materializar:
+                agregados.materializar()
+
+            self.assertTrue(pd.isna(progressao.por_funcional('100001', categoria='99 - Inexistente')))
+            self.assertTrue(pd.isna(progressao.por_nome('Usuário 1', categoria='99 - Inexistente')))
+            self.assertIsNone(final.por_funcional('100001', categoria='99 - Inexistente'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import sys
+import tempfile
+import unittest
+import pandas as pd
+
+# O pacote é importado como coeficiente, a partir da pasta que contém o projeto
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from coeficiente import conexao, agregados, media
+from coeficiente.tests import dados
+
+"""
+    Testes da matriz de médias: as médias por usuário, por categoria e por treinamento calculadas a partir da matriz são
+as mesmas das funções de media.py, lendo as provas ou com o resumo materializado.
+
+"""
+
+class TesteMatriz(unittest.TestCase):
+
+    opcoes = ['geral', 'primaria', 'final', 'todas', None]
+    treinamentos = ['Python - Módulo 1', 'Java - Módulo 2', 'SQL - Módulo 3']
+
+    @classmethod
+    def setUpClass(cls):
+
+        cls.pasta = tempfile.TemporaryDirectory()
+        dados.preparar(cls.pasta.name)
+
+    @classmethod
+    def tearDownClass(cls):
+
+        conexao.configurar()
+        cls.pasta.cleanup()
+
+    def tearDown(self):
+        agregados.descartar()
+
+    # Compara duas médias, ou os dicionários da opção todas. Sem provas, as duas são nulas
+    def igual(self, obtido, esperado, msg=None):
+
+        if isinstance(esperado, dict):
+            self.assertEqual(obtido.keys(), esperado.keys(), msg=msg)
+            for chave in esperado:
+                self.igual(obtido[chave], esperado[chave], msg=msg)
+
+        elif pd.isna(esperado):
+            self.assertTrue(pd.isna(obtido), msg=msg)
+
+        else:
+            self.assertAlmostEqual(obtido, esperado, msg=msg)
+
+    def comparar(self):
+
+        por_categoria = media.matriz(chave='funcional', nivel='categoria')
+        por_treinamento = media.matriz()
+
+        for categoria in dados.categorias:
+            for opcao in self.opcoes:
+                esperado = media.por_categoria(categoria, opcao=opcao)
+                self.igual(media.por_categoria(categoria, opcao=opcao, matriz=por_treinamento), esperado,
+                           msg=(categoria, opcao))
+
+                # A matriz usuário × categoria não serve para a opção todas
+                if opcao != 'todas':
+                    self.igual(media.por_categoria(categoria, opcao=opcao, matriz=por_categoria), esperado,
+                               msg=(categoria, opcao))
+
+        for treinamento in self.treinamentos:
+            for opcao in self.opcoes:
+                self.igual(media.por_treinamento(treinamento, opcao=opcao, matriz=por_treinamento),
+                           media.por_treinamento(treinamento, opcao=opcao), msg=(treinamento, opcao))
+
+        # Linhas da matriz: as médias de cada usuário na categoria
+        for (funcional, categoria), linha in por_categoria.head(20).iterrows():
+            esperado = media.por_funcional(str(funcional), categoria=categoria, opcao='todas')
+            self.igual(linha[['geral', 'primaria', 'final']].to_dict(), esperado, msg=(funcional, categoria))
+
+    def test_lendo_as_provas(self):
+        self.comparar()
+
+    def test_com_o_resumo_materializado(self):
+
+        agregados.materializar()
+        self.comparar()
+
+    def test_nivel_categoria_sem_treinamento(self):
+
+        with self.assertRaises(ValueError):
+            media.por_treinamento(self.treinamentos[0], matriz=media.matriz(nivel='categoria'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+import os
+import sys
+import sqlite3
+import tempfile
+import unittest
+import pandas as pd
+
+# O pacote é importado como coeficiente, a partir da pasta que contém o projeto
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from coeficiente import conexao, consultas, media
+from coeficiente.tests import dados
+
+"""
+    Testes da agregação das médias no banco: com no_banco=True, cada função de media.py retorna as mesmas médias
+calculadas a partir de todas as provas, em todas as opções.
+
+"""
+
+class TesteNoBanco(unittest.TestCase):
+
+    opcoes = ['geral', 'primaria', 'final', 'todas', None]
+
+    @classmethod
+    def setUpClass(cls):
+
+        cls.pasta = tempfile.TemporaryDirectory()
+        dados.preparar(cls.pasta.name)
+
+    @classmethod
+    def tearDownClass(cls):
+
+        conexao.configurar()
+        cls.pasta.cleanup()
+
+    # Compara o resultado de funcao com e sem no_banco em todas as opções
+    def comparar(self, funcao, *args, **filtros):
+
+        for opcao in self.opcoes:
+            esperado = funcao(*args, opcao=opcao, **filtros)
+            obtido = funcao(*args, opcao=opcao, no_banco=True, **filtros)
+
+            if opcao == 'todas':
+                self.assertEqual(obtido.keys(), esperado.keys())
+                for chave in esperado:
+                    self.igual(obtido[chave], esperado[chave])
+            else:
+                self.igual(obtido, esperado)
+
+    # Compara duas médias. Sem provas, as duas são nulas
+    def igual(self, obtido, esperado):
+
+        if pd.isna(esperado):
+            self.assertTrue(pd.isna(obtido))
+        else:
+            self.assertAlmostEqual(obtido, esperado)
+
+    def test_por_usuario(self):
+
+        self.comparar(media.por_funcional, '100003')
+        self.comparar(media.por_racf, 'R000003')
+        self.comparar(media.por_nome, 'Usuário 3')
+        self.comparar(media.por_funcional, '100007', categoria='10 - Java')
+
+    def test_por_categoria(self):
+
+        for categoria in dados.categorias:
+            self.comparar(media.por_categoria, categoria)
+
+    def test_por_treinamento(self):
+
+        self.comparar(media.por_treinamento, 'Python - Módulo 1')
+        self.comparar(media.por_treinamento, 'Java - Módulo 2')
+
+class TesteCopiaLocal(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        cls.pasta = tempfile.TemporaryDirectory()
+        caminho = dados.preparar(cls.pasta.name)
+
+        # Provas sem treinamento formam um grupo próprio nas médias
+        con = sqlite3.connect(caminho)
+        con.executemany('INSERT INTO coeficiente_mentoria (nome, racf, funcional, treinamento, nota, categoria) '
+                        'VALUES (?, ?, ?, ?, ?, ?)',
+                        [('Usuário 3', 'R000003', 100003, None, 6.0, '10 - Java'),
+                         ('Usuário 4', 'R000004', 100004, None, 8.0, '10 - Java')])
+        con.commit()
+
+        # Cópia local com as colunas de texto como categorias (veja consultas.tipos)
+        cls.provas = pd.read_sql_query('SELECT * FROM coeficiente_mentoria ORDER BY ' + consultas.coluna_ordem, con)
+        cls.provas = cls.provas.astype(consultas.tipos)
+        con.close()
+
+    @classmethod
+    def tearDownClass(cls):
+
+        consultas.usar_local(None, None)
+        conexao.configurar()
+        cls.pasta.cleanup()
+
+    # Médias de cada grupo, indexadas pelo grupo em texto, com as provas sem grupo em ''
+    def medias(self, grupo):
+
+        tabela = consultas.medias(grupo)
+
+        return tabela.set_index(tabela[grupo].astype(object).fillna('').astype(str)).drop(columns=grupo).astype(float)
+
+    def test_medias(self):
+
+        consultas.usar_local(self.provas, consultas.treinamentos())
+        self.assertIn('', self.medias('treinamento').index)
+        consultas.usar_local(None, None)
+
+        for grupo in ['treinamento', 'categoria']:
+            esperado = self.medias(grupo).sort_index()
+
+            consultas.usar_local(self.provas, consultas.treinamentos())
+            obtido = self.medias(grupo).sort_index()
+            consultas.usar_local(None, None)
+
+            pd.testing.assert_frame_equal(obtido, esperado, check_names=False)
+
+if __name__ == '__main__':
+    unittest.main()
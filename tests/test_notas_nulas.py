@@ -0,0 +1,91 @@
+import os
+import sys
+import math
+import sqlite3
+import tempfile
+import unittest
+
+# O pacote é importado como coeficiente, a partir da pasta que contém o projeto
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from coeficiente import benchmark, conexao, final, motor, padrao, posicoes, progressao, agregados
+
+"""
+    Testes do CRP com um usuário cujas notas são todas nulas.
+
+    O CR desse usuário é indefinido (NaN). Ele fica fora da média e do desvio padrão da população em todos os caminhos
+(padrao.estatisticas, padrao.coeficientes e motor.calcular_categorias), de modo que os scores dos demais usuários
+continuam definidos e iguais aos das buscas individuais.
+
+"""
+
+class TesteNotasNulas(unittest.TestCase):
+
+    categoria = '10 - Java'
+
+    @classmethod
+    def setUpClass(cls):
+
+        cls.pasta = tempfile.TemporaryDirectory()
+        caminho = os.path.join(cls.pasta.name, 'provas.db')
+        benchmark.gerar(caminho, usuarios=60, semente=1)
+
+        # Usuário com duas provas de Java, ambas sem nota
+        con = sqlite3.connect(caminho)
+        con.executemany('INSERT INTO coeficiente_mentoria (nome, racf, funcional, treinamento, nota, categoria) '
+                        'VALUES (?, ?, ?, ?, ?, ?)',
+                        [('Sem Notas', 'RSN001', 900001, 'Java - Módulo 1', None, cls.categoria),
+                         ('Sem Notas', 'RSN001', 900001, 'Java - Módulo 2', None, cls.categoria)])
+        con.commit()
+        con.close()
+
+        conexao.configurar(fabrica=conexao.fabrica_sqlite(caminho))
+
+    @classmethod
+    def tearDownClass(cls):
+
+        conexao.configurar()
+        cls.pasta.cleanup()
+
+    def setUp(self):
+
+        progressao.invalidar_catalogo()
+        padrao.invalidar_estatisticas()
+        posicoes.invalidar()
+        agregados.descartar()
+
+    def test_estatisticas_definidas(self):
+
+        populacao = padrao.estatisticas(categoria=self.categoria)
+
+        self.assertTrue(math.isfinite(populacao['media']))
+        self.assertTrue(math.isfinite(populacao['desvio']))
+
+    def test_tabela_sem_nan_para_os_demais(self):
+
+        tabela = final.gerar_tabela(categoria=self.categoria, nome=True, funcional=True)
+        sem_notas = tabela['Nome'] == 'Sem Notas'
+
+        self.assertEqual(sem_notas.sum(), 1)
+        self.assertTrue(tabela.loc[~sem_notas, 'Score Final'].notna().all())
+
+        # Usuário sem CR fica no fim do ranking
+        self.assertTrue(sem_notas.iloc[-1])
+        self.assertTrue(math.isnan(tabela.loc[sem_notas, 'Score Final'].iloc[0]))
+
+    def test_tabela_igual_as_buscas_individuais(self):
+
+        tabela = final.gerar_tabela(categoria=self.categoria, nome=True, funcional=True)
+
+        for funcional, score in tabela[['Funcional', 'Score Final']].head(5).itertuples(index=False):
+            self.assertAlmostEqual(final.por_funcional(str(funcional), categoria=self.categoria), score)
+
+    def test_todas_as_categorias(self):
+
+        scores = motor.scores_categorias()
+        java = scores.xs(self.categoria, level='categoria')
+
+        self.assertTrue(java.loc[java['nome'] != 'Sem Notas', 'score'].notna().all())
+
+if __name__ == '__main__':
+    unittest.main()
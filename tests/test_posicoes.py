@@ -0,0 +1,67 @@
+import os
+import sys
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+
+# O pacote é importado como coeficiente, a partir da pasta que contém o projeto
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from coeficiente import conexao, final, posicoes
+from coeficiente.tests import dados
+
+"""
+    Testes do índice de posições: os k primeiros de posicoes.ordenar são os k primeiros da tabela ordenada inteira,
+inclusive com empates e valores nulos, e as posições do índice são as do ranking de gerar_tabela.
+
+"""
+
+class TestePosicoes(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        cls.pasta = tempfile.TemporaryDirectory()
+        dados.preparar(cls.pasta.name)
+
+    @classmethod
+    def tearDownClass(cls):
+
+        conexao.configurar()
+        cls.pasta.cleanup()
+
+    def setUp(self):
+        posicoes.invalidar()
+
+    def test_ordenar_com_empates(self):
+
+        aleatorio = np.random.default_rng(0)
+        valores = aleatorio.integers(0, 10, 200).astype(float)
+        valores[aleatorio.choice(200, 15, replace=False)] = np.nan
+
+        tabela = pd.DataFrame({'Score Final': valores}, index=pd.RangeIndex(200, name='ID'))
+        ordenada = posicoes.ordenar(tabela, 'Score Final')
+
+        for k in [1, 5, 20, 37, 185, 200, 250]:
+            pd.testing.assert_frame_equal(posicoes.ordenar(tabela, 'Score Final', k=k), ordenada.head(k))
+
+    def test_top20(self):
+
+        for categoria in [None, '04 - Python']:
+            tabela = final.gerar_tabela(categoria=categoria, funcional=True)
+            pd.testing.assert_frame_equal(final.gerar_tabela(categoria=categoria, funcional=True, top20=True),
+                                          tabela.head(20))
+
+    def test_posicao_igual_ao_ranking(self):
+
+        tabela = final.gerar_tabela(categoria='04 - Python', funcional=True)
+
+        for lugar, funcional in enumerate(tabela['Funcional'].tolist(), 1):
+            self.assertEqual(posicoes.posicao(funcional=funcional, categoria='04 - Python')['posicao'], lugar)
+
+        primeiros = posicoes.primeiros(10, categoria='04 - Python')
+        self.assertEqual(primeiros['funcional'].tolist(), tabela['Funcional'].head(10).tolist())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import sys
+import json
+import tempfile
+import threading
+import unittest
+import urllib.error
+import urllib.request
+
+# O pacote é importado como coeficiente, a partir da pasta que contém o projeto
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from coeficiente import conexao, agregados, servico, final
+from coeficiente.tests import dados
+
+"""
+    Testes do serviço de scores: as respostas HTTP trazem os mesmos scores de final.py e buscas sem identificador do
+usuário são rejeitadas com 400.
+
+"""
+
+class TesteServico(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        cls.pasta = tempfile.TemporaryDirectory()
+        dados.preparar(cls.pasta.name)
+        servico.aquecer()
+
+        cls.servidor = servico.criar_servidor(porta=0)
+        threading.Thread(target=cls.servidor.serve_forever, daemon=True).start()
+        cls.endereco = 'http://127.0.0.1:%d' % cls.servidor.server_address[1]
+
+    @classmethod
+    def tearDownClass(cls):
+
+        cls.servidor.shutdown()
+        cls.servidor.server_close()
+        agregados.descartar()
+        conexao.configurar()
+        cls.pasta.cleanup()
+
+    # Faz uma requisição ao serviço. Retorna o código HTTP e o conteúdo
+    def requisitar(self, caminho):
+
+        try:
+            with urllib.request.urlopen(self.endereco + caminho) as resposta:
+                return resposta.status, json.loads(resposta.read())
+
+        except urllib.error.HTTPError as erro:
+            return erro.code, json.loads(erro.read())
+
+    def test_score(self):
+
+        codigo, conteudo = self.requisitar('/score?funcional=100003')
+
+        self.assertEqual(codigo, 200)
+        self.assertAlmostEqual(conteudo['score'], final.por_funcional('100003'))
+
+    def test_sem_identificador(self):
+
+        for caminho in ['/score', '/score?categoria=10+-+Java', '/posicao?metrica=cr']:
+            codigo, conteudo = self.requisitar(caminho)
+            self.assertEqual(codigo, 400, msg=caminho)
+            self.assertIn('erro', conteudo)
+
+        with self.assertRaises(ValueError):
+            servico.score()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import os
+import sys
+import tempfile
+import unittest
+import pandas as pd
+
+# O pacote é importado como coeficiente, a partir da pasta que contém o projeto
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from coeficiente import conexao, consultas, agregados, final, rendimento, progressao, padrao, media
+from coeficiente.tests import dados
+
+"""
+    Testes dos tipos compactos: as tabelas e índices retornados pelas funções públicas têm os mesmos tipos e valores
+com ou sem os tipos compactos, na leitura em blocos e com o resumo materializado, qualquer que seja o tamanho do
+resultado.
+
+"""
+
+class TesteTipos(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        cls.pasta = tempfile.TemporaryDirectory()
+        dados.preparar(cls.pasta.name)
+
+    @classmethod
+    def tearDownClass(cls):
+
+        conexao.configurar()
+        cls.pasta.cleanup()
+
+    def setUp(self):
+        padrao.invalidar_estatisticas()
+
+    def tearDown(self):
+
+        consultas.tipos_compactos = True
+        agregados.descartar()
+
+    # Resultados comparados. Com tamanho_bloco, os rankings são lidos em blocos
+    def calcular(self, tamanho_bloco=None):
+
+        return {'tabela': final.gerar_tabela(funcional=True, tamanho_bloco=tamanho_bloco),
+                'tabela python': final.gerar_tabela(categoria='04 - Python', funcional=True,
+                                                    tamanho_bloco=tamanho_bloco),
+                'rendimento': rendimento.ranking_coeficentes(funcional=True, tamanho_bloco=tamanho_bloco),
+                'progressao': progressao.ranking_progressao(funcional=True, tamanho_bloco=tamanho_bloco),
+                'padrao': padrao.ranking_padrao(funcional=True, tamanho_bloco=tamanho_bloco),
+                'scores': final.por_funcionais(['100001', '100002', '100003']),
+                'score': final.por_funcionais(['100001']),
+                'rendimentos': rendimento.por_racfs(['R000001', 'R000002']),
+                'progressoes': progressao.por_funcionais(['100001', '100002']),
+                'medias': media.por_funcionais(['100001', '100002'], opcao='todas')}
+
+    def comparar(self, obtido, esperado):
+
+        for chave, tabela in esperado.items():
+            pd.testing.assert_frame_equal(obtido[chave], tabela, obj=chave)
+
+    def test_tipos_iguais_em_todos_os_modos(self):
+
+        consultas.tipos_compactos = False
+        esperado = self.calcular()
+
+        consultas.tipos_compactos = True
+        self.comparar(self.calcular(), esperado)
+        self.comparar(self.calcular(tamanho_bloco=100), esperado)
+
+        agregados.materializar()
+        self.comparar(self.calcular(), esperado)
+
+    def test_funcional_inteiro(self):
+
+        tabela = final.gerar_tabela(funcional=True)
+
+        self.assertEqual(tabela['Funcional'].dtype, 'int64')
+        self.assertEqual(final.por_funcionais(['100001']).index.dtype, 'int64')
+
+if __name__ == '__main__':
+    unittest.main()